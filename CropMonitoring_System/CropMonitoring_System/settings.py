@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
 from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -136,5 +137,30 @@ CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 CELERY_RESULT_BACKEND = 'django-db'
 CELERY_TASK_TRACK_STARTED = True
 CELERY_RESULT_EXTENDED = True
+
+# 대시보드 JSON API 응답 캐시 (core.response_cache)
+# 웹/워커/로더 스크립트가 데이터 버전을 공유하도록 Redis 사용.
+# 기본값은 Celery 브로커와 같은 Redis의 DB 1. CACHE_REDIS_URL을 빈 값으로 두면
+# 프로세스별 로컬 메모리가 되며, 이때 응답 캐시는 사용하지 않음 (다른 프로세스의 버전 증가를 볼 수 없음)
+_broker = urlsplit(CELERY_BROKER_URL)
+CACHE_REDIS_URL = os.environ.get(
+    'CACHE_REDIS_URL',
+    urlunsplit(_broker._replace(path='/1')) if _broker.scheme in ('redis', 'rediss') else '',
+)
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+# 캐시된 응답의 최대 보관 시간(초); 버전 증가 없이 바뀐 데이터(관리자 수정 등)도 이 시간 뒤에는 반영
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 3600))
 # DATA_UPLOAD_MAX_MEMORY_SIZE = 52428800  # 50MB
 # FILE_UPLOAD_MAX_MEMORY_SIZE = 52428800  # 50MB
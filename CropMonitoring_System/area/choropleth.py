@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import threading
+
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+
+from core.models import State
+
+# 평년 구간 (시작, 끝 연도 포함)
+BASELINE_YEARS = (2018, 2023)
+
+# Boundary coordinates are rounded to this many decimals (~11 m in degrees)
+BOUNDARY_PRECISION = 4
+
+_boundary_lock = threading.Lock()
+_boundary_cache = {}
+
+
+def state_area_summary(crop, country, year):
+    """Current, last-year and baseline-average area of every state of ``country`` in one grouped query."""
+    start, end = BASELINE_YEARS
+    area = "cropseason__areas__area_acres"
+    crop_filter = Q(cropseason__crop=crop, cropseason__areas__isnull=False)
+    baseline = crop_filter & Q(cropseason__year__gte=start, cropseason__year__lte=end)
+    states = (
+        State.objects.filter(country=country)
+        .annotate(
+            current=Sum(area, filter=crop_filter & Q(cropseason__year=year)),
+            last=Sum(area, filter=crop_filter & Q(cropseason__year=year - 1)),
+            baseline_total=Sum(area, filter=baseline),
+            baseline_years=Count("cropseason__year", filter=baseline, distinct=True),
+        )
+        .order_by("id")
+    )
+
+    rows = list(states)
+    total_area = sum(state.current or 0 for state in rows)
+    area_by_state = {}
+    for state in rows:
+        current = state.current or 0
+        # 평년: 면적이 있는 연도별 합계의 평균
+        average = state.baseline_total / state.baseline_years if state.baseline_years else 0.0
+        percent = (current / total_area * 100) if total_area > 0 else 0.0
+        area_by_state[state.name] = {
+            "current": float(current),
+            "last": float(state.last or 0),
+            "average": float(average),
+            "percent": round(percent, 1),
+            "center_lat": state.center_lat,
+            "center_lng": state.center_lng,
+        }
+    return area_by_state
+
+
+def boundary_path(country):
+    """MEDIA_ROOT 기준 국가 경계 GeoJSON 경로 (없으면 None)"""
+    candidates = [
+        os.path.join(settings.MEDIA_ROOT, country.iso_code, "Layers", f"{country.iso_code}_states.json"),
+        country.boundary_path,
+    ]
+    for path in candidates:
+        if not path:
+            continue
+        # 윈도우 경로를 리눅스에서도 사용 가능하도록 변환
+        normalized_path = path.replace("\\", "/")
+        if os.path.exists(normalized_path):
+            return normalized_path
+    return None
+
+
+def _simplify_ring(ring, min_points=2):
+    rounded = [[round(value, BOUNDARY_PRECISION) for value in point[:2]] for point in ring]
+    points = [point for i, point in enumerate(rounded) if i == 0 or point != rounded[i - 1]]
+    # Keep tiny rings valid (a polygon ring needs 4 positions) rather than collapsing them
+    return points if len(points) >= min_points else rounded
+
+
+def _simplify_geometry(geometry):
+    if not geometry:
+        return geometry
+    kind = geometry.get("type")
+    coords = geometry.get("coordinates")
+    if kind == "Polygon":
+        coords = [_simplify_ring(ring, 4) for ring in coords]
+    elif kind == "MultiPolygon":
+        coords = [[_simplify_ring(ring, 4) for ring in polygon] for polygon in coords]
+    elif kind in ("LineString", "MultiPoint"):
+        coords = _simplify_ring(coords)
+    elif kind == "MultiLineString":
+        coords = [_simplify_ring(line) for line in coords]
+    elif kind == "GeometryCollection":
+        return {**geometry, "geometries": [_simplify_geometry(g) for g in geometry.get("geometries", [])]}
+    return {**geometry, "coordinates": coords}
+
+
+def simplify_geojson(data):
+    """Round coordinates to ``BOUNDARY_PRECISION`` and drop the repeated vertices this creates."""
+    if data.get("type") == "FeatureCollection":
+        return {
+            **data,
+            "features": [
+                {**feature, "geometry": _simplify_geometry(feature.get("geometry"))}
+                for feature in data.get("features", [])
+            ],
+        }
+    if data.get("type") == "Feature":
+        return {**data, "geometry": _simplify_geometry(data.get("geometry"))}
+    return _simplify_geometry(data)
+
+
+def load_boundary(country):
+    """Simplified, serialized boundary GeoJSON and its ETag, cached until the source file changes.
+
+    Returns ``(None, None)`` when the country has no boundary file.
+    """
+    path = boundary_path(country)
+    if path is None:
+        return None, None
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    with _boundary_lock:
+        cached = _boundary_cache.get(country.iso_code)
+        if cached and cached[0] == key:
+            return cached[1], cached[2]
+    with open(path, "r", encoding="utf-8") as f:
+        data = simplify_geojson(json.load(f))
+    body = json.dumps(data, separators=(",", ":")).encode("utf-8")
+    etag = hashlib.sha256(body).hexdigest()[:32]
+    with _boundary_lock:
+        _boundary_cache[country.iso_code] = (key, body, etag)
+    return body, etag
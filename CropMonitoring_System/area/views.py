@@ -1,15 +1,15 @@
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
 from django.utils.timezone import now
-from django.db.models import Sum
-from django.views.decorators.http import require_GET
+from django.views.decorators.http import condition, require_GET
 import numpy as np
-import json
-import os
 
+from .choropleth import boundary_path, load_boundary, state_area_summary
 from .models import CultivatedArea
 from core.models import Crop, State, Country
-from django.conf import settings
+from core.response_cache import cache_response
 
 
 def sanitize_for_json(obj):
@@ -40,6 +40,7 @@ def area_map(request):
 
 # 2. GeoJSON 지도 + 그래프용 데이터 API
 @require_GET
+@cache_response
 def api_choropleth(request):
     crop_name = request.GET.get("crop")
     year = request.GET.get("year")
@@ -55,110 +56,48 @@ def api_choropleth(request):
     except (Crop.DoesNotExist, Country.DoesNotExist, ValueError):
         return JsonResponse({"error": "Invalid crop, country, or year"}, status=400)
 
-    states = State.objects.filter(country=country)
-
-    area_by_state = {}
-    boundary_geojson = None
-
-    # Boundary GeoJSON을 직접 읽어 반환 (Nginx /media 문제 우회)
-    try:
-        # MEDIA_ROOT 기준 경로 생성 (플랫폼 독립적)
-        local_boundary = os.path.join(settings.MEDIA_ROOT, country.iso_code, "Layers", f"{country.iso_code}_states.json")
-
-        # 디버깅: 경로 정보 출력
-        print(f"[DEBUG] MEDIA_ROOT: {settings.MEDIA_ROOT}")
-        print(f"[DEBUG] country.iso_code: {country.iso_code}")
-        print(f"[DEBUG] local_boundary (raw): {local_boundary}")
-        print(f"[DEBUG] country.boundary_path: {country.boundary_path}")
-
-        candidates = [local_boundary, country.boundary_path]
-        for path in candidates:
-            # 윈도우 경로를 리눅스에서도 사용 가능하도록 변환
-            normalized_path = path.replace('\\', '/')
-            print(f"[DEBUG] Trying path: {normalized_path}")
-            print(f"[DEBUG] Path exists: {os.path.exists(normalized_path)}")
-
-            if os.path.exists(normalized_path):
-                with open(normalized_path, "r", encoding="utf-8") as f:
-                    boundary_geojson = json.load(f)
-                print(f"✅ [area.api_choropleth] boundary loaded: {normalized_path}")
-                break
-        else:
-            # 파일을 찾지 못한 경우 디렉토리 내용 확인
-            media_root_exists = os.path.exists(settings.MEDIA_ROOT)
-            print(f"[DEBUG] MEDIA_ROOT exists: {media_root_exists}")
-            if media_root_exists:
-                try:
-                    contents = os.listdir(settings.MEDIA_ROOT)
-                    print(f"[DEBUG] MEDIA_ROOT contents: {contents}")
-                except Exception as e:
-                    print(f"[DEBUG] Cannot list MEDIA_ROOT: {e}")
-            print(f"⚠️ [area.api_choropleth] boundary not found. Tried: {candidates}")
-    except Exception as e:
-        boundary_geojson = None
-        print(f"❌ [area.api_choropleth] boundary load error: {e}")
-        import traceback
-        traceback.print_exc()
-
-    # 전체 국가의 올해 면적 총합
-    total_area = CultivatedArea.objects.filter(
-        crop_season__crop=crop,
-        crop_season__year=year,
-        crop_season__state__in=states
-    ).aggregate(total=Sum('area_acres'))['total'] or 0
-
-    for state in states:
-        # 올해
-        current = CultivatedArea.objects.filter(
-            crop_season__crop=crop,
-            crop_season__year=year,
-            crop_season__state=state
-        ).aggregate(total=Sum('area_acres'))['total'] or 0
-
-        # 전년도
-        last = CultivatedArea.objects.filter(
-            crop_season__crop=crop,
-            crop_season__year=year - 1,
-            crop_season__state=state
-        ).aggregate(total=Sum('area_acres'))['total'] or 0
-
-        # 평년
-        previous_years = CultivatedArea.objects.filter(
-            crop_season__crop=crop,
-            crop_season__year__gte=2018,
-            crop_season__year__lte=2023,
-            crop_season__state=state
-        ).values('crop_season__year').annotate(total=Sum('area_acres'))
-
-        # NaN 방지: 빈 리스트일 경우 0 반환
-        year_totals = [row['total'] for row in previous_years if row['total'] is not None]
-        average = float(np.mean(year_totals)) if year_totals else 0.0
-
-        percent = (current / total_area * 100) if total_area > 0 else 0.0
-
-        area_by_state[state.name] = {
-            "current": float(current),
-            "last": float(last),
-            "average": float(average),
-            "percent": round(percent, 1),
-            "center_lat": state.center_lat,
-            "center_lng": state.center_lng
-        }
+    # 경계는 ETag 캐시되는 별도 API에서 받아옴 (경계 파일이 없으면 기존 /media URL로 폴백)
+    if boundary_path(country):
+        boundary_url = f"{reverse('api_boundary')}?country={country.iso_code}"
+    else:
+        boundary_url = country.get_absolute_url()
 
     response_data = {
         "center_lat": country.center_lat,
         "center_lng": country.center_lng,
-        "boundary_url": country.get_absolute_url(),
-        "boundary_geojson": boundary_geojson,
-        "area_by_state": area_by_state,
+        "boundary_url": boundary_url,
+        "area_by_state": state_area_summary(crop, country, year),
     }
 
-    # NaN 값을 None으로 변환
     return JsonResponse(response_data)
 
 
+def _boundary_etag(request):
+    country = Country.objects.filter(iso_code=request.GET.get("country")).first()
+    if not country:
+        return None
+    return load_boundary(country)[1]
+
+
+# 2-1. 간소화된 국가 경계 GeoJSON (ETag / 304 지원)
+@require_GET
+@condition(etag_func=_boundary_etag)
+def api_boundary(request):
+    country = Country.objects.filter(iso_code=request.GET.get("country")).first()
+    if not country:
+        return JsonResponse({"error": "Invalid country"}, status=400)
+
+    body, _ = load_boundary(country)
+    if body is None:
+        return JsonResponse({"error": "Boundary not found"}, status=404)
+    response = HttpResponse(body, content_type="application/geo+json")
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
 # 3. crop-country 기반 유효 연도 조회 API
 @require_GET
+@cache_response
 def api_available_years(request):
     crop_name = request.GET.get("crop")
     country_iso = request.GET.get("country")
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-17 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0002_alter_crop_name"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="cropseason",
+            index=models.Index(
+                fields=["state", "crop", "year"], name="core_cropse_state_i_89d40a_idx"
+            ),
+        ),
+    ]
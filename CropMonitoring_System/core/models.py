@@ -72,6 +72,10 @@ class CropSeason(models.Model):
 
     class Meta:
         unique_together = ('crop', 'year', 'state')
+        indexes = [
+            # 주(state) 기준 조회 (시계열, 요약 갱신)
+            models.Index(fields=['state', 'crop', 'year']),
+        ]
 
     def __str__(self):
         return f"{self.crop} - {self.year} - {self.state.name}"
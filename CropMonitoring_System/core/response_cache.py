@@ -0,0 +1,105 @@
+# core/response_cache.py
+"""
+대시보드 JSON API 응답 캐시.
+
+응답은 (경로, 정렬된 쿼리 파라미터) 키로 Django 캐시(CACHES['default'])에 저장되고,
+데이터 버전 카운터와 함께 보관됩니다. fetcher 작업과 scripts/insert_* 로더가
+``bump_data_version()``으로 버전을 올리면 이전 버전의 응답은 모두 무효가 됩니다.
+"""
+import hashlib
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+
+DATA_VERSION_KEY = "dashboard:data_version"
+
+
+# 프로세스별 캐시: 로더/워커의 버전 증가가 웹 프로세스에 보이지 않으므로 응답 캐시를 끔
+_PROCESS_LOCAL_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def _cache_shared():
+    return settings.CACHES.get("default", {}).get("BACKEND") not in _PROCESS_LOCAL_BACKENDS
+
+
+def get_data_version():
+    return cache.get(DATA_VERSION_KEY, 0)
+
+
+def bump_data_version():
+    """Invalidate every cached response; returns the new version."""
+    try:
+        cache.add(DATA_VERSION_KEY, 0, timeout=None)
+        return cache.incr(DATA_VERSION_KEY)
+    except Exception as e:
+        print(f"⚠️ [response_cache] data version bump failed: {e}")
+        return None
+
+
+def response_cache_key(request):
+    """Endpoint path + query parameters sorted by name, so parameter order does not matter."""
+    params = urlencode(sorted(request.GET.lists()), doseq=True)
+    digest = hashlib.sha256(f"{request.path}?{params}".encode("utf-8")).hexdigest()
+    return f"dashboard:response:{digest}"
+
+
+def _respond(request, entry):
+    if entry["etag"] in parse_etags(request.headers.get("If-None-Match", "")):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(entry["body"], content_type=entry["content_type"])
+    response["ETag"] = entry["etag"]
+    # 브라우저는 매번 ETag로 재검증 (데이터가 바뀌지 않았으면 304)
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def cache_response(view_func):
+    """
+    GET JSON 뷰의 200 응답을 데이터 버전과 함께 캐시하고 ETag/304를 붙입니다.
+    캐시 조회는 버전 키와 응답 키를 한 번에 읽는 get_many 한 번입니다.
+    캐시 서버에 접근할 수 없거나 캐시가 프로세스별(LocMem)이면 뷰를 그대로 실행합니다.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD") or not _cache_shared():
+            return view_func(request, *args, **kwargs)
+
+        key = response_cache_key(request)
+        try:
+            values = cache.get_many([DATA_VERSION_KEY, key])
+        except Exception as e:
+            print(f"⚠️ [response_cache] cache lookup failed: {e}")
+            return view_func(request, *args, **kwargs)
+
+        version = values.get(DATA_VERSION_KEY, 0)
+        entry = values.get(key)
+        if entry and entry["version"] == version:
+            return _respond(request, entry)
+
+        response = view_func(request, *args, **kwargs)
+        if response.status_code != 200 or response.streaming:
+            return response
+
+        body = response.content
+        entry = {
+            "version": version,
+            "etag": quote_etag(hashlib.sha256(body).hexdigest()[:32]),
+            "body": body,
+            "content_type": response["Content-Type"],
+        }
+        try:
+            cache.set(key, entry, timeout=getattr(settings, "RESPONSE_CACHE_TIMEOUT", 3600))
+        except Exception as e:
+            print(f"⚠️ [response_cache] cache store failed: {e}")
+        return _respond(request, entry)
+
+    return wrapper
@@ -1,12 +1,18 @@
 # fetcher/tasks.py
 
 from celery import shared_task
+from core.response_cache import bump_data_version
+from nirv.climatology import refresh_climatologies
 from .scripts.download_nirv import download
 
 @shared_task(bind=True)
 def collect_data_nirv(self):
     try:
         download()
+        # 평년 통계를 미리 갱신 (그래프 요청 중 재계산 방지)
+        refresh_climatologies()
+        # 새 데이터 반영: 캐시된 대시보드 응답 무효화
+        bump_data_version()
     except Exception as e:
         self.retry(exc=e, countdown=60, max_retries=3)
         raise
\ No newline at end of file
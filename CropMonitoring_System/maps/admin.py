@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import TileSet
+from .models import AreaSummary, TileSet
 
 @admin.register(TileSet)
 class TileSetAdmin(admin.ModelAdmin):
@@ -26,3 +26,10 @@ class TileSetAdmin(admin.ModelAdmin):
     def get_state(self, obj):
         return obj.crop_season.state.name
 
+
+
+@admin.register(AreaSummary)
+class AreaSummaryAdmin(admin.ModelAdmin):
+    list_display = ('crop', 'year', 'state', 'variant', 'area', 'last_year_area', 'diff', 'percent_change')
+    list_filter = ('crop', 'year', 'variant', 'country')
+    search_fields = ('state__name',)
@@ -0,0 +1,51 @@
+# maps/area_summary.py
+# 참고: maps 앱은 현재 INSTALLED_APPS/urls에서 비활성화되어 있어, 앱을 다시 켜기 전까지
+# AreaSummary 테이블(maps/0003)은 생성되지 않고 area_summary API도 제공되지 않습니다.
+from django.db.models import F
+
+# AreaSummary.variant 값: 주(state)의 모든 variant 합계
+VARIANT_ALL = '*'
+
+
+def tileset_values(queryset):
+    """TileSet 쿼리셋 → 요약 계산에 필요한 값만 담은 dict"""
+    return queryset.values(
+        'variant',
+        'area',
+        crop_ref=F('crop_season__crop_id'),
+        state_ref=F('crop_season__state_id'),
+        country_ref=F('crop_season__state__country_id'),
+        year=F('crop_season__year'),
+    )
+
+
+def build_summary_rows(model, tilesets):
+    """
+    (작물, 국가, 주, variant, 연도)별 면적과 전년 대비 증감을 계산해
+    저장되지 않은 ``model`` 인스턴스 목록으로 반환합니다.
+    variant별 행과 함께 variant 합계 행(VARIANT_ALL)도 만듭니다.
+    """
+    areas = {}
+    for ts in tilesets:
+        key = (ts['crop_ref'], ts['country_ref'], ts['state_ref'])
+        areas.setdefault((*key, ts['variant']), {})[ts['year']] = ts['area']
+        totals = areas.setdefault((*key, VARIANT_ALL), {})
+        totals[ts['year']] = (totals.get(ts['year']) or 0.0) + (ts['area'] or 0.0)
+
+    rows = []
+    for (crop_id, country_id, state_id, variant), by_year in areas.items():
+        for year, area in by_year.items():
+            prev = by_year.get(year - 1) or 0.0
+            diff = (area or 0.0) - prev
+            rows.append(model(
+                crop_id=crop_id,
+                country_id=country_id,
+                state_id=state_id,
+                variant=variant,
+                year=year,
+                area=area,
+                last_year_area=prev,
+                diff=diff,
+                percent_change=(diff / prev * 100) if prev else None,
+            ))
+    return rows
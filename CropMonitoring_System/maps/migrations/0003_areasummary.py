@@ -0,0 +1,133 @@
+# Generated by Django 5.2.1 on 2026-10-17 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+
+
+def populate_area_summary(apps, schema_editor):
+    # Frozen copy of maps.area_summary as of this migration, so later edits to
+    # that module do not change what this migration does.
+    TileSet = apps.get_model("maps", "TileSet")
+    AreaSummary = apps.get_model("maps", "AreaSummary")
+    tilesets = TileSet.objects.values(
+        "variant",
+        "area",
+        crop_ref=F("crop_season__crop_id"),
+        state_ref=F("crop_season__state_id"),
+        country_ref=F("crop_season__state__country_id"),
+        year=F("crop_season__year"),
+    )
+
+    areas = {}
+    for ts in tilesets:
+        key = (ts["crop_ref"], ts["country_ref"], ts["state_ref"])
+        areas.setdefault((*key, ts["variant"]), {})[ts["year"]] = ts["area"]
+        totals = areas.setdefault((*key, "*"), {})
+        totals[ts["year"]] = (totals.get(ts["year"]) or 0.0) + (ts["area"] or 0.0)
+
+    rows = []
+    for (crop_id, country_id, state_id, variant), by_year in areas.items():
+        for year, area in by_year.items():
+            prev = by_year.get(year - 1) or 0.0
+            diff = (area or 0.0) - prev
+            rows.append(
+                AreaSummary(
+                    crop_id=crop_id,
+                    country_id=country_id,
+                    state_id=state_id,
+                    variant=variant,
+                    year=year,
+                    area=area,
+                    last_year_area=prev,
+                    diff=diff,
+                    percent_change=(diff / prev * 100) if prev else None,
+                )
+            )
+    AreaSummary.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_cropseason_core_cropse_state_i_89d40a_idx"),
+        ("maps", "0002_alter_tileset_options_alter_tileset_unique_together_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AreaSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "variant",
+                    models.CharField(
+                        blank=True,
+                        help_text="TileSet variant ('*' = 모든 variant 합계)",
+                        max_length=20,
+                    ),
+                ),
+                ("year", models.IntegerField()),
+                (
+                    "area",
+                    models.FloatField(blank=True, help_text="면적 (m²)", null=True),
+                ),
+                (
+                    "last_year_area",
+                    models.FloatField(default=0.0, help_text="전년도 면적 (없으면 0)"),
+                ),
+                ("diff", models.FloatField(default=0.0)),
+                (
+                    "percent_change",
+                    models.FloatField(
+                        blank=True, help_text="전년 대비 증감률 (%)", null=True
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "country",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="area_summaries",
+                        to="core.country",
+                    ),
+                ),
+                (
+                    "crop",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="area_summaries",
+                        to="core.crop",
+                    ),
+                ),
+                (
+                    "state",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="area_summaries",
+                        to="core.state",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Area Summary",
+                "verbose_name_plural": "Area Summaries",
+                "indexes": [
+                    models.Index(
+                        fields=["crop", "country", "variant", "year"],
+                        name="maps_areasu_crop_id_4c633e_idx",
+                    )
+                ],
+                "unique_together": {("crop", "country", "state", "variant", "year")},
+            },
+        ),
+        migrations.RunPython(populate_area_summary, migrations.RunPython.noop),
+    ]
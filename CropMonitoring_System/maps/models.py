@@ -2,8 +2,15 @@
 
 import os
 from django.conf import settings
-from django.db import models
-from core.models import CropSeason
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from core.models import Country, Crop, CropSeason, State
+
+from .area_summary import VARIANT_ALL, build_summary_rows, tileset_values
+
+# 요약 테이블 갱신 여부 판단용: DB에서 읽지 않은(새로 만든) 인스턴스
+_NOT_LOADED = object()
 
 
 class TileSet(models.Model):
@@ -69,8 +76,20 @@ class TileSet(models.Model):
             f"{self.crop_season.year}_{self.crop_season.crop.name}_{state}"
         )
 
+    _loaded_summary_key = _NOT_LOADED
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if {'crop_season_id', 'variant', 'area'} <= set(field_names):
+            instance._loaded_summary_key = instance._summary_key()
+        return instance
+
+    def _summary_key(self):
+        return (self.crop_season_id, self.variant, self.area)
+
     def save(self, *args, **kwargs):
-        # 1) folder_path 를 캐싱
+        # folder_path 를 캐싱 (AreaSummary 갱신은 아래 post_save 수신기에서)
         self.folder_path_cached = self.folder_path
         super().save(*args, **kwargs)
 
@@ -85,3 +104,82 @@ class TileSet(models.Model):
         """
         rel = self.folder_path_cached.replace(settings.MEDIA_ROOT, '').lstrip(os.sep)
         return f"{settings.MEDIA_URL}{rel}/{{z}}/{{x}}/{{y}}.png"
+
+
+class AreaSummary(models.Model):
+    """
+    (작물, 국가, 주, variant, 연도)별 TileSet 면적 합계와 전년 대비 증감.
+    TileSet 저장/삭제 시(QuerySet.delete, 관리자 일괄 삭제, CropSeason 연쇄 삭제 포함)
+    해당 작물·주의 행이 post_save/post_delete 수신기에서 다시 계산됩니다.
+    QuerySet.update()는 신호를 보내지 않으므로 갱신되지 않습니다.
+    variant='*' 행은 그 주의 모든 variant 합계입니다.
+    """
+    VARIANT_ALL = VARIANT_ALL
+
+    crop = models.ForeignKey(Crop, on_delete=models.CASCADE, related_name='area_summaries')
+    country = models.ForeignKey(Country, on_delete=models.CASCADE, related_name='area_summaries')
+    state = models.ForeignKey(State, on_delete=models.CASCADE, related_name='area_summaries')
+    variant = models.CharField(
+        max_length=20,
+        blank=True,
+        help_text="TileSet variant ('*' = 모든 variant 합계)"
+    )
+    year = models.IntegerField()
+    area = models.FloatField(null=True, blank=True, help_text="면적 (m²)")
+    last_year_area = models.FloatField(default=0.0, help_text="전년도 면적 (없으면 0)")
+    diff = models.FloatField(default=0.0)
+    percent_change = models.FloatField(null=True, blank=True, help_text="전년 대비 증감률 (%)")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('crop', 'country', 'state', 'variant', 'year')
+        indexes = [
+            models.Index(fields=['crop', 'country', 'variant', 'year']),
+        ]
+        verbose_name = "Area Summary"
+        verbose_name_plural = "Area Summaries"
+
+    def __str__(self):
+        v = f" / {self.variant}" if self.variant else ""
+        return f"{self.crop} - {self.year} - {self.state.name}{v}"
+
+    @classmethod
+    def refresh(cls, crop_id, state_id):
+        """작물·주 하나의 모든 연도/variant 행을 TileSet에서 다시 계산"""
+        tilesets = tileset_values(
+            TileSet.objects.filter(crop_season__crop_id=crop_id, crop_season__state_id=state_id)
+        )
+        rows = build_summary_rows(cls, tilesets)
+        with transaction.atomic():
+            cls.objects.filter(crop_id=crop_id, state_id=state_id).delete()
+            cls.objects.bulk_create(rows)
+
+    @classmethod
+    def refresh_for_seasons(cls, season_ids):
+        pairs = CropSeason.objects.filter(id__in=season_ids).values_list('crop_id', 'state_id').distinct()
+        for crop_id, state_id in pairs:
+            cls.refresh(crop_id, state_id)
+
+
+@receiver(post_save, sender=TileSet)
+def refresh_summary_on_save(sender, instance, raw=False, **kwargs):
+    """면적(또는 variant/시즌)이 바뀐 TileSet의 작물·주 요약을 갱신"""
+    if raw:
+        # loaddata: 관련 행이 아직 없을 수 있음
+        return
+    previous = instance._loaded_summary_key
+    if previous is _NOT_LOADED or previous != instance._summary_key():
+        seasons = {instance.crop_season_id}
+        if previous is not _NOT_LOADED:
+            seasons.add(previous[0])
+        AreaSummary.refresh_for_seasons(seasons)
+    instance._loaded_summary_key = instance._summary_key()
+
+
+@receiver(post_delete, sender=TileSet)
+def refresh_summary_on_delete(sender, instance, **kwargs):
+    """
+    삭제된 TileSet의 작물·주 요약을 갱신.
+    CropSeason 연쇄 삭제에서도 TileSet이 먼저 지워지므로 시즌 조회가 가능합니다.
+    """
+    AreaSummary.refresh_for_seasons({instance.crop_season_id})
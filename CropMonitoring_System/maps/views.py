@@ -6,7 +6,8 @@ from django.http import JsonResponse, Http404
 from django.views.decorators.http import require_GET
 
 from core.models import Country, State, Crop, CropSeason
-from .models import TileSet
+from core.response_cache import cache_response
+from .models import AreaSummary, TileSet
 
 
 def sanitize_for_json(obj):
@@ -28,6 +29,7 @@ def map_view(request):
 
 
 @require_GET
+@cache_response
 def get_tile_options(request):
     crop    = request.GET.get('crop')
     year    = request.GET.get('year')
@@ -84,6 +86,7 @@ def get_tile_options(request):
     return JsonResponse({'error': 'Invalid parameters'}, status=400)
 
 @require_GET
+@cache_response
 def get_tile_url(request):
     crop    = request.GET.get('crop')
     year    = request.GET.get('year')
@@ -112,6 +115,7 @@ def get_tile_url(request):
 
 
 @require_GET
+@cache_response
 def get_country_tiles(request):
     crop    = request.GET.get('crop')
     year    = request.GET.get('year')
@@ -161,6 +165,7 @@ def get_country_tiles(request):
 
 
 @require_GET
+@cache_response
 def area_summary(request):
     crop    = request.GET.get('crop')
     year    = request.GET.get('year')
@@ -178,61 +183,43 @@ def area_summary(request):
     except ValueError:
         return JsonResponse({'error': 'Invalid year'}, status=400)
 
+    # 모든 모드는 AreaSummary(작물·국가·주·variant·연도) 인덱스 조회
+    summaries = AreaSummary.objects.filter(crop__name=crop, country__name=country)
+
     # ✅ 시계열 모드
     if mode == 'time_series' and state:
-        series = TileSet.objects.select_related('crop_season').filter(
-            crop_season__crop__name=crop,
-            crop_season__state__name=state,
-            crop_season__state__country__name=country,
-            variant=variant
-        ).order_by('crop_season__year')
+        series = summaries.filter(
+            state__name=state,
+            variant=variant,
+            area__isnull=False,
+        ).order_by('year').values_list('year', 'area')
 
-        time_data = [
-            {'year': ts.crop_season.year, 'area': round(ts.area, 2)}
-            for ts in series if ts.area is not None
-        ]
         response_data = {
             'mode': 'time_series',
             'state': state,
             'variant': variant,
-            'series': time_data
+            'series': [{'year': y, 'area': round(area, 2)} for y, area in series]
         }
         return JsonResponse(response_data)
 
-    # 기본 쿼리셋
-    qs = TileSet.objects.select_related('crop_season__state__country').filter(
-        crop_season__crop__name=crop,
-        crop_season__state__country__name=country,
-        crop_season__year__in=[last_year, year]
-    )
-
     # 국가 전체 요약
     if not state:
-        if variant:
-            qs = qs.filter(variant=variant)
-        current = {}
-        previous = {}
-        for ts in qs:
-            key = ts.crop_season.state.name
-            if ts.crop_season.year == year:
-                current[key] = current.get(key, 0.0) + (ts.area or 0)
-            elif ts.crop_season.year == last_year:
-                previous[key] = previous.get(key, 0.0) + (ts.area or 0)
-
-        combined = []
-        for st in current:
-            cur = current.get(st, 0.0)
-            prev = previous.get(st, 0.0)
-            diff = cur - prev
-            pct = (diff / prev * 100) if prev else None
-            combined.append({
-                'state': st,
+        rows = summaries.filter(
+            year=year,
+            variant=variant or AreaSummary.VARIANT_ALL,
+        ).values('state__name', 'area', 'last_year_area', 'diff', 'percent_change')
+
+        combined = [
+            {
+                'state': row['state__name'],
                 'variant': variant or '전체',
-                'area': round(cur, 2),
-                'last_year_area': round(prev, 2),
-                'diff': round(diff, 2),
-                'percent_change': round(pct, 1) if pct is not None else None
-            })
+                'area': round(row['area'] or 0.0, 2),
+                'last_year_area': round(row['last_year_area'], 2),
+                'diff': round(row['diff'], 2),
+                'percent_change': round(row['percent_change'], 1) if row['percent_change'] is not None else None
+            }
+            for row in rows
+        ]
 
         total = sum(item['area'] for item in combined)
         response_data = {
@@ -242,74 +229,51 @@ def area_summary(request):
         }
         return JsonResponse(response_data)
 
-    # 특정 state 선택 시 qs 필터 추가
-    qs = qs.filter(crop_season__state__name=state)
+    # 특정 state 선택 시 필터 추가
+    summaries = summaries.filter(state__name=state)
 
     # 단일 state + variant 지정 → 전년도 포함 응답
     if variant:
-        area = None
-        last_area = None
-
-        try:
-            ts = qs.get(
-                crop_season__year=year,
-                variant=variant
-            )
-            area = round(ts.area, 2) if ts.area else None
-        except TileSet.DoesNotExist:
-            pass
-
-        try:
-            ts_last = qs.get(
-                crop_season__year=last_year,
-                variant=variant
-            )
-            last_area = round(ts_last.area, 2) if ts_last.area else None
-        except TileSet.DoesNotExist:
-            pass
+        areas = dict(
+            summaries.filter(variant=variant, year__in=[last_year, year]).values_list('year', 'area')
+        )
+        area = areas.get(year)
+        last_area = areas.get(last_year)
 
         response_data = {
             'mode': 'single',
             'state': state,
             'variant': variant,
-            'area': area,
-            'last_year_area': last_area
+            'area': round(area, 2) if area else None,
+            'last_year_area': round(last_area, 2) if last_area else None
         }
         return JsonResponse(response_data)
 
     # 단일 state 지정, variant 없음 → spring + winter 나눠서 표시
-    if state and not variant:
-        current = {}
-        previous = {}
-
-        for ts in qs.filter(crop_season__state__name=state):
-            key = ts.variant or 'None'
-            if ts.crop_season.year == year:
-                current[key] = current.get(key, 0.0) + (ts.area or 0)
-            elif ts.crop_season.year == last_year:
-                previous[key] = previous.get(key, 0.0) + (ts.area or 0)
-
-        parts = []
-        for variant_key in current:
-            cur = current.get(variant_key, 0.0)
-            prev = previous.get(variant_key, 0.0)
-            parts.append({
-                'variant': variant_key,
-                'area': round(cur, 2),
-                'last_year_area': round(prev, 2),
-                'diff': round(cur - prev, 2),
-                'percent_change': round((cur - prev) / prev * 100, 1) if prev else None
-            })
-
-        response_data = {
-            'mode': 'state_summary',
-            'state': state,
-            'areas': parts
+    rows = summaries.filter(year=year).exclude(variant=AreaSummary.VARIANT_ALL).values(
+        'variant', 'area', 'last_year_area', 'diff', 'percent_change'
+    )
+    parts = [
+        {
+            'variant': row['variant'] or 'None',
+            'area': round(row['area'] or 0.0, 2),
+            'last_year_area': round(row['last_year_area'], 2),
+            'diff': round(row['diff'], 2),
+            'percent_change': round(row['percent_change'], 1) if row['percent_change'] is not None else None
         }
-        return JsonResponse(response_data)
+        for row in rows
+    ]
+
+    response_data = {
+        'mode': 'state_summary',
+        'state': state,
+        'areas': parts
+    }
+    return JsonResponse(response_data)
 
 
 @require_GET
+@cache_response
 def country_boundaries(request):
     country_name = request.GET.get('country')
 
@@ -330,6 +294,7 @@ def country_boundaries(request):
 
 
 @require_GET
+@cache_response
 def state_boundary(request):
     state_name = request.GET.get('state')
     country_name = request.GET.get('country')
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import NirvRecord
+from .models import NirvClimatology, NirvRecord
 
 @admin.register(NirvRecord)
 class NirvRecordAdmin(admin.ModelAdmin):
@@ -15,3 +15,10 @@ class NirvRecordAdmin(admin.ModelAdmin):
             url = f"/media/{obj.file_path}"
             return format_html('<a href="{}" target="_blank">📎 파일 보기</a>', url)
         return "-"
+
+
+@admin.register(NirvClimatology)
+class NirvClimatologyAdmin(admin.ModelAdmin):
+    list_display = ("state", "crop", "baseline_start", "baseline_end", "years", "updated_at")
+    list_filter = ("crop", "state")
+    readonly_fields = ("source_signature", "updated_at")
@@ -0,0 +1,122 @@
+import numpy as np
+
+from .climatology import (
+    MULTI_BASELINE,
+    get_climatologies,
+    read_series,
+    records_by_state,
+)
+from .models import NirvRecord
+
+DOY_COUNT = 366
+
+# Z-score class edges, right-inclusive like the former pd.cut bins: (-inf, -2] -> 1 ... (2, inf) -> 7
+ZSCORE_BINS = np.array([-2, -1.5, -1, 1, 1.5, 2])
+ZSCORE_LABELS = [
+    "Extremely bad", "Bad", "Poor", "Slightly below normal",
+    "Slightly above normal", "Good", "Extremely good"
+]
+
+
+def _valid_doy(cols, count):
+    """Mask of DOYs that map to a grid column (finite, 1..``count``)."""
+    return np.isfinite(cols) & (cols >= 1) & (cols <= count)
+
+
+def _place(grid, row, doy, values):
+    """Write ``values`` (aligned with ``doy``) into ``grid[row]`` at column ``doy - 1``."""
+    n = min(len(doy), len(values))
+    if not n:
+        return
+    cols = np.array(doy[:n], dtype=float)
+    vals = np.array(values[:n], dtype=float)
+    ok = _valid_doy(cols, grid.shape[1])
+    grid[row, cols[ok].astype(int) - 1] = vals[ok]
+
+
+class AnomalyGrid:
+    """Current-year NIRv of many states against their baselines on one (state x DOY) grid.
+
+    Z-scores, the 7 classes (0 = no value) and each state's last sensing DOY
+    are computed for every state at once with array operations.
+    """
+
+    def __init__(self, states, current, mean, std):
+        self.states = list(states)
+        self.current = current
+        self.doy = np.arange(1, current.shape[1] + 1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.zscore = (current - mean) / np.where(std == 0, np.nan, std)
+        valid = np.isfinite(self.zscore)
+        self.class_num = np.where(valid, np.digitize(self.zscore, ZSCORE_BINS, right=True) + 1, 0)
+
+        observed = np.isfinite(current)
+        last = current.shape[1] - 1 - np.argmax(observed[:, ::-1], axis=1)
+        self.has_current = observed.any(axis=1)
+        self.last_sensing_doy = np.where(self.has_current, self.doy[last], 0)
+
+    @classmethod
+    def from_series(cls, series):
+        """``series``: (state, doy, current, mean, std) per state, value lists aligned on ``doy``."""
+        series = list(series)
+        shape = (len(series), DOY_COUNT)
+        current, mean, std = np.full(shape, np.nan), np.full(shape, np.nan), np.full(shape, np.nan)
+        for row, (state, doy, current_y, mean_y, std_y) in enumerate(series):
+            try:
+                _place(current, row, doy, current_y)
+                _place(mean, row, doy, mean_y)
+                _place(std, row, doy, std_y)
+            except (TypeError, ValueError) as e:
+                # 한 주의 잘못된 값이 다른 주의 계산을 막지 않도록 해당 행만 비움
+                print(f"⚠️ [nirv.anomaly] {state}: {e}")
+                current[row], mean[row], std[row] = np.nan, np.nan, np.nan
+        return cls([s[0] for s in series], current, mean, std)
+
+    def state_classes(self, row, doy):
+        """(doy, labels, class numbers) of one state over ``doy``, as the graph APIs return them.
+
+        DOYs outside the grid (missing, < 1 or > 366) are skipped, as when the grid is built.
+        """
+        cols = np.array(doy, dtype=float)
+        cols = cols[_valid_doy(cols, self.class_num.shape[1])].astype(int)
+        doy = cols.tolist()
+        nums = self.class_num[row, cols - 1]
+        labels = [ZSCORE_LABELS[n - 1] if n else None for n in nums]
+        return doy, labels, nums.tolist()
+
+    def last_doy(self, row):
+        return int(self.last_sensing_doy[row]) if self.has_current[row] else None
+
+    def to_dict(self):
+        zscore = np.round(self.zscore, 4).astype(object)
+        zscore[~np.isfinite(self.zscore)] = None
+        return {
+            "states": self.states,
+            "doy": self.doy.tolist(),
+            "labels": ZSCORE_LABELS,
+            "zscore": zscore.tolist(),
+            "class_num": self.class_num.tolist(),
+            "last_sensing_doy": [self.last_doy(row) for row in range(len(self.states))],
+        }
+
+
+def national_anomaly_grid(crop, year, baseline=MULTI_BASELINE):
+    """Anomaly grid of every state with a NirvRecord for ``crop`` in ``year``."""
+    start, end = baseline
+    state_names = dict(
+        NirvRecord.objects.filter(crop=crop, year=year)
+        .values_list("state", "state__name")
+        .distinct()
+    )
+    records = records_by_state(crop, {*range(start, end + 1), year}, states=list(state_names))
+    climatologies = get_climatologies(
+        crop, {state_id: records.get(state_id, {}) for state_id in state_names}, baseline
+    )
+    series = []
+    for state_id, name in sorted(state_names.items(), key=lambda item: item[1]):
+        clim = climatologies[state_id]
+        record = records.get(state_id, {}).get(year)
+        current = read_series(record, "nirv.anomaly_grid") if record else None
+        doy = clim.doy if clim.years else list(range(1, DOY_COUNT))
+        series.append((name, doy, [] if current is None else current.tolist(), clim.mean, clim.std))
+    return AnomalyGrid.from_series(series)
@@ -0,0 +1,139 @@
+import hashlib
+import os
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import IntegrityError
+
+from core.models import Crop
+
+from .models import NirvClimatology, NirvRecord
+
+# 평년 구간 (시작, 끝 연도 포함)
+GRAPH_BASELINE = (2018, 2024)
+MULTI_BASELINE = (2018, 2023)
+
+
+# 📄 전체 파일 경로 구성 함수
+def build_full_path(relative_path):
+    """
+    DB에 저장된 경로(윈도우 백슬래시 포함 가능)를 리눅스에서도 올바르게 처리
+    """
+    if not relative_path:
+        return None
+
+    # 윈도우 백슬래시를 슬래시로 변환
+    safe_path = str(relative_path).replace("\\", "/")
+
+    # 드라이브 문자(Y:/...) 제거 후 항상 MEDIA_ROOT 기준으로 결합
+    drive, tail = os.path.splitdrive(safe_path)
+    safe_path = tail.lstrip("/")
+
+    normalized = os.path.join(settings.MEDIA_ROOT, safe_path)
+    return os.path.normpath(normalized)
+
+
+def to_json_list(series):
+    """NaN/Infinity는 None으로 바꿔 JSON 리스트로 변환"""
+    return series.replace([np.nan, np.inf, -np.inf], None).tolist()
+
+
+def read_series(record, label="nirv"):
+    """NirvRecord CSV의 첫 번째 열 (파일이 없으면 None)"""
+    fpath = build_full_path(record.file_path)
+    if not os.path.exists(fpath):
+        print(f"⚠️ [{label}] File not found: {fpath}")
+        return None
+    df = pd.read_csv(fpath, index_col=0)
+    return df.iloc[:, 0]
+
+
+def records_by_state(crop, years, states=None):
+    """{state_id: {year: NirvRecord}} for ``years`` in one query."""
+    records = NirvRecord.objects.filter(crop=crop, year__in=list(years))
+    if states is not None:
+        records = records.filter(state__in=states)
+    grouped = defaultdict(dict)
+    for record in records:
+        grouped[record.state_id][record.year] = record
+    return grouped
+
+
+def source_signature(records):
+    """Hash of the baseline files' paths, sizes and modification times."""
+    parts = []
+    for record in sorted(records, key=lambda r: r.year):
+        try:
+            stat = os.stat(build_full_path(record.file_path))
+            parts.append(f"{record.year}|{record.file_path}|{stat.st_mtime_ns}|{stat.st_size}")
+        except (OSError, TypeError):
+            parts.append(f"{record.year}|{record.file_path}|missing")
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def compute_climatology(records):
+    """DOY별 평년 평균/표준편차/95% 구간 (mean ± 1.96 std)"""
+    years, series = [], []
+    for record in sorted(records, key=lambda r: r.year):
+        values = read_series(record, "nirv.climatology")
+        if values is not None:
+            years.append(record.year)
+            series.append(values)
+    if not series:
+        return {"years": [], "doy": [], "mean": [], "std": [], "lower": [], "upper": []}
+
+    df_all = pd.concat(series, axis=1)
+    mean = df_all.mean(axis=1)
+    std = df_all.std(axis=1)
+    return {
+        "years": years,
+        "doy": df_all.index.tolist(),
+        "mean": to_json_list(mean),
+        "std": to_json_list(std),
+        "lower": to_json_list(mean - 1.96 * std),
+        "upper": to_json_list(mean + 1.96 * std),
+    }
+
+
+def get_climatologies(crop, records, baseline):
+    """Stored climatology per state, rebuilt only for states whose baseline files changed.
+
+    ``records`` is the ``records_by_state`` mapping already loaded by the view;
+    the stored rows for every state come back in one query. The loaders rebuild
+    rows up front (``refresh_climatologies``), so this is normally read-only.
+    """
+    start, end = baseline
+    stored = {
+        clim.state_id: clim
+        for clim in NirvClimatology.objects.filter(
+            crop=crop, state_id__in=list(records), baseline_start=start, baseline_end=end
+        )
+    }
+    for state_id, by_year in records.items():
+        baseline_records = [r for year, r in by_year.items() if start <= year <= end]
+        signature = source_signature(baseline_records)
+        clim = stored.get(state_id)
+        if clim is not None and clim.source_signature == signature:
+            continue
+        key = {"crop": crop, "state_id": state_id, "baseline_start": start, "baseline_end": end}
+        defaults = {**compute_climatology(baseline_records), "source_signature": signature}
+        try:
+            stored[state_id], _ = NirvClimatology.objects.update_or_create(**key, defaults=defaults)
+        except IntegrityError:
+            # A concurrent request created the row first; both computed it from the same files.
+            stored[state_id] = NirvClimatology.objects.get(**key)
+    return stored
+
+
+def refresh_climatologies(baselines=(GRAPH_BASELINE, MULTI_BASELINE)):
+    """Rebuild stale stored climatologies of every crop and state with NIRv records.
+
+    Run by the NIRv loaders after new files are registered or downloaded, so the
+    graph APIs find up-to-date rows instead of rebuilding them inside a request.
+    """
+    for crop in Crop.objects.filter(nirvrecord__isnull=False).distinct():
+        for start, end in baselines:
+            records = records_by_state(crop, range(start, end + 1))
+            get_climatologies(crop, records, (start, end))
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.1 on 2026-10-17 09:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0002_alter_crop_name"),
+        ("nirv", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NirvClimatology",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("baseline_start", models.PositiveIntegerField()),
+                ("baseline_end", models.PositiveIntegerField()),
+                ("years", models.JSONField(default=list)),
+                ("doy", models.JSONField(default=list)),
+                ("mean", models.JSONField(default=list)),
+                ("std", models.JSONField(default=list)),
+                ("lower", models.JSONField(default=list)),
+                ("upper", models.JSONField(default=list)),
+                ("source_signature", models.CharField(max_length=64)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "crop",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="core.crop"
+                    ),
+                ),
+                (
+                    "state",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="core.state"
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("crop", "state", "baseline_start", "baseline_end")},
+            },
+        ),
+    ]
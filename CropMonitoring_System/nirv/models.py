@@ -24,3 +24,30 @@ class NirvRecord(models.Model):
         # Normalize separators so Windows-style paths in the DB also work on Linux
         normalized = self.file_path.replace("\\", "/")
         return str(Path(settings.MEDIA_ROOT) / Path(normalized))
+
+
+class NirvClimatology(models.Model):
+    """평년(baseline) NIRv 통계: DOY별 평균/표준편차/95% 구간을 미리 계산해 저장"""
+
+    crop = models.ForeignKey(Crop, on_delete=models.CASCADE)
+    state = models.ForeignKey(State, on_delete=models.CASCADE)
+    baseline_start = models.PositiveIntegerField()
+    baseline_end = models.PositiveIntegerField()
+
+    # Baseline years actually read, and arrays aligned on ``doy``
+    years = models.JSONField(default=list)
+    doy = models.JSONField(default=list)
+    mean = models.JSONField(default=list)
+    std = models.JSONField(default=list)
+    lower = models.JSONField(default=list)
+    upper = models.JSONField(default=list)
+
+    # Hash of the baseline files (path, mtime, size); a mismatch triggers a rebuild
+    source_signature = models.CharField(max_length=64)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("crop", "state", "baseline_start", "baseline_end")
+
+    def __str__(self):
+        return f"{self.state.name} {self.crop.name} ({self.baseline_start}-{self.baseline_end})"
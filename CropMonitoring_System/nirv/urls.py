@@ -9,6 +9,7 @@ urlpatterns = [
     path("api/years/", views.available_years, name="nirv_available_years"),
     path("api/states/", views.available_states, name="nirv_available_states"),
     path("api/multi-graph/", views.multi_graph_data, name="nirv_multi_graph_data"),
+    path("api/anomaly-grid/", views.anomaly_grid, name="nirv_anomaly_grid"),
 
 ]
 
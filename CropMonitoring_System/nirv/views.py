@@ -1,13 +1,21 @@
-import os
 import pandas as pd
 import numpy as np
 from django.shortcuts import render
 from django.http import JsonResponse
 from django.views.decorators.http import require_GET
-from django.conf import settings
 
+from .anomaly import AnomalyGrid, national_anomaly_grid
+from .climatology import (
+    GRAPH_BASELINE,
+    MULTI_BASELINE,
+    get_climatologies,
+    read_series,
+    records_by_state,
+    to_json_list,
+)
 from .models import NirvRecord
 from core.models import Crop, State
+from core.response_cache import cache_response
 
 
 def sanitize_for_json(obj):
@@ -25,25 +33,6 @@ def sanitize_for_json(obj):
     return obj
 
 
-# 📄 전체 파일 경로 구성 함수
-def build_full_path(relative_path):
-    """
-    DB에 저장된 경로(윈도우 백슬래시 포함 가능)를 리눅스에서도 올바르게 처리
-    """
-    if not relative_path:
-        return None
-
-    # 윈도우 백슬래시를 슬래시로 변환
-    safe_path = str(relative_path).replace("\\", "/")
-
-    # 드라이브 문자(Y:/...) 제거 후 항상 MEDIA_ROOT 기준으로 결합
-    drive, tail = os.path.splitdrive(safe_path)
-    safe_path = tail.lstrip("/")
-
-    normalized = os.path.join(settings.MEDIA_ROOT, safe_path)
-    return os.path.normpath(normalized)
-
-
 # 🌐 기본 맵 페이지: crop만 미리 로딩 (나머지는 JS에서 동적 호출)
 def nirv_map(request):
     crops = NirvRecord.objects.values_list('crop__name', flat=True).distinct().order_by('crop__name')
@@ -51,28 +40,16 @@ def nirv_map(request):
         'crops': crops,
     })
 
-def compute_zscore_series(baseline_series_list, current_series):
-    import numpy as np
-    if not baseline_series_list or not current_series.any():
-        return [], [], []
-
-    baseline_df = pd.concat(baseline_series_list, axis=1)
-    mean = baseline_df.mean(axis=1)
-    std = baseline_df.std(axis=1)
-    z = (current_series - mean) / std.replace(0, np.nan)
-
-    bins = [-np.inf, -2, -1.5, -1, 1, 1.5, 2, np.inf]
-    labels = [
-        "Extremely bad", "Bad", "Poor", "Slightly below normal",
-        "Slightly above normal", "Good", "Extremely good"
-    ]
-    z_class = pd.cut(z, bins=bins, labels=labels)
-    z_class_num = z_class.cat.codes + 1  # 1~7
-
-    return current_series.index.tolist(), z_class.tolist(), z_class_num.tolist()
+def _year_values(by_year, year, label):
+    record = by_year.get(year)
+    if not record:
+        return []
+    values = read_series(record, label)
+    return [] if values is None else to_json_list(values)
 
 
 @require_GET
+@cache_response
 def graph_data(request):
     crop_name = request.GET.get("crop")
     state_name = request.GET.get("state")
@@ -88,68 +65,27 @@ def graph_data(request):
     if not crop or not state:
         return JsonResponse({"error": "Invalid crop or state"}, status=400)
 
-    # === 1. 평년 처리 === #
-    avg_dfs = []
-    for y in range(2018, 2025):
-        record = NirvRecord.objects.filter(crop=crop, state=state, year=y).first()
-        if record:
-            fpath = build_full_path(record.file_path)
-            if os.path.exists(fpath):
-                df = pd.read_csv(fpath, index_col=0)
-                avg_dfs.append(df.iloc[:, 0])  # 첫 번째 열만
-            else:
-                print(f"⚠️ [nirv.graph_data] File not found: {fpath}")
-
-    if avg_dfs:
-        df_all = pd.concat(avg_dfs, axis=1)
-        df_all.columns = [str(y) for y in range(2018, 2018 + len(avg_dfs))]
-        mean_series = df_all.mean(axis=1)
-        std_series = df_all.std(axis=1)
-        lower = (mean_series - 1.96 * std_series).replace([np.nan, np.inf, -np.inf], None).tolist()
-        upper = (mean_series + 1.96 * std_series).replace([np.nan, np.inf, -np.inf], None).tolist()
-        mean = mean_series.replace([np.nan, np.inf, -np.inf], None).tolist()
-        x = df_all.index.tolist()
+    # === 1. 평년 처리 (저장된 climatology) === #
+    baseline_years = range(GRAPH_BASELINE[0], GRAPH_BASELINE[1] + 1)
+    records = records_by_state(crop, {*baseline_years, year - 1, year}, states=[state])
+    by_year = records.get(state.id, {})
+    clim = get_climatologies(crop, {state.id: by_year}, GRAPH_BASELINE)[state.id]
+    if clim.years:
+        mean, lower, upper, x = clim.mean, clim.lower, clim.upper, clim.doy
     else:
         mean, lower, upper, x = [], [], [], list(range(1, 366))
 
     # === 2. 전년도 === #
-    last = NirvRecord.objects.filter(crop=crop, state=state, year=year - 1).first()
-    last_y = []
-    if last:
-        fpath = build_full_path(last.file_path)
-        if os.path.exists(fpath):
-            df = pd.read_csv(fpath, index_col=0)
-            last_y = df.iloc[:, 0].replace([np.nan, np.inf, -np.inf], None).tolist()
-        else:
-            print(f"⚠️ [nirv.graph_data] Last year file not found: {fpath}")
+    last_y = _year_values(by_year, year - 1, "nirv.graph_data")
 
     # === 3. 올해 === #
-    current = NirvRecord.objects.filter(crop=crop, state=state, year=year).first()
-    current_y = []
-    if current:
-        fpath = build_full_path(current.file_path)
-        if os.path.exists(fpath):
-            df = pd.read_csv(fpath, index_col=0)
-            current_y = df.iloc[:, 0].replace([np.nan, np.inf, -np.inf], None).tolist()
-            print(f"✅ [nirv.graph_data] Current year file loaded: {fpath}")
-        else:
-            print(f"⚠️ [nirv.graph_data] Current year file not found: {fpath}")
+    current_y = _year_values(by_year, year, "nirv.graph_data")
 
     zscore_doy, zscore_class_label, zscore_class_num = [], [], []
-    if avg_dfs and current_y:
+    if clim.years and current_y:
         try:
-            current_length = len(current_y)
-
-            # baseline도 동일한 길이로 잘라냄
-            clipped_baseline = [s.iloc[:current_length] for s in avg_dfs]
-
-            # x 값도 자름
-            current_x = x[:current_length]
-            current_series = pd.Series(current_y, index=current_x)
-
-            # Z-score 계산
-            zscore_doy, zscore_class_label, zscore_class_num = compute_zscore_series(clipped_baseline, current_series)
-
+            grid = AnomalyGrid.from_series([(state.name, x, current_y, clim.mean, clim.std)])
+            zscore_doy, zscore_class_label, zscore_class_num = grid.state_classes(0, x[:len(current_y)])
         except Exception as e:
             print("❌ Z-score 계산 오류:", e)
 
@@ -172,6 +108,7 @@ def graph_data(request):
 
 # 🔄 API: crop 선택 → 사용 가능한 연도 목록
 @require_GET
+@cache_response
 def available_years(request):
     crop_name = request.GET.get("crop")
     crop = Crop.objects.filter(name=crop_name).first()
@@ -184,6 +121,7 @@ def available_years(request):
 
 # 🔄 API: crop + year 선택 → 사용 가능한 주(state) 목록
 @require_GET
+@cache_response
 def available_states(request):
     crop_name = request.GET.get("crop")
     year = request.GET.get("year")
@@ -198,6 +136,7 @@ def available_states(request):
 
 
 @require_GET
+@cache_response
 def multi_graph_data(request):
     crop_name = request.GET.get("crop")
     year = request.GET.get("year")
@@ -211,118 +150,73 @@ def multi_graph_data(request):
     if not crop:
         return JsonResponse({"error": "Invalid crop"}, status=400)
 
-    records = NirvRecord.objects.filter(crop=crop, year=year)
-    states = records.values_list("state", flat=True).distinct()
+    baseline_years = range(MULTI_BASELINE[0], MULTI_BASELINE[1] + 1)
+    states = list(
+        NirvRecord.objects.filter(crop=crop, year=year)
+        .values_list("state", flat=True)
+        .distinct()
+    )
+    state_names = dict(State.objects.filter(pk__in=states).values_list("pk", "name"))
+    records = records_by_state(crop, {*baseline_years, year - 1, year}, states=states)
+    climatologies = get_climatologies(crop, {state_id: records.get(state_id, {}) for state_id in states}, MULTI_BASELINE)
 
     # 디버깅: 레코드 수 확인
-    print(f"🔍 NIRv multi-graph: crop={crop_name}, year={year}, records={records.count()}, states={list(states)}")
+    print(f"🔍 NIRv multi-graph: crop={crop_name}, year={year}, states={states}")
 
     all_data = []
+    series, baselines = [], []
 
     for state_id in states:
         try:
-            state = State.objects.get(pk=state_id)
-
-            x = list(range(1, 366))
-            avg_dfs = []
-
-            # === baseline data ===
-            for y in range(2018, 2024):
-                record = NirvRecord.objects.filter(crop=crop, state=state, year=y).first()
-                if record:
-                    fpath = build_full_path(record.file_path)
-                    if os.path.exists(fpath):
-                        df = pd.read_csv(fpath, index_col=0)
-                        avg_dfs.append(df.iloc[:, 0])
-                        x = df.index
-                    else:
-                        print(f"⚠️ [nirv.multi_graph_data] Baseline file not found ({y}): {fpath}")
-
-        # === 평년 평균/표준편차 계산 ===
-            if avg_dfs:
-                df_all = pd.concat(avg_dfs, axis=1)
-                mean = df_all.mean(axis=1).replace([np.nan, np.inf, -np.inf], None).tolist()
-                std = df_all.std(axis=1)
-                lower = (df_all.mean(axis=1) - 1.96 * std).replace([np.nan, np.inf, -np.inf], None).tolist()
-                upper = (df_all.mean(axis=1) + 1.96 * std).replace([np.nan, np.inf, -np.inf], None).tolist()
+            state_name = state_names[state_id]
+            by_year = records.get(state_id, {})
+            clim = climatologies[state_id]
+
+            # === 평년 평균/표준편차 ===
+            if clim.years:
+                x, mean, lower, upper = clim.doy, clim.mean, clim.lower, clim.upper
             else:
-                mean, lower, upper = [], [], []
+                x, mean, lower, upper = list(range(1, 366)), [], [], []
 
             # === 전년도 ===
-            last = NirvRecord.objects.filter(crop=crop, state=state, year=year - 1).first()
-            last_y = []
-            if last:
-                fpath = build_full_path(last.file_path)
-                if os.path.exists(fpath):
-                    df = pd.read_csv(fpath, index_col=0)
-                    last_y = df.iloc[:, 0].replace([np.nan, np.inf, -np.inf], None).tolist()
-                else:
-                    print(f"⚠️ [nirv.multi_graph_data] Last year file not found: {fpath}")
+            last_y = _year_values(by_year, year - 1, "nirv.multi_graph_data")
 
             # === 올해 ===
-            current = NirvRecord.objects.filter(crop=crop, state=state, year=year).first()
-            current_y = []
-            if current:
-                fpath = build_full_path(current.file_path)
-                if os.path.exists(fpath):
-                    df = pd.read_csv(fpath, index_col=0)
-                    current_y = df.iloc[:, 0].replace([np.nan, np.inf, -np.inf], None).tolist()
-                    print(f"✅ [nirv.multi_graph_data] Current year file loaded ({state.name}): {fpath}")
-                else:
-                    print(f"⚠️ [nirv.multi_graph_data] Current year file not found ({state.name}): {fpath}")
-            # 마지막 유효 DOY 계산
-            last_sensing_doy = None
-            if current_y:
-                for idx in range(len(current_y) - 1, -1, -1):
-                    val = current_y[idx]
-                    if val is not None and not pd.isna(val):
-                        # x_list는 current_x로 제한되어 있음
-                        current_x = x[:len(current_y)]
-                        raw_doy = current_x[idx] if idx < len(current_x) else idx + 1
-                        last_sensing_doy = int(raw_doy)
-                        break
-
-            # === Z-score 계산 ===
-            zscore_doy, zscore_class_label, zscore_class_num = [], [], []
-            if avg_dfs and current_y:
-                try:
-                    current_length = len(current_y)
-                    clipped_baseline = [s.iloc[:current_length] for s in avg_dfs]
-                    current_x = x[:current_length]
-                    current_series = pd.Series(current_y, index=current_x)
-                    zscore_doy, zscore_class_label, zscore_class_num = compute_zscore_series(clipped_baseline, current_series)
-                except Exception as e:
-                    print(f"❌ Z-score 계산 오류 ({state.name}):", e)
-
-            # x 값을 안전하게 변환
-            x_list = []
-            if hasattr(x, "tolist"):
-                x_list = [int(val) if not pd.isna(val) else None for val in x.tolist()]
-            elif isinstance(x, list):
-                x_list = x
-            else:
-                x_list = list(range(1, 366))
-
-
-
+            current_y = _year_values(by_year, year, "nirv.multi_graph_data")
 
+            series.append((state_name, x, current_y, clim.mean, clim.std))
+            baselines.append(bool(clim.years))
             all_data.append({
-                "state": state.name,
-                "x": x_list,
+                "state": state_name,
+                "x": [int(val) if val is not None and not pd.isna(val) else None for val in x],
                 "mean": mean,
                 "lower": lower,
                 "upper": upper,
-            "last": last_y,
-            "current": current_y,
-            "last_sensing_doy": last_sensing_doy,
-            "zscore_doy": zscore_doy,
-            "zscore_class_label": zscore_class_label,
-            "zscore_class_num": zscore_class_num,
-        })
+                "last": last_y,
+                "current": current_y,
+                "last_sensing_doy": None,
+                "zscore_doy": [],
+                "zscore_class_label": [],
+                "zscore_class_num": [],
+            })
         except Exception as e:
             print(f"[multi_graph_data] state {state_id} error: {e}")
             continue
 
+    # === Z-score / 마지막 유효 DOY: 모든 주를 한 번에 계산 ===
+    grid = AnomalyGrid.from_series(series)
+    for row, (entry, (_, x, current_y, _, _), has_baseline) in enumerate(zip(all_data, series, baselines)):
+        try:
+            entry["last_sensing_doy"] = grid.last_doy(row)
+            if has_baseline and current_y:
+                (
+                    entry["zscore_doy"],
+                    entry["zscore_class_label"],
+                    entry["zscore_class_num"],
+                ) = grid.state_classes(row, x[:len(current_y)])
+        except Exception as e:
+            print(f"❌ Z-score 계산 오류 ({entry['state']}):", e)
+
     # 디버깅: 반환 데이터 확인
     print(f"✅ NIRv multi-graph: returning {len(all_data)} states")
 
@@ -336,3 +230,27 @@ def nirv_map_multi(request):
     return render(request, 'nirv/nirv_map_multi.html', {
         'crops': crops,
     })
+
+
+# 🌐 API: crop + year → 전체 주(state) x DOY 이상치(Z-score) 그리드
+@require_GET
+@cache_response
+def anomaly_grid(request):
+    crop_name = request.GET.get("crop")
+    year = request.GET.get("year")
+
+    if not crop_name or not year:
+        return JsonResponse({"error": "Missing crop or year"}, status=400)
+
+    crop = Crop.objects.filter(name=crop_name).first()
+    if not crop:
+        return JsonResponse({"error": "Invalid crop"}, status=400)
+
+    year = int(year)
+    grid = national_anomaly_grid(crop, year)
+    return JsonResponse({
+        "crop": crop.name,
+        "year": year,
+        "baseline": list(MULTI_BASELINE),
+        **grid.to_dict(),
+    })
@@ -10,6 +10,7 @@ django.setup()
 
 from core.models import State, Crop, CropSeason
 from area.models import CultivatedArea
+from core.response_cache import bump_data_version
 
 
 crop_values= ['Corn', 'Soybean']# , 'Wheat_Spring', 'Wheat_Winter' 'Corn', 'Soybean'
@@ -48,4 +49,7 @@ for crop_value in crop_values:
         CultivatedArea.objects.update_or_create(
             crop_season=crop_season,
             defaults={'area_acres': area}
-        )
\ No newline at end of file
+        )
+
+# 캐시된 대시보드 응답 무효화
+bump_data_version()
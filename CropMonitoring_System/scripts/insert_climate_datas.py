@@ -7,6 +7,7 @@ django.setup()
 
 from core.models import Crop, State, CropSeason
 from climate.models import ClimateCSV, ClimateImage
+from core.response_cache import bump_data_version
 from django.db import transaction
 
 # 설정 값
@@ -71,3 +72,5 @@ def populate_climate_data():
 
 if __name__ == "__main__":
     populate_climate_data()
+    # 캐시된 대시보드 응답 무효화
+    bump_data_version()
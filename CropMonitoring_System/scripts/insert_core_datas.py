@@ -5,6 +5,7 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "CropMonitoring_System.settings"
 django.setup()
 
 from core.models import Country, State, Crop, CropSeason
+from core.response_cache import bump_data_version
 
 # # 기본 설정
 crop_name = "Wheat_Spring"
@@ -73,3 +74,6 @@ for state_name in states:
 
 print(f"{created_states}개 State 생성")
 print(f"{created_seasons}개 CropSeason 생성")
+
+# 캐시된 대시보드 응답 무효화
+bump_data_version()
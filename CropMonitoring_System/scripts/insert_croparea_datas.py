@@ -15,6 +15,7 @@ django.setup()
 
 from core.models import CropSeason
 from maps.models import TileSet
+from core.response_cache import bump_data_version
 
 
 
@@ -118,3 +119,6 @@ if __name__ == '__main__':
 
     for year in [2024]:
         main(rf"Y:\DATA\CropMonitoring\USA\GEE\Cropmap_color\Wheat\{year}_Wheat_log.csv")  # CSV 파일 경로를 여기에 지정
+
+    # 캐시된 대시보드 응답 무효화
+    bump_data_version()
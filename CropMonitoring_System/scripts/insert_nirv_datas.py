@@ -7,8 +7,10 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "CropMonitoring_System.settings"
 django.setup()
 
 from django.conf import settings
+from nirv.climatology import refresh_climatologies
 from nirv.models import NirvRecord
 from core.models import Country, State, Crop
+from core.response_cache import bump_data_version
 
 # 경로 정의
 nirv_root = os.path.join(settings.MEDIA_ROOT, "USA", "GEE", "Monitoring", "NIRv")
@@ -63,3 +65,9 @@ for crop_dir in os.listdir(nirv_root):
                 print(f"✅ Registered: {relative_path}")
 
 print(f"\n🎉 등록 완료: {count}건")
+
+# 평년 통계를 미리 갱신 (그래프 요청 중 재계산 방지)
+refresh_climatologies()
+
+# 캐시된 대시보드 응답 무효화
+bump_data_version()
@@ -1,3 +1,4 @@
+import json
 import os
 from pathlib import Path
 
@@ -93,3 +94,76 @@ MEDIA_ROOT = Path(os.getenv("MEDIA_ROOT", str(BASE_DIR / "media"))).resolve()
 DATA_INPUT_DIR = Path(os.getenv("DATA_INPUT_PATH", MEDIA_ROOT / "input")).resolve()
 DATA_OUTPUT_DIR = Path(os.getenv("DATA_OUTPUT_PATH", MEDIA_ROOT / "output")).resolve()
 DATA_LOG_DIR = Path(os.getenv("DATA_LOG_PATH", MEDIA_ROOT / "logs")).resolve()
+
+# Progress reporting: buffered increments are flushed to Redis every PROGRESS_FLUSH_MS,
+# the cancel flag is polled every CANCEL_POLL_MS
+PROGRESS_FLUSH_MS = int(os.getenv("PROGRESS_FLUSH_MS", "500"))
+CANCEL_POLL_MS = int(os.getenv("CANCEL_POLL_MS", "1000"))
+
+# Compute inventory: GPU/CPU/memory snapshot cached for COMPUTE_INVENTORY_TTL_SEC and refreshed
+# in the background; COMPUTE_GPU_PROBE "none" reports CPU and memory only (hosts without GPUs)
+COMPUTE_INVENTORY_TTL_SEC = float(os.getenv("COMPUTE_INVENTORY_TTL_SEC", "10"))
+COMPUTE_GPU_PROBE = os.getenv("COMPUTE_GPU_PROBE", "auto").lower()
+
+# Job scheduler: jobs and their steps start when their GPU/CPU/memory leases fit.
+# "fifo": oldest pending job first, "priority": highest Job.priority first (both backfill smaller jobs)
+SCHEDULER_POLICY = os.getenv("SCHEDULER_POLICY", "fifo").lower()
+# CPU worker slots (0 = usable cores) and the share of host memory leases may take
+SCHEDULER_CPU_SLOTS = int(os.getenv("SCHEDULER_CPU_SLOTS", "0"))
+SCHEDULER_MEMORY_FRACTION = float(os.getenv("SCHEDULER_MEMORY_FRACTION", "0.8"))
+# Per-step overrides, e.g. {"merge": {"cpu_workers": 8, "memory_mb": 16000}}
+SCHEDULER_STEP_DEMANDS = json.loads(os.getenv("SCHEDULER_STEP_DEMANDS", "{}"))
+# Jobs holding resources at once (0 = no limit, 1 = one job at a time as before)
+SCHEDULER_MAX_RUNNING_JOBS = int(os.getenv("SCHEDULER_MAX_RUNNING_JOBS", "0"))
+# Seconds before a step waiting for resources retries
+SCHEDULER_RETRY_SEC = int(os.getenv("SCHEDULER_RETRY_SEC", "15"))
+
+# Workflow: "chain" runs each step for all states before the next (legacy), "per_state"
+# starts a state's merge, area and thumbnail steps as soon as its inference finishes
+WORKFLOW_MODE = os.getenv("WORKFLOW_MODE", "chain").lower()
+
+# Inference tuning
+INFERENCE_READ_STRIP_ROWS = int(os.getenv("INFERENCE_READ_STRIP_ROWS", "1024"))
+# "window": percentile stretch per window (legacy), "tile": once per tile, "state": once per state (cached)
+INFERENCE_NORMALIZE_MODE = os.getenv("INFERENCE_NORMALIZE_MODE", "window").lower()
+INFERENCE_STATS_APPROX = os.getenv("INFERENCE_STATS_APPROX", "False").lower() == "true"
+# "stream": keep one window of rows and write finished rows to disk, "dense": whole-tile accumulator
+INFERENCE_ACCUMULATE_MODE = os.getenv("INFERENCE_ACCUMULATE_MODE", "stream").lower()
+# "float32", "float16" or "uint8" (quantized probabilities)
+INFERENCE_ACCUM_PRECISION = os.getenv("INFERENCE_ACCUM_PRECISION", "float32").lower()
+# Window overlap weighting: "uniform" (legacy), "gaussian" or "cosine"
+INFERENCE_BLEND_MODE = os.getenv("INFERENCE_BLEND_MODE", "uniform").lower()
+# Batches prepared ahead of the GPU by the reader thread (0 = read inline)
+INFERENCE_PREFETCH_BATCHES = int(os.getenv("INFERENCE_PREFETCH_BATCHES", "2"))
+# Model runtime: "eager", "compile" (torch.compile), "torchscript" or "onnx" (ONNX Runtime, CPU capable);
+# traced/exported artifacts are cached next to the weight file
+INFERENCE_RUNTIME = os.getenv("INFERENCE_RUNTIME", "eager").lower()
+# Mixed precision: "off" or "bf16". "fp16" runs in fp32 (the raw 0..65535 inputs overflow fp16),
+# as does "bf16" on GPUs without bfloat16 support
+INFERENCE_AUTOCAST = os.getenv("INFERENCE_AUTOCAST", "off").lower()
+# Compare non-default runtimes against the eager fp32 model and fall back to it on mismatch
+INFERENCE_PARITY_CHECK = os.getenv("INFERENCE_PARITY_CHECK", "True").lower() == "true"
+# Tile outputs: "masks" (one binary GeoTIFF per crop) or "class_index" (one tiled class raster per tile,
+# split into per-crop masks at merge time)
+INFERENCE_OUTPUT_FORMAT = os.getenv("INFERENCE_OUTPUT_FORMAT", "masks").lower()
+
+# Merge tuning
+# "rioxarray": dask merge (legacy, float32 output), "vrt": GDAL VRT mosaic translated to a tiled COG
+# (keeps the tiles' dtype, so merged masks become Byte instead of float32)
+MERGE_ENGINE = os.getenv("MERGE_ENGINE", "rioxarray").lower()
+# GDAL compression threads per merge ("ALL_CPUS" or a number), capped at cpu_count // merge workers
+MERGE_NUM_THREADS = os.getenv("MERGE_NUM_THREADS", "ALL_CPUS")
+# Internal nearest-neighbour overviews on merged masks (read by thumbnails)
+MERGE_BUILD_OVERVIEWS = os.getenv("MERGE_BUILD_OVERVIEWS", "True").lower() == "true"
+
+# Output registration: steps record written files in a manifest that is bulk-upserted in
+# OUTPUT_REGISTER_BATCH rows; OUTPUT_RECONCILE_SCAN also walks the job's output folders
+OUTPUT_REGISTER_BATCH = int(os.getenv("OUTPUT_REGISTER_BATCH", "500"))
+OUTPUT_RECONCILE_SCAN = os.getenv("OUTPUT_RECONCILE_SCAN", "False").lower() == "true"
+
+# Thumbnail tuning
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "4"))
+
+# Area tuning
+# "reproject": UTM reprojection + rasterio.mask (legacy), "zonal": block-streamed geodesic zonal sums
+AREA_ENGINE = os.getenv("AREA_ENGINE", "reproject").lower()
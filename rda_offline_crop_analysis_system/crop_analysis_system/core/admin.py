@@ -7,7 +7,16 @@ from django.conf import settings
 from django import forms
 from django.utils.safestring import mark_safe
 
-from core.models import Country, Crop, Job, JobOutput, PipelineConfig, PipelineConfigCrop, RootPath
+from core.models import (
+    AreaResult,
+    Country,
+    Crop,
+    Job,
+    JobOutput,
+    PipelineConfig,
+    PipelineConfigCrop,
+    RootPath,
+)
 from core.utils.app_settings import get_root_by_type, resolve_root_path
 
 
@@ -168,6 +177,7 @@ class JobAdmin(admin.ModelAdmin):
         "current_step",
         "output_dir_name",
         "progress_percent",
+        "priority",
         "celery_last_state",
         "celery_error",
         "created_at",
@@ -185,6 +195,7 @@ class JobAdmin(admin.ModelAdmin):
         "celery_chain_id",
         "celery_last_state",
         "celery_error",
+        "resource_lease",
         "created_at",
         "updated_at",
     )
@@ -195,3 +206,10 @@ class JobOutputAdmin(admin.ModelAdmin):
     list_display = ("id", "job", "step", "relative_path", "size_bytes", "file_modified_at")
     list_filter = ("step",)
     search_fields = ("relative_path", "absolute_path")
+
+
+@admin.register(AreaResult)
+class AreaResultAdmin(admin.ModelAdmin):
+    list_display = ("id", "country", "year", "state", "crop", "class_id", "area_ha", "job", "updated_at")
+    list_filter = ("country", "year", "crop")
+    search_fields = ("state", "output_root")
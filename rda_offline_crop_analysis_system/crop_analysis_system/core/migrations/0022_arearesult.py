@@ -0,0 +1,58 @@
+# Generated by Django 6.0.1 on 2026-10-17 09:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0021_joboutput_bounds_alter_joboutput_step"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AreaResult",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("output_root", models.CharField(max_length=512)),
+                ("country", models.CharField(max_length=64)),
+                ("state", models.CharField(max_length=128)),
+                ("year", models.CharField(max_length=16)),
+                ("crop", models.CharField(max_length=64)),
+                ("class_id", models.PositiveIntegerField()),
+                ("area_m2", models.BigIntegerField(default=0)),
+                ("area_ha", models.FloatField(default=0)),
+                ("area_acre", models.FloatField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "job",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="area_results",
+                        to="core.job",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["output_root", "country", "year", "crop"],
+                        name="core_areare_output__f14a0d_idx",
+                    )
+                ],
+                "unique_together": {("output_root", "country", "state", "year", "crop", "class_id")},
+            },
+        ),
+    ]
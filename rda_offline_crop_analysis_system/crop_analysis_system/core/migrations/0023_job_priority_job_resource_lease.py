@@ -0,0 +1,26 @@
+# Generated by Django 6.0.1 on 2026-10-17 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0022_arearesult"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="priority",
+            field=models.IntegerField(
+                default=0,
+                help_text="Higher runs first when SCHEDULER_POLICY is 'priority'.",
+            ),
+        ),
+        migrations.AddField(
+            model_name="job",
+            name="resource_lease",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
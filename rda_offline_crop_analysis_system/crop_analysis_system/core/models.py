@@ -129,6 +129,11 @@ class Job(models.Model):
     celery_last_state = models.CharField(max_length=32, blank=True)
     celery_error = models.TextField(blank=True)
     schedule_at = models.DateTimeField(null=True, blank=True)
+    priority = models.IntegerField(
+        default=0,
+        help_text="Higher runs first when SCHEDULER_POLICY is 'priority'.",
+    )
+    resource_lease = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -167,3 +172,29 @@ class JobOutput(models.Model):
 
     def __str__(self) -> str:
         return f"{self.job_id} - {self.step} - {self.relative_path}"
+
+
+class AreaResult(models.Model):
+    output_root = models.CharField(max_length=512)
+    country = models.CharField(max_length=64)
+    state = models.CharField(max_length=128)
+    year = models.CharField(max_length=16)
+    crop = models.CharField(max_length=64)
+    class_id = models.PositiveIntegerField()
+    area_m2 = models.BigIntegerField(default=0)
+    area_ha = models.FloatField(default=0)
+    area_acre = models.FloatField(default=0)
+    job = models.ForeignKey(
+        Job, on_delete=models.SET_NULL, null=True, blank=True, related_name="area_results"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("output_root", "country", "state", "year", "crop", "class_id")
+        indexes = [
+            models.Index(fields=["output_root", "country", "year", "crop"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.year} {self.country} {self.state} {self.crop} class {self.class_id}"
@@ -0,0 +1,118 @@
+import sys
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from core.utils import gpu
+from core.utils.gpu import ComputeInventory, ComputeSnapshot, GpuDevice
+
+
+class _Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+class _InlineThread:
+    """Runs the background refresh synchronously so its effect can be asserted."""
+
+    def __init__(self, target, name=None, daemon=None):
+        self.target = target
+
+    def start(self):
+        self.target()
+
+
+def _no_gpu_tooling():
+    """No nvidia-smi on PATH and ``import torch`` failing, as on a CPU-only host."""
+    return mock.patch.object(gpu.shutil, "which", return_value=None), mock.patch.dict(sys.modules, {"torch": None})
+
+
+class ProbeWithoutGpuTests(SimpleTestCase):
+    def test_probe_host_reports_cpu_and_memory_only(self):
+        which, torch = _no_gpu_tooling()
+        with which, torch:
+            snapshot = gpu.probe_host()
+        self.assertEqual(snapshot.gpus, ())
+        self.assertEqual(snapshot.gpu_source, "none")
+        self.assertGreaterEqual(snapshot.cpu_count, 1)
+        self.assertGreaterEqual(snapshot.memory_total_mb, snapshot.memory_available_mb)
+        self.assertEqual(snapshot.available_gpu_ids(), [])
+
+    def test_probe_system_falls_back_when_nvidia_smi_and_torch_are_missing(self):
+        which, torch = _no_gpu_tooling()
+        with which, torch:
+            snapshot = gpu.probe_system()
+        self.assertEqual(snapshot.gpus, ())
+        self.assertEqual(snapshot.gpu_source, "none")
+        self.assertEqual(list(snapshot.to_dict()["gpus"]), [])
+
+    def test_available_gpu_ids_prefers_idle_devices(self):
+        snapshot = ComputeSnapshot(
+            gpus=(
+                GpuDevice(index=0, utilization=80, memory_used_mb=9000, memory_total_mb=16000),
+                GpuDevice(index=1, utilization=0, memory_used_mb=100, memory_total_mb=16000),
+            ),
+            gpu_source="nvidia-smi",
+        )
+        self.assertEqual(snapshot.available_gpu_ids(), [1])
+
+
+class ComputeInventoryTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = _Clock()
+        self.calls = 0
+        patcher = mock.patch.object(gpu, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(gpu.threading, "Thread", _InlineThread)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _probe(self) -> ComputeSnapshot:
+        self.calls += 1
+        return ComputeSnapshot(cpu_count=self.calls, sampled_at=self.clock.now)
+
+    def test_first_snapshot_is_sampled_inline(self):
+        inventory = ComputeInventory(probe=self._probe, ttl=10)
+        self.assertEqual(inventory.snapshot().cpu_count, 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_fresh_snapshot_is_served_from_cache(self):
+        inventory = ComputeInventory(probe=self._probe, ttl=10)
+        inventory.snapshot()
+        self.clock.now += 9
+        self.assertEqual(inventory.snapshot().cpu_count, 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_snapshot_is_returned_and_refreshed_in_background(self):
+        inventory = ComputeInventory(probe=self._probe, ttl=10)
+        inventory.snapshot()
+        self.clock.now += 10
+        # The stale value is served while the refresh runs; the next call sees the new one.
+        self.assertEqual(inventory.snapshot().cpu_count, 1)
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(inventory.snapshot().cpu_count, 2)
+        self.assertEqual(self.calls, 2)
+
+    def test_failed_refresh_keeps_the_last_snapshot(self):
+        inventory = ComputeInventory(probe=self._probe, ttl=10)
+        inventory.snapshot()
+        inventory.probe = mock.Mock(side_effect=RuntimeError("nvidia-smi hung"))
+        self.clock.now += 10
+        self.assertEqual(inventory.snapshot().cpu_count, 1)
+        self.assertEqual(inventory.snapshot().cpu_count, 1)
+
+    def test_invalidate_forces_an_inline_sample(self):
+        inventory = ComputeInventory(probe=self._probe, ttl=10)
+        inventory.snapshot()
+        inventory.invalidate()
+        self.assertEqual(inventory.snapshot().cpu_count, 2)
+
+    def test_probe_failure_on_first_call_returns_an_empty_snapshot(self):
+        inventory = ComputeInventory(probe=mock.Mock(side_effect=RuntimeError("no driver")), ttl=10)
+        snapshot = inventory.snapshot()
+        self.assertEqual(snapshot.gpus, ())
+        self.assertEqual(snapshot.available_gpu_ids(), [])
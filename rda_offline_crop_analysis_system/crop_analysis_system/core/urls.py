@@ -8,6 +8,7 @@ urlpatterns = [
     path("input/countries/", views.list_countries, name="list_countries"),
     path("input/states/", views.list_states, name="list_states"),
     path("configs/", views.list_pipeline_configs, name="list_pipeline_configs"),
+    path("configs/<int:config_id>/boundaries/", views.config_boundaries, name="config_boundaries"),
     path("jobs/", views.create_job, name="create_job"),
     path("jobs/<int:job_id>/", views.job_detail, name="job_detail"),
     path("jobs/<int:job_id>/info/", views.job_info, name="job_info"),
@@ -19,10 +20,13 @@ urlpatterns = [
     path("jobs/<int:job_id>/outputs/zip/", views.download_job_outputs_zip, name="download_job_outputs_zip"),
     path("jobs/<int:job_id>/logs/download/", views.download_log, name="download_log"),
     path("gpu/available/", views.gpu_available, name="gpu_available"),
+    path("compute/inventory/", views.compute_inventory, name="compute_inventory"),
     path("jobs/<int:job_id>/cancel/", views.cancel_job, name="cancel_job"),
     path("jobs/<int:job_id>/retry/", views.retry_job, name="retry_job"),
     path("outputs/", views.job_outputs_page, name="job_outputs_page"),
     path("outputs/filtered/", views.filtered_outputs, name="filtered_outputs"),
+    path("area-results/", views.area_results, name="area_results"),
+    path("area-results/csv/", views.area_results_csv, name="area_results_csv"),
     path("outputs/zip/", views.download_outputs_zip, name="download_outputs_zip"),
     path("validate-path/", views.validate_path, name="validate_path"),
     path("settings/", views.root_settings_page, name="root_settings_page"),
@@ -0,0 +1,161 @@
+import csv
+import io
+import os
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import AreaResult
+
+AREA_CSV_COLUMNS = ["state", "year", "crop", "class_id", "area_m2", "area_ha", "area_acre"]
+_VALUE_FIELDS = ["area_m2", "area_ha", "area_acre"]
+_KEY_FIELDS = ["output_root", "country", "state", "year", "crop", "class_id"]
+
+
+def area_csv_name(year: str, country: str, crop: str) -> str:
+    return f"{year}_{country}_{crop}.csv"
+
+
+def _scope(output_root: str, country: str, year: str, crop: str):
+    return AreaResult.objects.filter(
+        output_root=str(output_root), country=country, year=str(year), crop=crop
+    )
+
+
+def _seed_from_csv(output_root: str, country: str, year: str, crop: str, csv_path: str) -> int:
+    """Import a CSV written before the store existed, so its other states survive the next export."""
+    if not os.path.exists(csv_path) or _scope(output_root, country, year, crop).exists():
+        return 0
+    try:
+        with open(csv_path, newline="", encoding="utf-8-sig") as handle:
+            rows = list(csv.DictReader(handle))
+    except (OSError, csv.Error):
+        return 0
+    records = []
+    for row in rows:
+        try:
+            records.append(
+                AreaResult(
+                    output_root=str(output_root),
+                    country=country,
+                    state=row["state"],
+                    year=str(year),
+                    crop=crop,
+                    class_id=int(row["class_id"]),
+                    area_m2=int(float(row["area_m2"])),
+                    area_ha=float(row["area_ha"]),
+                    area_acre=float(row["area_acre"]),
+                )
+            )
+        except (KeyError, TypeError, ValueError):
+            continue
+    AreaResult.objects.bulk_create(records, ignore_conflicts=True)
+    return len(records)
+
+
+def stored_states(output_root: str, country: str, year: str, crop: str) -> set[str]:
+    """States that already have results for one crop; a legacy CSV is imported first."""
+    csv_path = os.path.join(str(output_root), "calculate_area", area_csv_name(year, country, crop))
+    _seed_from_csv(str(output_root), country, str(year), crop, csv_path)
+    return set(_scope(output_root, country, str(year), crop).values_list("state", flat=True).distinct())
+
+
+def upsert_area_results(
+        output_root: str,
+        country: str,
+        year: str,
+        crop: str,
+        rows: Iterable[Dict],
+        processed_states: Iterable[str],
+        job_id: Optional[int] = None,
+) -> int:
+    """Replace the results of ``processed_states`` for one crop in a single transaction.
+
+    Rows are upserted on (output root, country, state, year, crop, class); class
+    rows of a processed state that the new run no longer reports are deleted.
+    Other states are left untouched, so concurrent jobs working on different
+    states of the same crop no longer overwrite each other.
+    """
+    output_root = str(output_root)
+    year = str(year)
+    processed = set(processed_states)
+    now = timezone.now()
+    records = [
+        AreaResult(
+            output_root=output_root,
+            country=country,
+            state=row["state"],
+            year=year,
+            crop=crop,
+            class_id=int(row["class_id"]),
+            area_m2=int(row["area_m2"]),
+            area_ha=float(row["area_ha"]),
+            area_acre=float(row["area_acre"]),
+            job_id=job_id,
+            updated_at=now,
+        )
+        for row in rows
+    ]
+    if not records and not processed:
+        return 0
+    csv_path = os.path.join(output_root, "calculate_area", area_csv_name(year, country, crop))
+    with transaction.atomic():
+        _seed_from_csv(output_root, country, year, crop, csv_path)
+        scope = _scope(output_root, country, year, crop)
+        for state in processed:
+            kept = [r.class_id for r in records if r.state == state]
+            scope.filter(state=state).exclude(class_id__in=kept).delete()
+        AreaResult.objects.bulk_create(
+            records,
+            update_conflicts=True,
+            unique_fields=_KEY_FIELDS,
+            update_fields=_VALUE_FIELDS + ["job", "updated_at"],
+        )
+    return len(records)
+
+
+def query_area_results(
+        output_root: Optional[str] = None,
+        country: Optional[str] = None,
+        year: Optional[str] = None,
+        crop: Optional[str] = None,
+        states: Optional[List[str]] = None,
+):
+    qs = AreaResult.objects.all()
+    if output_root:
+        qs = qs.filter(output_root=str(output_root))
+    if country:
+        qs = qs.filter(country=country)
+    if year:
+        qs = qs.filter(year=str(year))
+    if crop:
+        qs = qs.filter(crop=crop)
+    if states:
+        qs = qs.filter(state__in=states)
+    return qs.order_by("state", "class_id")
+
+
+def render_area_csv(results) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(AREA_CSV_COLUMNS)
+    for result in results:
+        writer.writerow([result.state, result.year, result.crop, result.class_id,
+                         result.area_m2, result.area_ha, result.area_acre])
+    return buffer.getvalue()
+
+
+def export_area_csv(output_root: str, country: str, year: str, crop: str) -> Optional[str]:
+    """Write ``calculate_area/{year}_{country}_{crop}.csv`` from the store; returns its path."""
+    results = query_area_results(output_root=output_root, country=country, year=year, crop=crop)
+    if not results.exists():
+        return None
+    path = os.path.join(str(output_root), "calculate_area", area_csv_name(year, country, crop))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8-sig") as handle:
+        handle.write(render_area_csv(results))
+    os.replace(tmp_path, path)
+    return path
@@ -1,53 +1,230 @@
 import shutil
 import subprocess
-from typing import List
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
 import os
 os.environ['KMP_DUPLICATE_LIB_OK'] = 'TRUE'
 
+GPU_PROBE_AUTO = "auto"
+GPU_PROBE_NONE = "none"
+GPU_PROBES = (GPU_PROBE_AUTO, GPU_PROBE_NONE)
 
-def _parse_nvidia_smi(lines: List[str], memory_threshold_mb: int) -> List[int]:
-    available = []
+
+@dataclass(frozen=True)
+class GpuDevice:
+    index: int
+    name: str = ""
+    utilization: Optional[int] = None
+    memory_used_mb: Optional[int] = None
+    memory_total_mb: Optional[int] = None
+
+    @property
+    def memory_free_mb(self) -> Optional[int]:
+        if self.memory_used_mb is None or self.memory_total_mb is None:
+            return None
+        return self.memory_total_mb - self.memory_used_mb
+
+    def is_idle(self, memory_threshold_mb: int) -> bool:
+        return (
+            self.utilization == 0
+            and self.memory_used_mb is not None
+            and self.memory_used_mb <= memory_threshold_mb
+        )
+
+
+@dataclass(frozen=True)
+class ComputeSnapshot:
+    """Devices and host resources as seen at ``sampled_at`` (``time.time()``)."""
+
+    gpus: Tuple[GpuDevice, ...] = ()
+    gpu_source: str = "none"
+    cpu_count: int = 1
+    memory_total_mb: int = 0
+    memory_available_mb: int = 0
+    sampled_at: float = field(default_factory=time.time)
+
+    def available_gpu_ids(self, memory_threshold_mb: int = 200) -> List[int]:
+        """Idle GPUs per nvidia-smi; every device when none is idle or usage is unknown."""
+        idle = [gpu.index for gpu in self.gpus if gpu.is_idle(memory_threshold_mb)]
+        return idle or [gpu.index for gpu in self.gpus]
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        for gpu, device in zip(data["gpus"], self.gpus):
+            gpu["memory_free_mb"] = device.memory_free_mb
+        return data
+
+
+Probe = Callable[[], ComputeSnapshot]
+
+
+def _parse_nvidia_smi(lines: List[str]) -> List[GpuDevice]:
+    devices = []
     for line in lines:
         parts = [p.strip() for p in line.split(",")]
-        if len(parts) < 3:
+        if len(parts) < 5:
             continue
         try:
-            idx = int(parts[0])
-            util = int(parts[1])
-            mem_used = int(parts[2])
+            devices.append(
+                GpuDevice(
+                    index=int(parts[0]),
+                    name=parts[1],
+                    utilization=int(parts[2]),
+                    memory_used_mb=int(parts[3]),
+                    memory_total_mb=int(parts[4]),
+                )
+            )
         except ValueError:
             continue
-        if util == 0 and mem_used <= memory_threshold_mb:
-            available.append(idx)
-    return available
+    return devices
 
 
-def get_available_gpu_ids(memory_threshold_mb: int = 200) -> List[int]:
+def _probe_gpus() -> Tuple[List[GpuDevice], str]:
     if shutil.which("nvidia-smi"):
         try:
             result = subprocess.run(
                 [
                     "nvidia-smi",
-                    "--query-gpu=index,utilization.gpu,memory.used",
+                    "--query-gpu=index,name,utilization.gpu,memory.used,memory.total",
                     "--format=csv,noheader,nounits",
                 ],
                 capture_output=True,
                 text=True,
                 check=True,
+                timeout=10,
             )
             lines = [line.strip() for line in result.stdout.splitlines() if line.strip()]
-            ids = _parse_nvidia_smi(lines, memory_threshold_mb)
-            if ids:
-                return ids
+            devices = _parse_nvidia_smi(lines)
+            if devices:
+                return devices, "nvidia-smi"
         except Exception:
             pass
     try:
         import torch
     except Exception:
-        return []
+        return [], "none"
 
     count = torch.cuda.device_count()
-    return list(range(count))
+    return [GpuDevice(index=i, name=torch.cuda.get_device_name(i)) for i in range(count)], "torch"
+
+
+def _cpu_count() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return os.cpu_count() or 1
+
+
+def _memory_mb() -> Tuple[int, int]:
+    """Total and available host memory in MiB (``/proc/meminfo``, else ``sysconf``)."""
+    try:
+        values = {}
+        with open("/proc/meminfo", "r", encoding="utf-8") as handle:
+            for line in handle:
+                key, _, rest = line.partition(":")
+                values[key] = int(rest.split()[0])
+        return values["MemTotal"] // 1024, values.get("MemAvailable", values["MemFree"]) // 1024
+    except (OSError, KeyError, ValueError, IndexError):
+        pass
+    try:
+        page = os.sysconf("SC_PAGE_SIZE")
+        total = os.sysconf("SC_PHYS_PAGES") * page // (1024 * 1024)
+        available = os.sysconf("SC_AVPHYS_PAGES") * page // (1024 * 1024)
+        return total, available
+    except (AttributeError, ValueError, OSError):
+        return 0, 0
+
+
+def probe_host() -> ComputeSnapshot:
+    """CPU and memory only; the stand-in for hosts without GPUs or GPU tooling."""
+    total, available = _memory_mb()
+    return ComputeSnapshot(cpu_count=_cpu_count(), memory_total_mb=total, memory_available_mb=available)
+
+
+def probe_system() -> ComputeSnapshot:
+    gpus, source = _probe_gpus()
+    total, available = _memory_mb()
+    return ComputeSnapshot(
+        gpus=tuple(gpus),
+        gpu_source=source,
+        cpu_count=_cpu_count(),
+        memory_total_mb=total,
+        memory_available_mb=available,
+    )
+
+
+class ComputeInventory:
+    """Cached compute snapshot refreshed in the background once it is older than ``ttl`` seconds.
+
+    Only the first call samples inline. Later calls return the cached
+    snapshot immediately and, when it is stale, start one background refresh,
+    so requests never wait on ``nvidia-smi`` or a torch import.
+    """
+
+    def __init__(self, probe: Probe = probe_system, ttl: float = 10.0):
+        self.probe = probe
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._snapshot: Optional[ComputeSnapshot] = None
+        self._refreshing = False
+
+    def _refresh(self) -> None:
+        try:
+            snapshot = self.probe()
+        except Exception:
+            snapshot = None
+        with self._lock:
+            if snapshot is not None:
+                self._snapshot = snapshot
+            self._refreshing = False
+
+    def snapshot(self) -> ComputeSnapshot:
+        with self._lock:
+            current = self._snapshot
+            stale = current is None or time.time() - current.sampled_at >= self.ttl
+            start = stale and current is not None and not self._refreshing
+            if start:
+                self._refreshing = True
+        if current is None:
+            self._refresh()
+            with self._lock:
+                return self._snapshot or ComputeSnapshot()
+        if start:
+            threading.Thread(target=self._refresh, name="compute-inventory", daemon=True).start()
+        return current
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._snapshot = None
+
+
+_inventory: Optional[ComputeInventory] = None
+_inventory_lock = threading.Lock()
+
+
+def get_inventory() -> ComputeInventory:
+    """Process-wide inventory configured from ``COMPUTE_INVENTORY_TTL_SEC`` and ``COMPUTE_GPU_PROBE``."""
+    global _inventory
+    with _inventory_lock:
+        if _inventory is None:
+            from django.conf import settings
+
+            probe_name = getattr(settings, "COMPUTE_GPU_PROBE", GPU_PROBE_AUTO)
+            if probe_name not in GPU_PROBES:
+                raise ValueError(
+                    f"COMPUTE_GPU_PROBE must be one of {', '.join(GPU_PROBES)}; got {probe_name!r}."
+                )
+            _inventory = ComputeInventory(
+                probe=probe_host if probe_name == GPU_PROBE_NONE else probe_system,
+                ttl=getattr(settings, "COMPUTE_INVENTORY_TTL_SEC", 10.0),
+            )
+        return _inventory
+
+
+def get_available_gpu_ids(memory_threshold_mb: int = 200) -> List[int]:
+    return get_inventory().snapshot().available_gpu_ids(memory_threshold_mb)
 
 
 def get_available_gpu_count() -> int:
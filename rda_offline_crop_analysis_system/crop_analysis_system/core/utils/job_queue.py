@@ -1,16 +1,200 @@
-from typing import Optional
+import threading
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
 
+from django.conf import settings
+from django.db.models import Q
 from django.utils import timezone
 
 from core.models import Job
+from core.utils.gpu import ComputeSnapshot, get_inventory
 from core.utils.log_files import append_log
+from core.utils.redis_client import get_redis
 
+POLICY_FIFO = "fifo"
+POLICY_PRIORITY = "priority"
+SCHEDULER_POLICIES = (POLICY_FIFO, POLICY_PRIORITY)
 
-def has_running_job(exclude_job_id: Optional[int] = None) -> bool:
-    qs = Job.objects.filter(status=Job.STATUS_RUNNING)
-    if exclude_job_id is not None:
-        qs = qs.exclude(id=exclude_job_id)
-    return qs.exists()
+STEP_INFERENCE = "inference"
+STEP_MERGE = "merge"
+STEP_AREA = "area"
+STEP_THUMBNAIL = "thumbnail"
+
+# What each step occupies while it runs; SCHEDULER_STEP_DEMANDS overrides per step.
+DEFAULT_STEP_DEMANDS: Dict[str, Dict[str, int]] = {
+    STEP_INFERENCE: {"cpu_workers": 2, "memory_mb": 8192},
+    STEP_MERGE: {"cpu_workers": 4, "memory_mb": 4096},
+    STEP_AREA: {"cpu_workers": 4, "memory_mb": 4096},
+    STEP_THUMBNAIL: {"cpu_workers": 4, "memory_mb": 1024},
+}
+
+# Jobs holding or waiting on leases; leases of finished jobs are ignored.
+_ACTIVE_STATUSES = (Job.STATUS_PENDING, Job.STATUS_RUNNING)
+_local_lock = threading.Lock()
+
+
+@dataclass
+class Lease:
+    step: str
+    gpu_ids: List[int] = field(default_factory=list)
+    cpu_workers: int = 0
+    memory_mb: int = 0
+    # Placeholder of a running job's step that did not fit yet; holds nothing but is
+    # served before new jobs are admitted.
+    waiting: bool = False
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> Optional["Lease"]:
+        if not data or not data.get("step"):
+            return None
+        return cls(
+            step=data["step"],
+            gpu_ids=[int(i) for i in data.get("gpu_ids", [])],
+            cpu_workers=int(data.get("cpu_workers", 0)),
+            memory_mb=int(data.get("memory_mb", 0)),
+            waiting=bool(data.get("waiting", False)),
+        )
+
+
+def _lease_name(step: str, scope: str = "") -> str:
+    return f"{step}:{scope}" if scope else step
+
+
+def job_leases(data: Dict) -> Dict[str, Lease]:
+    """Named leases stored in ``Job.resource_lease`` (one per running step, or per step and state)."""
+    leases = {}
+    for name, value in (data or {}).items():
+        lease = Lease.from_dict(value) if isinstance(value, dict) else None
+        if lease is not None:
+            leases[name] = lease
+    return leases
+
+
+@dataclass
+class Capacity:
+    gpu_ids: List[int]
+    cpu_workers: int
+    memory_mb: int
+
+
+@contextmanager
+def _scheduler_lock():
+    """Serialize admission decisions across web and worker processes (Redis lock, else local)."""
+    try:
+        lock = get_redis().lock("scheduler:lock", timeout=30, blocking_timeout=30)
+        acquired = lock.acquire()
+    except Exception:
+        lock, acquired = None, False
+    if not acquired:
+        with _local_lock:
+            yield
+        return
+    try:
+        yield
+    finally:
+        try:
+            lock.release()
+        except Exception:
+            pass
+
+
+def _capacity(snapshot: ComputeSnapshot) -> Capacity:
+    cpu_workers = getattr(settings, "SCHEDULER_CPU_SLOTS", 0) or snapshot.cpu_count
+    memory_mb = int(snapshot.memory_total_mb * getattr(settings, "SCHEDULER_MEMORY_FRACTION", 0.8))
+    return Capacity(
+        gpu_ids=[gpu.index for gpu in snapshot.gpus],
+        cpu_workers=cpu_workers,
+        # An unknown memory size must not block every job.
+        memory_mb=memory_mb if memory_mb > 0 else 1 << 40,
+    )
+
+
+def step_demand(job: Job, step: str, capacity: Capacity) -> Tuple[int, int, int]:
+    """GPUs, CPU workers and memory (MiB) ``step`` of ``job`` needs, capped at the capacity.
+
+    Capping lets a step larger than the whole machine still run once it is alone.
+    """
+    demand = {
+        **DEFAULT_STEP_DEMANDS.get(step, {}),
+        **getattr(settings, "SCHEDULER_STEP_DEMANDS", {}).get(step, {}),
+    }
+    gpus = 0
+    if step == STEP_INFERENCE:
+        requested = job.gpu_count or 0
+        gpus = len(capacity.gpu_ids) if requested == -1 else min(max(requested, 0), len(capacity.gpu_ids))
+    return (
+        gpus,
+        min(int(demand.get("cpu_workers", 1)), capacity.cpu_workers),
+        min(int(demand.get("memory_mb", 0)), capacity.memory_mb),
+    )
+
+
+def _free(capacity: Capacity) -> Capacity:
+    leased = Job.objects.filter(status__in=_ACTIVE_STATUSES).exclude(resource_lease={})
+    used_gpus = set()
+    cpu_workers, memory_mb = capacity.cpu_workers, capacity.memory_mb
+    for data in leased.values_list("resource_lease", flat=True):
+        for lease in job_leases(data).values():
+            used_gpus.update(lease.gpu_ids)
+            cpu_workers -= lease.cpu_workers
+            memory_mb -= lease.memory_mb
+    return Capacity(
+        gpu_ids=[i for i in capacity.gpu_ids if i not in used_gpus],
+        cpu_workers=cpu_workers,
+        memory_mb=memory_mb,
+    )
+
+
+def _fit(job: Job, step: str, capacity: Capacity, free: Capacity) -> Optional[Lease]:
+    gpus, cpu_workers, memory_mb = step_demand(job, step, capacity)
+    if gpus > len(free.gpu_ids) or cpu_workers > free.cpu_workers or memory_mb > free.memory_mb:
+        return None
+    return Lease(step=step, gpu_ids=free.gpu_ids[:gpus], cpu_workers=cpu_workers, memory_mb=memory_mb)
+
+
+def _take(free: Capacity, lease: Lease) -> Capacity:
+    return Capacity(
+        gpu_ids=[i for i in free.gpu_ids if i not in lease.gpu_ids],
+        cpu_workers=free.cpu_workers - lease.cpu_workers,
+        memory_mb=free.memory_mb - lease.memory_mb,
+    )
+
+
+def _reserve_waiting(capacity: Capacity, free: Capacity) -> Capacity:
+    """Hold back what running jobs' waiting steps need, so they go before new admissions."""
+    jobs = (
+        Job.objects.filter(status__in=_ACTIVE_STATUSES)
+        .exclude(resource_lease={})
+        .only("id", "gpu_count", "resource_lease")
+    )
+    for job in jobs:
+        for lease in job_leases(job.resource_lease).values():
+            if not lease.waiting:
+                continue
+            gpus, cpu_workers, memory_mb = step_demand(job, lease.step, capacity)
+            free = _take(
+                free,
+                Lease(step=lease.step, gpu_ids=free.gpu_ids[:gpus], cpu_workers=cpu_workers, memory_mb=memory_mb),
+            )
+    return free
+
+
+def _save_leases(job: Job, leases: Dict[str, Lease]) -> None:
+    job.resource_lease = {name: asdict(lease) for name, lease in leases.items()}
+    job.save(update_fields=["resource_lease", "updated_at"])
+
+
+def _pending_queue():
+    policy = getattr(settings, "SCHEDULER_POLICY", POLICY_FIFO)
+    if policy not in SCHEDULER_POLICIES:
+        raise ValueError(f"SCHEDULER_POLICY must be one of {', '.join(SCHEDULER_POLICIES)}; got {policy!r}.")
+    qs = Job.objects.filter(status=Job.STATUS_PENDING, resource_lease={}).filter(
+        Q(schedule_at__isnull=True) | Q(schedule_at__lte=timezone.now())
+    )
+    if policy == POLICY_PRIORITY:
+        return qs.order_by("-priority", "created_at")
+    return qs.order_by("created_at")
 
 
 def schedule_job(job: Job) -> None:
@@ -27,22 +211,106 @@ def schedule_job(job: Job) -> None:
     job.save(update_fields=["celery_task_id", "updated_at"])
 
 
+def admit_pending_jobs() -> List[int]:
+    """Start every pending job whose first step fits in the free resources; returns their ids.
+
+    Jobs are visited in policy order (``fifo``: oldest first, ``priority``:
+    highest ``Job.priority`` first). A job that does not fit is passed over,
+    so a CPU-only job can start next to a GPU job that is already running.
+    The first step's lease is reserved before the workflow is queued. Resources
+    needed by steps of running jobs that are waiting for a lease are held back
+    first, so in-flight jobs are not starved by new admissions.
+    """
+    admitted = []
+    with _scheduler_lock():
+        max_running = getattr(settings, "SCHEDULER_MAX_RUNNING_JOBS", 0)
+        running = Job.objects.filter(
+            Q(status=Job.STATUS_RUNNING) | (Q(status=Job.STATUS_PENDING) & ~Q(resource_lease={}))
+        ).count()
+        capacity = _capacity(get_inventory().snapshot())
+        free = _reserve_waiting(capacity, _free(capacity))
+        for job in _pending_queue():
+            if max_running and running >= max_running:
+                break
+            lease = _fit(job, STEP_INFERENCE, capacity, free)
+            if lease is None:
+                continue
+            _save_leases(job, {STEP_INFERENCE: lease})
+            free = _take(free, lease)
+            running += 1
+            schedule_job(job)
+            admitted.append(job.id)
+    return admitted
+
+
+def acquire_step(job: Job, step: str, scope: str = "") -> Optional[Lease]:
+    """Lease the resources of ``step`` for ``job``, or ``None`` when they do not fit.
+
+    ``scope`` names one of several concurrent runs of a step (a state in the
+    per-state workflow). A lease already held under that name, such as the
+    inference lease reserved at admission or one handed over by
+    ``release_step``, is returned as is. A step that does not fit is marked
+    waiting until it does.
+    """
+    with _scheduler_lock():
+        job.refresh_from_db(fields=["resource_lease"])
+        return _acquire_locked(job, job_leases(job.resource_lease), step, scope)
+
+
+def _acquire_locked(job: Job, leases: Dict[str, Lease], step: str, scope: str) -> Optional[Lease]:
+    name = _lease_name(step, scope)
+    held = leases.get(name)
+    if held is not None and not held.waiting:
+        return held
+    capacity = _capacity(get_inventory().snapshot())
+    lease = _fit(job, step, capacity, _free(capacity))
+    if lease is None:
+        if held is None:
+            leases[name] = Lease(step=step, waiting=True)
+            _save_leases(job, leases)
+        return None
+    leases[name] = lease
+    _save_leases(job, leases)
+    return lease
+
+
+def release_step(job: Job, step: str, scope: str = "", next_step: str = "") -> List[int]:
+    """Release one lease of the job and admit pending jobs into the freed resources.
+
+    ``next_step`` (same ``scope``) is leased, or marked waiting, under the same
+    lock before any pending job is admitted, so the job's next task finds its
+    resources already held.
+    """
+    with _scheduler_lock():
+        job.refresh_from_db(fields=["resource_lease"])
+        leases = job_leases(job.resource_lease)
+        leases.pop(_lease_name(step, scope), None)
+        _save_leases(job, leases)
+        if next_step:
+            _acquire_locked(job, leases, next_step, scope)
+    return admit_pending_jobs()
+
+
 def queue_or_start(job: Job) -> bool:
-    if has_running_job():
-        job.status = Job.STATUS_PENDING
-        job.save(update_fields=["status", "updated_at"])
-        append_log(job.id, "Queued (waiting for running job to finish)")
+    if job.resource_lease:
+        _save_leases(job, {})
+    job.status = Job.STATUS_PENDING
+    job.save(update_fields=["status", "updated_at"])
+    if job.schedule_at and job.schedule_at > timezone.now():
+        from pipeline.tasks import admit_pending_task
+
+        # The job becomes eligible at ``schedule_at``; run an admission pass then.
+        admit_pending_task.apply_async(eta=job.schedule_at)
+        append_log(job.id, f"Queued (scheduled for {job.schedule_at.isoformat()})")
         return False
-    schedule_job(job)
-    return True
+    if job.id in admit_pending_jobs():
+        return True
+    append_log(job.id, "Queued (waiting for resources)")
+    return False
 
 
 def start_next_pending_job() -> Optional[int]:
-    if has_running_job():
-        return None
-    next_job = Job.objects.filter(status=Job.STATUS_PENDING).order_by("created_at").first()
-    if not next_job:
-        return None
-    schedule_job(next_job)
-    append_log(next_job.id, "Queued (auto-started after previous job finished)")
-    return next_job.id
+    admitted = admit_pending_jobs()
+    for job_id in admitted:
+        append_log(job_id, "Queued (auto-started after resources were freed)")
+    return admitted[0] if admitted else None
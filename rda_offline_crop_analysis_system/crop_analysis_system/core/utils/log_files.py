@@ -1,4 +1,5 @@
 import csv
+import json
 import os
 from datetime import datetime
 from pathlib import Path
@@ -23,6 +24,49 @@ def csv_path(job_id: int, suffix: str) -> Path:
     return ensure_logs_root() / f"{job_id}_{suffix}.csv"
 
 
+def manifest_path(job_id: int, step: str) -> Path:
+    return ensure_logs_root() / f"{job_id}_{step}_manifest.jsonl"
+
+
+def record_outputs(job_id: int, step: str, paths: Iterable[str]) -> None:
+    """Append output files written for ``step`` to the job's manifest.
+
+    Lines go out in one ``O_APPEND`` write, so records from concurrent worker
+    processes do not interleave. ``sync_job_outputs`` registers them later.
+    """
+    data = "".join(
+        json.dumps({"path": os.path.abspath(str(p))}) + "\n" for p in paths
+    ).encode("utf-8")
+    if not data:
+        return
+    fd = os.open(manifest_path(job_id, step), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, data)
+    finally:
+        os.close(fd)
+
+
+def remove_manifest(job_id: int, step: str) -> None:
+    path = manifest_path(job_id, step)
+    if path.exists():
+        path.unlink()
+
+
+def read_manifest(job_id: int, step: str) -> list[str]:
+    """Unique output paths recorded for ``step``, in recording order."""
+    path = manifest_path(job_id, step)
+    if not path.exists():
+        return []
+    paths: dict[str, None] = {}
+    with open(path, "r", encoding="utf-8") as handle:
+        for line in handle:
+            try:
+                paths[json.loads(line)["path"]] = None
+            except (ValueError, KeyError, TypeError):
+                continue
+    return list(paths)
+
+
 def generate_progress_bar(percent: int, bar_length: int = 20) -> str:
     """Generates a text-based progress bar."""
     filled = int(bar_length * percent / 100)
@@ -3,9 +3,12 @@ from datetime import datetime
 from pathlib import Path
 from typing import Iterable
 
+from django.conf import settings
 from django.utils import timezone
 
 from core.models import Job, JobOutput
+from core.utils.log_files import read_manifest, remove_manifest
+from pipeline.services.common import CLASS_INDEX_DIR
 
 
 def _parse_crop_list(crops_str: str) -> list[str]:
@@ -55,7 +58,7 @@ def output_belongs_to_job(job: Job, step: str, file_path: Path, base_dir: Path)
         if states and rel_parts[2] not in states:
             return False
         if crops and rel_parts[3] not in crops:
-            return False
+            return step == JobOutput.STEP_INFERENCE and rel_parts[3] == CLASS_INDEX_DIR
         return True
 
     if step == JobOutput.STEP_AREA:
@@ -78,27 +81,77 @@ def _iter_files(base_dir: Path) -> Iterable[Path]:
             yield Path(root) / filename
 
 
-def sync_job_outputs(job: Job, step: str, base_dir: Path) -> None:
-    if not base_dir.exists():
-        return
-    for file_path in _iter_files(base_dir):
-        if not output_belongs_to_job(job, step, file_path, base_dir):
-            continue
-        try:
-            stat = file_path.stat()
-        except OSError:
-            continue
-        modified_at = datetime.fromtimestamp(stat.st_mtime)
-        if timezone.is_naive(modified_at):
-            modified_at = timezone.make_aware(modified_at)
+def _scan_roots(job: Job, step: str, base_dir: Path) -> list[Path]:
+    """Narrowest directories that can hold the job's files for ``step``."""
+    input_meta = job.input_path or {}
+    year_suffix = str(input_meta.get("year_suffix", "")).strip()
+    country = str(input_meta.get("country", "")).strip()
+    if step not in (JobOutput.STEP_INFERENCE, JobOutput.STEP_MERGE) or not year_suffix or not country:
+        return [base_dir]
+    country_dir = base_dir / year_suffix / country
+    states = job.selected_states or []
+    return [country_dir / state for state in states] if states else [country_dir]
+
+
+def _output_record(job: Job, step: str, file_path: Path, base_dir: Path) -> JobOutput | None:
+    try:
+        stat = file_path.stat()
         relative_path = str(file_path.relative_to(base_dir))
-        JobOutput.objects.update_or_create(
-            job=job,
-            absolute_path=str(file_path),
-            defaults={
-                "step": step,
-                "relative_path": relative_path,
-                "size_bytes": stat.st_size,
-                "file_modified_at": modified_at,
-            },
+    except (OSError, ValueError):
+        return None
+    modified_at = datetime.fromtimestamp(stat.st_mtime)
+    if timezone.is_naive(modified_at):
+        modified_at = timezone.make_aware(modified_at)
+    return JobOutput(
+        job=job,
+        step=step,
+        relative_path=relative_path,
+        absolute_path=str(file_path),
+        size_bytes=stat.st_size,
+        file_modified_at=modified_at,
+    )
+
+
+def sync_job_outputs(
+        job: Job,
+        step: str,
+        base_dir: Path,
+        reconcile: bool | None = None,
+        clear_manifest: bool = True,
+) -> int:
+    """Register the files a step recorded in its output manifest; returns the number registered.
+
+    Rows are upserted on (job, absolute path) with batched ``bulk_create``
+    calls. With ``reconcile`` (``OUTPUT_RECONCILE_SCAN`` by default) the job's
+    part of ``base_dir`` is also walked, which picks up files written outside
+    the pipeline services. An empty manifest falls back to the same walk, so
+    a step that skipped all of its work still registers the existing files.
+    The manifest is removed afterwards unless
+    ``clear_manifest`` is false, as when several states of one job record
+    into it concurrently; upserts make re-registering its entries harmless.
+    """
+    if reconcile is None:
+        reconcile = getattr(settings, "OUTPUT_RECONCILE_SCAN", False)
+    base_dir = Path(os.path.abspath(base_dir))
+    paths = {Path(p): None for p in read_manifest(job.id, step)}
+    if reconcile or not paths:
+        for root in _scan_roots(job, step, base_dir):
+            for file_path in _iter_files(root):
+                if output_belongs_to_job(job, step, file_path, base_dir):
+                    paths.setdefault(file_path, None)
+    records = [
+        record
+        for record in (_output_record(job, step, file_path, base_dir) for file_path in paths)
+        if record is not None
+    ]
+    if records:
+        JobOutput.objects.bulk_create(
+            records,
+            batch_size=getattr(settings, "OUTPUT_REGISTER_BATCH", 500),
+            update_conflicts=True,
+            unique_fields=["job", "absolute_path"],
+            update_fields=["step", "relative_path", "size_bytes", "file_modified_at", "updated_at"],
         )
+    if clear_manifest:
+        remove_manifest(job.id, step)
+    return len(records)
@@ -1,4 +1,5 @@
 import threading
+import time
 from typing import Dict, Optional
 
 import redis
@@ -79,8 +80,16 @@ def set_step_progress(job_id: int, step: str, current: int, total: int, message:
     return payload
 
 
+def add_progress_total(job_id: int, amount: int) -> Dict[str, str]:
+    """Grow the job-level total, for work that joins a run already in progress."""
+    return _add_total(_progress_key(job_id), amount)
+
+
 def add_step_total(job_id: int, step: str, amount: int) -> Dict[str, str]:
-    key = _step_progress_key(job_id, step)
+    return _add_total(_step_progress_key(job_id, step), amount)
+
+
+def _add_total(key: str, amount: int) -> Dict[str, str]:
     try:
         client = get_redis()
         total_val = client.hincrby(key, "total", amount)
@@ -235,6 +244,30 @@ def get_all_progress(job_id: int, steps: Optional[list] = None) -> Dict[str, Dic
     return data
 
 
+def _states_done_key(job_id: int) -> str:
+    return f"job:{job_id}:states_done"
+
+
+def reset_states_done(job_id: int) -> None:
+    key = _states_done_key(job_id)
+    try:
+        get_redis().delete(key)
+    except Exception:
+        _fallback_store.pop(key, None)
+
+
+def mark_state_done(job_id: int) -> int:
+    """Count one more finished state of the job; returns the new count."""
+    key = _states_done_key(job_id)
+    try:
+        return int(get_redis().incr(key))
+    except Exception:
+        with _lock:
+            done = int(_fallback_get(key).get("done", "0")) + 1
+            _fallback_set(key, {"done": str(done)})
+        return done
+
+
 def set_cancel(job_id: int, cancelled: bool = True) -> None:
     key = f"job:{job_id}:cancel"
     try:
@@ -259,6 +292,144 @@ def is_cancelled(job_id: int) -> bool:
         return _fallback_get(key).get("cancel") == "1"
 
 
+class ProgressReporter:
+    """Buffer progress increments and cancel checks for hot loops.
+
+    Increments are summed in-process and written every ``flush_ms`` as one
+    ``HINCRBY``/``HSET`` transaction per flush, with one log line per
+    step carrying the latest message. The cancel flag is read at most every
+    ``cancel_poll_ms``; once set it stays set. Safe to share between threads.
+    Use as a context manager, or call ``flush`` before the work is reported done.
+    """
+
+    def __init__(
+        self,
+        job_id: int,
+        flush_ms: Optional[int] = None,
+        cancel_poll_ms: Optional[int] = None,
+    ):
+        self.job_id = job_id
+        if flush_ms is None:
+            flush_ms = getattr(settings, "PROGRESS_FLUSH_MS", 500)
+        if cancel_poll_ms is None:
+            cancel_poll_ms = getattr(settings, "CANCEL_POLL_MS", 1000)
+        self.flush_interval = flush_ms / 1000.0
+        self.cancel_poll_interval = cancel_poll_ms / 1000.0
+        self._lock = threading.Lock()
+        self._pending: Dict[Optional[str], int] = {}
+        self._messages: Dict[Optional[str], str] = {}
+        # Fallback store value of each step when Redis first failed, while increments are unsent
+        self._fallback_base: Dict[Optional[str], int] = {}
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._last_poll = float("-inf")
+        self._cancelled = False
+
+    def _key(self, step: Optional[str]) -> str:
+        return _progress_key(self.job_id) if step is None else _step_progress_key(self.job_id, step)
+
+    def increment(self, step: Optional[str], amount: int = 1, message: str = "") -> None:
+        """Queue ``amount`` for ``step`` (``None`` for the overall progress)."""
+        with self._lock:
+            self._pending[step] = self._pending.get(step, 0) + amount
+            if message:
+                self._messages[step] = message
+            due = time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def is_cancelled(self) -> bool:
+        now = time.monotonic()
+        if not self._cancelled and now - self._last_poll >= self.cancel_poll_interval:
+            self._last_poll = now
+            self._cancelled = is_cancelled(self.job_id)
+        return self._cancelled
+
+    def flush(self) -> None:
+        """Write the queued increments; they stay queued until Redis has applied them.
+
+        The increments go out in one MULTI/EXEC transaction, so a failed flush
+        applies none of them and the next flush retries the same amounts. While
+        Redis is unreachable the in-process fallback store gets absolute values
+        (its value before the outage plus everything still queued), so repeated
+        failed flushes do not count anything twice.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending = dict(self._pending)
+                messages = dict(self._messages)
+                self._last_flush = time.monotonic()
+            if not pending:
+                return
+            steps = list(pending)
+            percents = {}
+            try:
+                client = get_redis()
+                pipe = client.pipeline(transaction=True)
+                for step in steps:
+                    key = self._key(step)
+                    pipe.hincrby(key, "current", pending[step])
+                    pipe.hget(key, "total")
+                    if messages.get(step):
+                        pipe.hset(key, "message", messages[step])
+                results = iter(pipe.execute())
+            except Exception:
+                results = None
+                for step in steps:
+                    key = self._key(step)
+                    store = _fallback_get(key)
+                    base = self._fallback_base.setdefault(step, int(store.get("current", "0")))
+                    current = base + pending[step]
+                    total = int(store.get("total", "0"))
+                    percents[step] = int((current / total) * 100) if total else 0
+                    _fallback_set(
+                        key,
+                        {
+                            "current": str(current),
+                            "percent": str(percents[step]),
+                            "message": messages.get(step) or store.get("message", ""),
+                        },
+                    )
+            with self._lock:
+                for step in steps:
+                    # Messages are written (or stored in the fallback) and logged once either way.
+                    if step in messages and self._messages.get(step) == messages[step]:
+                        del self._messages[step]
+                    if results is None:
+                        continue
+                    left = self._pending.get(step, 0) - pending[step]
+                    if left:
+                        self._pending[step] = left
+                    else:
+                        self._pending.pop(step, None)
+                    self._fallback_base.pop(step, None)
+            if results is not None:
+                for step in steps:
+                    current, total = int(next(results)), int(next(results) or 0)
+                    if messages.get(step):
+                        next(results)
+                    percents[step] = int((current / total) * 100) if total else 0
+                try:
+                    pipe = client.pipeline(transaction=False)
+                    for step in steps:
+                        pipe.hset(self._key(step), "percent", percents[step])
+                    pipe.execute()
+                except Exception:
+                    pass
+        for step, message in messages.items():
+            text = message if step is None else f"{step}: {message}"
+            append_log(self.job_id, text, percent=percents.get(step))
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self) -> "ProgressReporter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
 def reset_progress(job_id: int) -> None:
     keys = [
         _progress_key(job_id),
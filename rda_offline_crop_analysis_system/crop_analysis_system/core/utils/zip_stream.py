@@ -0,0 +1,60 @@
+import io
+import zipfile
+from pathlib import Path
+from typing import Iterable, Iterator, List, Tuple
+
+# Already-compressed formats are stored as-is; deflating them again costs CPU for no gain.
+STORED_SUFFIXES = (".tif", ".tiff", ".png", ".jpg", ".jpeg", ".zip", ".gz")
+CHUNK_SIZE = 1024 * 1024
+
+
+class _ChunkSink(io.RawIOBase):
+    """Unseekable write target that hands back what ``ZipFile`` wrote since the last drain."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(entries: Iterable[Tuple[Path, str]], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield a ZIP archive of ``(file_path, arcname)`` entries chunk by chunk.
+
+    Nothing is buffered beyond one read chunk and its compressed output: the
+    archive is written to an unseekable sink, so sizes and CRCs go into data
+    descriptors after each member, and ZIP64 records are used for members and
+    archives beyond 4 GiB.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", allowZip64=True) as zf:
+        for file_path, arcname in entries:
+            info = zipfile.ZipInfo.from_file(file_path, arcname)
+            if Path(file_path).suffix.lower() in STORED_SUFFIXES:
+                info.compress_type = zipfile.ZIP_STORED
+            else:
+                info.compress_type = zipfile.ZIP_DEFLATED
+            with open(file_path, "rb") as src, zf.open(info, "w") as dst:
+                while True:
+                    chunk = src.read(chunk_size)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+    # Central directory, written when the archive closes.
+    yield sink.drain()
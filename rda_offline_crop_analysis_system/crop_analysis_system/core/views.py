@@ -1,13 +1,11 @@
 import json
 from datetime import datetime
 from typing import Any, Dict, Tuple
-import tempfile
-import zipfile
 
 from django.conf import settings
 from celery import current_app
 from celery.result import AsyncResult
-from django.http import FileResponse, JsonResponse, HttpResponse
+from django.http import FileResponse, JsonResponse, HttpResponse, StreamingHttpResponse
 from django.core.paginator import Paginator
 from django.shortcuts import render
 from django.contrib.admin.views.decorators import staff_member_required
@@ -17,16 +15,20 @@ from django.views.decorators.csrf import csrf_exempt
 
 from core.models import Country, Job, JobOutput, PipelineConfig, RootPath
 from core.utils.file_manager import list_level1, list_level2, list_level3
+from core.utils.area_store import area_csv_name, query_area_results, render_area_csv
 from core.utils.redis_client import get_all_progress, reset_progress, set_cancel
 from core.utils.output_tracker import output_belongs_to_job
+from core.utils.zip_stream import iter_zip
 from core.utils.app_settings import (
     get_input_root,
     get_logs_root,
     get_output_root,
     get_root_by_type,
+    resolve_root_path,
 )
-from core.utils.gpu import get_available_gpu_count
-from core.utils.job_queue import queue_or_start
+from core.utils.gpu import get_available_gpu_count, get_inventory
+from core.utils.job_queue import queue_or_start, start_next_pending_job
+from pipeline.services.boundaries import boundaries_geojson
 
 
 def _parse_json(request) -> Tuple[Dict[str, Any], JsonResponse]:
@@ -140,6 +142,10 @@ def create_job(request):
     skip_inference = bool(payload.get("skip_inference"))
     skip_merge = bool(payload.get("skip_merge"))
     skip_area = bool(payload.get("skip_area"))
+    try:
+        priority = int(payload.get("priority") or 0)
+    except (TypeError, ValueError):
+        return JsonResponse({"error": "priority must be an integer."}, status=400)
 
     if not year_suffix or not country or not target_crops:
         return JsonResponse({"error": "Missing required fields."}, status=400)
@@ -202,6 +208,7 @@ def create_job(request):
         skip_area=skip_area,
         gpu_count=gpu_count,
         schedule_at=schedule_dt,
+        priority=priority,
     )
 
     queue_or_start(job)
@@ -218,10 +225,33 @@ def create_job(request):
     )
 
 
+def config_boundaries(request, config_id: int):
+    config = PipelineConfig.objects.filter(id=config_id).first()
+    if not config:
+        return JsonResponse({"error": "Pipeline config not found."}, status=404)
+    shapefile = resolve_root_path(config.shapefile_path, "shp")
+    if not config.shapefile_path or not shapefile.exists():
+        return JsonResponse({"error": "Shapefile not found."}, status=404)
+    states = [s for s in request.GET.get("states", "").split(",") if s.strip()]
+    try:
+        bbox = [float(v) for v in request.GET.get("bbox", "").split(",") if v.strip()]
+        simplify = float(request.GET.get("simplify", "0") or 0)
+    except ValueError:
+        return JsonResponse({"error": "bbox and simplify must be numbers."}, status=400)
+    if bbox and len(bbox) != 4:
+        return JsonResponse({"error": "bbox must be minx,miny,maxx,maxy."}, status=400)
+    payload = boundaries_geojson(str(shapefile), states=states, bbox=bbox or None, simplify=simplify)
+    return HttpResponse(payload, content_type="application/geo+json")
+
+
 def gpu_available(request):
     return JsonResponse({"available": get_available_gpu_count()})
 
 
+def compute_inventory(request):
+    return JsonResponse(get_inventory().snapshot().to_dict())
+
+
 def job_progress(request, job_id: int):
     progress = get_all_progress(job_id)
     return JsonResponse(progress)
@@ -372,6 +402,13 @@ def download_output(request, job_id: int):
     return FileResponse(file_path.open("rb"), as_attachment=True, filename=file_path.name)
 
 
+def _zip_response(entries, filename: str) -> StreamingHttpResponse:
+    """Stream a ZIP of ``(path, arcname)`` entries as it is built; no temp file or Content-Length."""
+    response = StreamingHttpResponse(iter_zip(entries), content_type="application/zip")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
 @csrf_exempt
 def download_job_outputs_zip(request, job_id: int):
     if request.method != "POST":
@@ -390,17 +427,12 @@ def download_job_outputs_zip(request, job_id: int):
     outputs = list(job.outputs.filter(absolute_path__in=paths))
     if not outputs:
         return JsonResponse({"error": "No matching outputs."}, status=404)
-    import tempfile
-    import zipfile
-
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".zip")
-    with zipfile.ZipFile(tmp.name, "w", zipfile.ZIP_DEFLATED) as zf:
-        for output in outputs:
-            file_path = Path(output.absolute_path)
-            if file_path.exists():
-                zf.write(file_path, arcname=output.relative_path)
-    filename = f"job_{job.id}_outputs.zip"
-    return FileResponse(open(tmp.name, "rb"), as_attachment=True, filename=filename)
+    entries = [
+        (Path(output.absolute_path), output.relative_path)
+        for output in outputs
+        if Path(output.absolute_path).is_file()
+    ]
+    return _zip_response(entries, f"job_{job.id}_outputs.zip")
 
 
 def job_detail(request, job_id: int):
@@ -498,6 +530,64 @@ def filtered_outputs(request):
     return JsonResponse({"items": results})
 
 
+def _area_query(request):
+    output_root = None
+    job_id = request.GET.get("job_id", "").strip()
+    output_name = request.GET.get("output_name", "").strip()
+    if job_id:
+        job = Job.objects.filter(id=job_id).first() if job_id.isdigit() else None
+        if not job or not job.output_path:
+            return None
+        output_root = job.output_path
+    elif output_name:
+        output_root = str(get_output_root() / output_name)
+    states = [s for s in request.GET.get("states", "").split(",") if s.strip()]
+    return query_area_results(
+        output_root=output_root,
+        country=request.GET.get("country", "").strip() or None,
+        year=request.GET.get("year_suffix", "").strip() or None,
+        crop=request.GET.get("crop", "").strip() or None,
+        states=states or None,
+    )
+
+
+def area_results(request):
+    results = _area_query(request)
+    if results is None:
+        return JsonResponse({"error": "Job not found."}, status=404)
+    items = [
+        {
+            "country": r.country,
+            "state": r.state,
+            "year": r.year,
+            "crop": r.crop,
+            "class_id": r.class_id,
+            "area_m2": r.area_m2,
+            "area_ha": r.area_ha,
+            "area_acre": r.area_acre,
+            "job_id": r.job_id,
+            "updated_at": r.updated_at.isoformat(),
+        }
+        for r in results
+    ]
+    return JsonResponse({"items": items})
+
+
+def area_results_csv(request):
+    results = _area_query(request)
+    if results is None:
+        return HttpResponse("Job not found", status=404)
+    filename = area_csv_name(
+        request.GET.get("year_suffix", "").strip() or "all",
+        request.GET.get("country", "").strip() or "all",
+        request.GET.get("crop", "").strip() or "all",
+    )
+    # Leading BOM, as in the exported files, so spreadsheet tools detect UTF-8 state names.
+    response = HttpResponse("\ufeff" + render_area_csv(results), content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
 def download_job_step_zip(request, job_id: int):
     job = Job.objects.filter(id=job_id).first()
     if not job:
@@ -512,28 +602,15 @@ def download_job_step_zip(request, job_id: int):
     if not outputs_qs.exists():
         return HttpResponse("No output files found for this job/step.", status=404)
 
-    with tempfile.NamedTemporaryFile(delete=True, suffix=".zip") as tmp:
-        with zipfile.ZipFile(tmp.name, "w", zipfile.ZIP_DEFLATED) as zf:
-            for output in outputs_qs:
-                try:
-                    file_path = (Path(job.output_path) / output.step / output.relative_path).resolve()
-                    if file_path.exists() and file_path.is_file():
-                        # Create a nested structure inside the zip
-                        arcname = Path(output.step) / output.relative_path
-                        zf.write(file_path, arcname=arcname)
-                except Exception:
-                    # Ignore files that can't be found or read
-                    pass
-        
-        # Check if the zip file has content
-        if zf.namelist():
-            tmp.seek(0)
-            response = HttpResponse(tmp.read(), content_type="application/zip")
-            zip_filename = f"job_{job.id}_{step if step else 'all'}_outputs.zip"
-            response["Content-Disposition"] = f"attachment; filename={zip_filename}"
-            return response
-        else:
-            return HttpResponse("No valid output files could be zipped.", status=404)
+    entries = []
+    for output in outputs_qs:
+        file_path = (Path(job.output_path) / output.step / output.relative_path).resolve()
+        if file_path.is_file():
+            # Create a nested structure inside the zip
+            entries.append((file_path, str(Path(output.step) / output.relative_path)))
+    if not entries:
+        return HttpResponse("No valid output files could be zipped.", status=404)
+    return _zip_response(entries, f"job_{job.id}_{step if step else 'all'}_outputs.zip")
 
 
 @csrf_exempt
@@ -551,18 +628,12 @@ def download_outputs_zip(request):
     outputs = list(JobOutput.objects.select_related("job").filter(absolute_path__in=paths))
     if not outputs:
         return JsonResponse({"error": "No matching outputs."}, status=404)
-    import tempfile
-    import zipfile
-
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".zip")
-    with zipfile.ZipFile(tmp.name, "w", zipfile.ZIP_DEFLATED) as zf:
-        for output in outputs:
-            file_path = Path(output.absolute_path)
-            if file_path.exists():
-                arcname = f"{output.job_id}/{output.step}/{output.relative_path}"
-                zf.write(file_path, arcname=arcname)
-    filename = "job_outputs.zip"
-    return FileResponse(open(tmp.name, "rb"), as_attachment=True, filename=filename)
+    entries = [
+        (Path(output.absolute_path), f"{output.job_id}/{output.step}/{output.relative_path}")
+        for output in outputs
+        if Path(output.absolute_path).is_file()
+    ]
+    return _zip_response(entries, "job_outputs.zip")
 
 
 def job_info(request, job_id: int):
@@ -598,6 +669,8 @@ def cancel_job(request, job_id: int):
     for task_id in task_ids:
         if task_id:
             current_app.control.revoke(task_id, terminate=True, signal="SIGTERM")
+    # Resources leased by the cancelled job are free again.
+    start_next_pending_job()
     return JsonResponse({"status": "cancelled"})
 
 
@@ -0,0 +1,177 @@
+from functools import lru_cache
+from typing import Callable, Optional, Sequence, Tuple
+
+import numpy as np
+
+ACCUMULATE_DENSE = "dense"
+ACCUMULATE_STREAM = "stream"
+ACCUMULATE_MODES = (ACCUMULATE_DENSE, ACCUMULATE_STREAM)
+
+PRECISION_FLOAT32 = "float32"
+PRECISION_FLOAT16 = "float16"
+PRECISION_UINT8 = "uint8"
+ACCUMULATOR_PRECISIONS = (PRECISION_FLOAT32, PRECISION_FLOAT16, PRECISION_UINT8)
+
+# uint8-quantized probabilities are summed in uint16 so overlapping windows cannot overflow.
+_BUFFER_DTYPES = {
+    PRECISION_FLOAT32: np.float32,
+    PRECISION_FLOAT16: np.float16,
+    PRECISION_UINT8: np.uint16,
+}
+
+BLEND_UNIFORM = "uniform"
+BLEND_GAUSSIAN = "gaussian"
+BLEND_COSINE = "cosine"
+BLEND_MODES = (BLEND_UNIFORM, BLEND_GAUSSIAN, BLEND_COSINE)
+
+# Gaussian sigma as a fraction of the window side; edge weights are floored so
+# pixels covered only by window borders still get a defined label.
+GAUSSIAN_SIGMA_SCALE = 0.25
+BLEND_KERNEL_FLOOR = 1e-3
+
+RowSink = Callable[[int, np.ndarray], None]
+
+
+def _blend_profile(mode: str, size: int) -> np.ndarray:
+    centers = np.arange(size, dtype=np.float64) + 0.5
+    if mode == BLEND_GAUSSIAN:
+        sigma = size * GAUSSIAN_SIGMA_SCALE
+        return np.exp(-0.5 * ((centers - size / 2.0) / sigma) ** 2)
+    if mode == BLEND_COSINE:
+        return np.sin(np.pi * centers / size) ** 2
+    return np.ones(size, dtype=np.float64)
+
+
+@lru_cache(maxsize=16)
+def blend_kernel(mode: str, window_size: Tuple[int, int]) -> np.ndarray:
+    """Return the read-only ``(h, w)`` weight kernel for ``mode``, peak-normalized to 1."""
+    if mode not in BLEND_MODES:
+        raise ValueError(f"Blend mode must be one of {', '.join(BLEND_MODES)}; got {mode!r}.")
+    win_h, win_w = window_size
+    kernel = np.outer(_blend_profile(mode, win_h), _blend_profile(mode, win_w))
+    kernel = np.maximum(kernel / kernel.max(), BLEND_KERNEL_FLOOR).astype(np.float32)
+    kernel.setflags(write=False)
+    return kernel
+
+
+class RowBandAccumulator:
+    """Sum window class probabilities over a rolling band of tile rows.
+
+    Windows must arrive in the row-major order produced by
+    ``sliding_window_coords``. Once a window starting at row ``x`` arrives, no
+    later window touches rows above ``x``, so those rows are finalized with an
+    argmax, handed to ``sink`` and dropped from the band. Only ``band_rows``
+    rows (one window height in streaming mode, grown to the row span of a
+    batch when needed) are kept resident instead of the whole
+    ``(H, W, num_class)`` tile.
+
+    A whole batch is weighted by the cached ``blend_mode`` kernel and
+    quantized in one vectorized pass before being added to the band.
+    """
+
+    def __init__(
+            self,
+            height: int,
+            width: int,
+            num_class: int,
+            band_rows: Optional[int] = None,
+            precision: str = PRECISION_FLOAT32,
+            sink: Optional[RowSink] = None,
+            blend_mode: str = BLEND_UNIFORM,
+    ):
+        if blend_mode not in BLEND_MODES:
+            raise ValueError(f"Blend mode must be one of {', '.join(BLEND_MODES)}; got {blend_mode!r}.")
+        if precision not in _BUFFER_DTYPES:
+            raise ValueError(
+                f"Accumulator precision must be one of {', '.join(ACCUMULATOR_PRECISIONS)}; got {precision!r}."
+            )
+        self.height = height
+        self.width = width
+        self.num_class = num_class
+        self.precision = precision
+        self.blend_mode = blend_mode
+        self.band_rows = min(height, band_rows) if band_rows else height
+        self.rolling = self.band_rows < height
+        self.buffer = np.zeros((self.band_rows, width, num_class), dtype=_BUFFER_DTYPES[precision])
+        self.row_base = 0
+        self.sink = sink
+        self.labels: Optional[np.ndarray] = None
+        if sink is None:
+            self.labels = np.zeros((height, width), dtype=np.uint8)
+
+    def _quantize(self, prob: np.ndarray) -> np.ndarray:
+        if self.precision == PRECISION_UINT8:
+            return np.rint(prob * 255).astype(np.uint16)
+        return prob.astype(self.buffer.dtype, copy=False)
+
+    def _emit(self, row_start: int, labels: np.ndarray) -> None:
+        if self.sink is not None:
+            self.sink(row_start, labels)
+        else:
+            self.labels[row_start: row_start + labels.shape[0]] = labels
+
+    def finalize_until(self, row: int) -> None:
+        """Finalize every row above ``row`` and slide the band down to start at ``row``."""
+        row = min(row, self.height)
+        count = row - self.row_base
+        if count <= 0:
+            return
+        resident = min(count, self.band_rows)
+        labels = np.argmax(self.buffer[:resident], axis=-1).astype(np.uint8)
+        if count > resident:
+            # Rows no window covered (step larger than the window) stay background.
+            gap = np.zeros((count - resident, self.width), dtype=np.uint8)
+            labels = np.concatenate([labels, gap], axis=0)
+        self._emit(self.row_base, labels)
+        keep = self.band_rows - resident
+        if keep > 0:
+            self.buffer[:keep] = self.buffer[resident:]
+        self.buffer[keep:] = 0
+        self.row_base = row
+
+    def _reserve_rows(self, row_end: int) -> None:
+        """Grow the band so rows up to ``row_end`` fit behind ``row_base``."""
+        needed = min(row_end, self.height) - self.row_base
+        if needed <= self.band_rows:
+            return
+        extra = np.zeros((needed - self.band_rows, self.width, self.num_class), dtype=self.buffer.dtype)
+        self.buffer = np.concatenate([self.buffer, extra], axis=0)
+        self.band_rows = needed
+
+    def add_window(self, prob: np.ndarray, x: int, y: int, h: int, w: int) -> None:
+        """Add one ``(num_class, h, w)`` softmax window whose top-left is ``(x, y)``."""
+        self.add_batch(prob[np.newaxis], [(x, y, h, w)])
+
+    def add_batch(self, probs: np.ndarray, coords: Sequence[Tuple[int, int, int, int]]) -> None:
+        """Blend a batch of ``(num_class, h, w)`` softmax windows into the band.
+
+        All windows of a batch share the window size; ``sliding_window_coords``
+        keeps them inside the tile except when the tile is smaller than a window,
+        in which case every window starts at the origin and is cropped alike.
+        """
+        if not len(coords):
+            return
+        xs = np.array([c[0] for c in coords], dtype=np.int64)
+        ys = np.array([c[1] for c in coords], dtype=np.int64)
+        win_h, win_w = coords[0][2], coords[0][3]
+        if self.rolling and xs.min() > self.row_base:
+            self.finalize_until(int(xs.min()))
+        valid_h = int(min(win_h, self.height - xs.max()))
+        valid_w = int(min(win_w, self.width - ys.max()))
+        if valid_h <= 0 or valid_w <= 0:
+            return
+        self._reserve_rows(int(xs.max()) + valid_h)
+        weighted = probs[:, :, :valid_h, :valid_w]
+        if self.blend_mode != BLEND_UNIFORM:
+            weighted = weighted * blend_kernel(self.blend_mode, (win_h, win_w))[:valid_h, :valid_w]
+        values = self._quantize(weighted.transpose(0, 2, 3, 1))
+        # Contiguous slice adds measured several times faster than a flat
+        # np.add.at scatter for window-sized blocks, so the add stays per window.
+        for value, x, y in zip(values, xs - self.row_base, ys):
+            self.buffer[x: x + valid_h, y: y + valid_w] += value
+
+    def finish(self) -> Optional[np.ndarray]:
+        """Finalize the remaining rows; returns the label array when no sink was given."""
+        self.finalize_until(self.height)
+        self.buffer = np.zeros((0, self.width, self.num_class), dtype=self.buffer.dtype)
+        return self.labels
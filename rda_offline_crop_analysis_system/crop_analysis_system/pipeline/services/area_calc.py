@@ -3,12 +3,12 @@ import time
 from datetime import datetime
 from multiprocessing import Pool, current_process, get_context
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Dict, List, Tuple, Iterable
+from typing import Dict, List, Set, Tuple, Iterable
 
-import geopandas as gpd
 import numpy as np
-import pandas as pd
 import rasterio
+import shapely
+from django.conf import settings
 from pyproj import CRS
 from rasterio.mask import mask
 from rasterio.warp import Resampling, calculate_default_transform, reproject
@@ -16,21 +16,31 @@ from rasterio.warp import transform as rio_transform
 from tqdm import tqdm
 
 from core.utils.redis_client import (
+    add_progress_total,
+    add_step_total,
     increment_progress,
     increment_step_progress,
     is_cancelled,
     set_progress,
     set_step_progress,
 )
+from pipeline.services.boundaries import get_boundaries
+from pipeline.services.zonal_area import (
+    AREA_ENGINE_ZONAL,
+    AREA_ENGINES,
+    GridMismatchError,
+    zonal_class_areas,
+    zonal_histograms,
+)
 from core.utils.log_files import (
     append_csv_row,
     append_log,
     csv_path,
     format_elapsed_hms,
     format_error_with_trace,
+    record_outputs,
 )
 
-import unicodedata
 
 AREA_CSV_HEADERS = (
     "timestamp",
@@ -93,24 +103,12 @@ def reproject_to_1bit_binary(input_path, output_path, resolution=10, nodata_valu
     return output_path, utm_crs
 
 
-def remove_accents(text):
-    if isinstance(text, str):
-        return ''.join(
-            c for c in unicodedata.normalize('NFD', text)
-            if unicodedata.category(c) != 'Mn'
-        )
-    return text
-
-
 def clip_and_calculate_area_by_class(raster_path, vector_path, state_name, resolution):
-    gdf = gpd.read_file(vector_path)
-    query_name = state_name.replace("_", " ")
-    state_layer = gdf[gdf["NAME_1"].apply(remove_accents) == query_name]
-    if state_layer.empty:
-        raise ValueError(f"State name '{query_name}' not found in shapefile.")
+    boundaries = get_boundaries(vector_path)
     with rasterio.open(raster_path) as src:
-        if state_layer.crs != src.crs:
-            state_layer = state_layer.to_crs(src.crs)
+        state_layer = boundaries.state_rows(state_name, crs=src.crs.to_wkt())
+        if state_layer.empty:
+            raise ValueError(f"State name '{state_name.replace('_', ' ')}' not found in shapefile.")
         clipped_image, _ = mask(src, state_layer.geometry, crop=True)
         clipped_data = clipped_image[0]
         unique, counts = np.unique(clipped_data, return_counts=True)
@@ -123,20 +121,101 @@ def clip_and_calculate_area_by_class(raster_path, vector_path, state_name, resol
         return area_by_class
 
 
-def process_tiff_task(args):
-    input_tiff, temp_dir, shapefile_path, resolution, crop, year_suffix, state_name, job_id = args
+def load_state_geometries(shapefile_path: str, states: List[str]) -> Dict[str, Tuple[bytes, str]]:
+    """Return each state's dissolved boundary as ``(wkb, crs_wkt)`` from the boundary cache."""
+    boundaries = get_boundaries(shapefile_path)
+    crs_wkt = boundaries.crs.to_wkt()
+    geometries = {}
+    for state_name in states:
+        geometry = boundaries.state_geometry(state_name)
+        if geometry is not None:
+            geometries[state_name] = (shapely.to_wkb(geometry), crs_wkt)
+    return geometries
+
+
+def area_rows(area_by_class: Dict[int, int], state_name: str, year_suffix: str, crop: str) -> List[Dict]:
+    rows = []
+    for cls, area_m2 in area_by_class.items():
+        if cls == 0:
+            continue
+        area_acre = area_m2 / 4046.8564224
+        area_ha = area_m2 / 10000.0
+        rows.append(
+            {
+                "state": state_name,
+                "year": year_suffix,
+                "crop": crop,
+                "class_id": cls,
+                "area_m2": area_m2,
+                "area_ha": round(area_ha, 2),
+                "area_acre": round(area_acre, 2),
+            }
+        )
+    return rows
+
+
+def _cancelled_result(input_tiff: str, state_name: str, crop: str) -> Dict:
+    return {
+        "rows": [],
+        "metrics": {
+            "state": state_name,
+            "crop": crop,
+            "input_path": input_tiff,
+            "input_bytes": 0,
+            "elapsed_sec": 0.0,
+            "status": "cancelled",
+        },
+    }
+
+
+def process_zonal_state_task(args):
+    """Areas of every crop mask of one state in one zonal pass: no reprojection or temp file.
+
+    The masks are read together block by block, so the polygon
+    rasterization and pixel areas are computed once for all crops. Masks
+    that are not on one grid fall back to one pass per crop.
+    """
+    state_name, crop_paths, geometry, year_suffix, job_id = args
     if is_cancelled(job_id):
         return {
             "rows": [],
-            "metrics": {
+            "metrics": [_cancelled_result(path, state_name, crop)["metrics"] for crop, path in crop_paths],
+        }
+    started = time.perf_counter()
+    paths = [path for _, path in crop_paths]
+    try:
+        if geometry is None:
+            raise ValueError(f"State name '{state_name.replace('_', ' ')}' not found in shapefile.")
+        try:
+            histograms = zonal_histograms(paths, *geometry)
+        except GridMismatchError:
+            histograms = [zonal_class_areas(path, *geometry) for path in paths]
+    except Exception as exc:
+        crops = ",".join(crop for crop, _ in crop_paths)
+        append_log(job_id, format_error_with_trace(f"area {state_name}/{crops}", exc))
+        raise
+    elapsed = round(time.perf_counter() - started, 4)
+    results = []
+    metrics = []
+    for (crop, path), histogram in zip(crop_paths, histograms):
+        results.extend(area_rows(histogram, state_name, year_suffix, crop))
+        metrics.append(
+            {
                 "state": state_name,
                 "crop": crop,
-                "input_path": input_tiff,
-                "input_bytes": 0,
-                "elapsed_sec": 0.0,
-                "status": "cancelled",
-            },
-        }
+                "input_path": path,
+                "input_bytes": os.path.getsize(path) if os.path.exists(path) else 0,
+                "elapsed_sec": elapsed,
+                "status": "ok",
+            }
+        )
+    return {"rows": results, "metrics": metrics}
+
+
+def process_tiff_task(args):
+    input_tiff, temp_dir, shapefile_path, resolution, crop, year_suffix, state_name, job_id = args
+    if is_cancelled(job_id):
+        return _cancelled_result(input_tiff, state_name, crop)
     filename = os.path.basename(input_tiff)
     output_temp_tiff = os.path.join(temp_dir, f"temp_area_{filename}")
     results = []
@@ -149,22 +228,7 @@ def process_tiff_task(args):
         area_by_class = clip_and_calculate_area_by_class(
             reprojected_path, shapefile_path, state_name, resolution
         )
-        for cls, area_m2 in area_by_class.items():
-            if cls == 0:
-                continue
-            area_acre = area_m2 / 4046.8564224
-            area_ha = area_m2 / 10000.0
-            results.append(
-                {
-                    "state": state_name,
-                    "year": year_suffix,
-                    "crop": crop,
-                    "class_id": cls,
-                    "area_m2": area_m2,
-                    "area_ha": round(area_ha, 2),
-                    "area_acre": round(area_acre, 2),
-                }
-            )
+        results = area_rows(area_by_class, state_name, year_suffix, crop)
     except Exception as exc:
         append_log(job_id, format_error_with_trace(f"area {state_name}/{crop}", exc))
         raise
@@ -188,30 +252,6 @@ def process_tiff_task(args):
     }
 
 
-def update_csv_results(output_csv_path: str, new_rows: List[Dict], processed_states: List[str]):
-    if not new_rows and not processed_states:
-        return
-    cols = ["state", "year", "crop", "class_id", "area_m2", "area_ha", "area_acre"]
-    new_df = pd.DataFrame(new_rows)
-    if not new_df.empty:
-        new_df = new_df[cols]
-    if os.path.exists(output_csv_path):
-        try:
-            existing_df = pd.read_csv(output_csv_path)
-            cleaned_df = existing_df[~existing_df["state"].isin(processed_states)]
-            if not new_df.empty:
-                final_df = pd.concat([cleaned_df, new_df], ignore_index=True)
-            else:
-                final_df = cleaned_df
-        except Exception:
-            final_df = new_df
-    else:
-        final_df = new_df
-    if not final_df.empty:
-        os.makedirs(os.path.dirname(output_csv_path), exist_ok=True)
-        final_df.to_csv(output_csv_path, index=False, encoding="utf-8-sig")
-
-
 def get_crop_list(crops_str: str) -> List[str]:
     alias_map = {
         "corn": "Corn",
@@ -249,51 +289,90 @@ def run_area_calc(
         workers: int = 4,
         temp_dir: str = "temp_area",
         skip_exists: bool = False,
+        engine: str | None = None,
+        reset_progress: bool = True,
 ) -> None:
+    """Calculate per-state crop areas from the merged masks and export one CSV per crop.
+
+    With ``skip_exists`` a state is skipped for a crop when the area store
+    already holds its rows. ``reset_progress`` false adds this call's tasks to
+    the job's progress totals instead of restarting them.
+    """
+    engine = engine or getattr(settings, "AREA_ENGINE", "reproject")
+    if engine not in AREA_ENGINES:
+        raise ValueError(f"Area engine must be one of {', '.join(AREA_ENGINES)}; got {engine!r}.")
+    zonal = engine == AREA_ENGINE_ZONAL
     input_base = os.path.join(output_root, "merged_cropmasks", year_suffix, country)
     output_dir = os.path.join(output_root, "calculate_area")
     if not os.path.exists(input_base):
         return
     crop_names = get_crop_list(crops)
-    os.makedirs(temp_dir, exist_ok=True)
+    # Imported here: pool workers spawn this module without a configured Django app registry.
+    from core.utils.area_store import area_csv_name, export_area_csv, stored_states, upsert_area_results
+
+    if zonal:
+        geometries = load_state_geometries(shapefile_path, states)
+    else:
+        os.makedirs(temp_dir, exist_ok=True)
     all_tasks: List[Tuple] = []
+    state_crops: Dict[str, List[Tuple[str, str]]] = {}
+    processed: Dict[str, List[str]] = {}
+    skipped_csvs: Set[str] = set()
     for crop in crop_names:
+        # A state is skipped when the store already holds its rows for this crop,
+        # so other states (or a later per-state run) still get calculated.
+        done = stored_states(output_root, country, year_suffix, crop) if skip_exists else set()
         for state in states:
+            if state in done:
+                skipped_csvs.add(os.path.join(output_dir, area_csv_name(year_suffix, country, crop)))
+                continue
+            processed.setdefault(crop, []).append(state)
             filename = f"{year_suffix}_{country}_{state}_{crop}.tif"
             file_path = os.path.join(input_base, state, crop, filename)
             if os.path.exists(file_path):
-                if skip_exists:
-                    csv_filename = f"{year_suffix}_{country}_{crop}.csv"
-                    csv_file_path = os.path.join(output_dir, csv_filename)
-                    if os.path.exists(csv_file_path):
-                        continue
+                if zonal:
+                    state_crops.setdefault(state, []).append((crop, file_path))
+                    continue
                 all_tasks.append(
                     (file_path, temp_dir, shapefile_path, resolution, crop, year_suffix, state, job_id)
                 )
-    set_progress(job_id, 0, len(all_tasks), "Starting area calculation")
-    set_step_progress(job_id, "area", 0, len(all_tasks), "Starting area calculation")
+    for state, crop_paths in state_crops.items():
+        all_tasks.append((state, crop_paths, geometries.get(state), year_suffix, job_id))
+    skipped_csvs = {path for path in skipped_csvs if os.path.exists(path)}
+    if skipped_csvs:
+        # Skipped states keep their crop CSVs; record them so the job still lists them.
+        record_outputs(job_id, "calculate_area", sorted(skipped_csvs))
+    if reset_progress:
+        set_progress(job_id, 0, len(all_tasks), "Starting area calculation")
+        set_step_progress(job_id, "area", 0, len(all_tasks), "Starting area calculation")
+    else:
+        add_progress_total(job_id, len(all_tasks))
+        add_step_total(job_id, "area", len(all_tasks))
     if not all_tasks:
         return
     crop_results: List[Dict] = []
+    task_fn = process_zonal_state_task if zonal else process_tiff_task
 
     def _iter_results() -> Iterable[List[Dict]]:
         if current_process().daemon:
             with ThreadPoolExecutor(max_workers=workers) as executor:
-                futures = [executor.submit(process_tiff_task, t) for t in all_tasks]
+                futures = [executor.submit(task_fn, t) for t in all_tasks]
                 for fut in as_completed(futures):
                     yield fut.result()
         else:
             ctx = get_context("spawn")
             with ctx.Pool(processes=workers) as pool:
-                for result in pool.imap_unordered(process_tiff_task, all_tasks):
+                for result in pool.imap_unordered(task_fn, all_tasks):
                     yield result
 
     append_log(job_id, "Area calculation started")
     with tqdm(total=len(all_tasks), desc="Calculating area", unit="file") as pbar:
         for result in _iter_results():
             crop_results.extend(result.get("rows", []))
-            metrics = result.get("metrics")
-            if metrics:
+            metrics_list = result.get("metrics") or []
+            if isinstance(metrics_list, dict):
+                metrics_list = [metrics_list]
+            for metrics in metrics_list:
                 append_csv_row(
                     csv_path(job_id, "area_states"),
                     AREA_CSV_HEADERS,
@@ -315,11 +394,12 @@ def run_area_calc(
             increment_progress(job_id, increment=1, message="Calculating area")
             increment_step_progress(job_id, "area", increment=1, message="Calculating area")
             pbar.update(1)
-    for crop in crop_names:
+    for crop, crop_states in processed.items():
         crop_rows = [row for row in crop_results if row["crop"] == crop]
-        csv_filename = f"{year_suffix}_{country}_{crop}.csv"
-        csv_file_path = os.path.join(output_dir, csv_filename)
-        update_csv_results(csv_file_path, crop_rows, states)
+        upsert_area_results(output_root, country, year_suffix, crop, crop_rows, crop_states, job_id)
+        exported = export_area_csv(output_root, country, year_suffix, crop)
+        if exported:
+            record_outputs(job_id, "calculate_area", [exported])
     append_log(job_id, "Area calculation finished")
     try:
         if os.path.exists(temp_dir) and not os.listdir(temp_dir):
@@ -0,0 +1,139 @@
+import os
+import threading
+import unicodedata
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import geopandas as gpd
+import shapely
+from pyproj import CRS
+
+NAME_FIELD = "NAME_1"
+_NAME_COLUMN = "_state_name"
+_SIDECAR_EXTS = (".shp", ".shx", ".dbf", ".prj", ".cpg")
+
+
+def remove_accents(text):
+    if isinstance(text, str):
+        return ''.join(
+            c for c in unicodedata.normalize('NFD', text)
+            if unicodedata.category(c) != 'Mn'
+        )
+    return text
+
+
+def normalize_state_name(name: str) -> str:
+    """Match key for a state: accents stripped, underscores read as spaces."""
+    return remove_accents(name).replace("_", " ")
+
+
+def _source_version(path: str) -> Tuple[float, ...]:
+    """Modification times of the shapefile and its sidecar files."""
+    stem, ext = os.path.splitext(path)
+    exts = _SIDECAR_EXTS if ext.lower() == ".shp" else (ext,)
+    return tuple(
+        os.path.getmtime(stem + e) if os.path.exists(stem + e) else 0.0 for e in exts
+    )
+
+
+class BoundaryLayer:
+    """One admin boundary file loaded once, with normalized names and a spatial index.
+
+    Reprojected copies of the layer and dissolved state geometries are
+    memoized per target CRS, so repeated lookups for the same raster CRS cost
+    a dictionary access.
+    """
+
+    def __init__(self, path: str, version: Tuple[float, ...]):
+        self.path = path
+        self.version = version
+        gdf = gpd.read_file(path)
+        gdf[_NAME_COLUMN] = gdf[NAME_FIELD].apply(normalize_state_name)
+        self.gdf = gdf
+        self.crs = CRS.from_user_input(gdf.crs) if gdf.crs is not None else None
+        self._lock = threading.Lock()
+        self._by_crs: Dict[str, gpd.GeoDataFrame] = {}
+        self._geometries: Dict[Tuple[str, str], object] = {}
+
+    def _crs_key(self, crs) -> str:
+        if crs is None or self.crs is None:
+            return ""
+        target = CRS.from_user_input(crs)
+        return "" if target == self.crs else target.to_wkt()
+
+    def frame(self, crs=None) -> gpd.GeoDataFrame:
+        """Return the layer in ``crs`` (the source CRS when ``None``); the result is shared."""
+        key = self._crs_key(crs)
+        if not key:
+            return self.gdf
+        with self._lock:
+            if key not in self._by_crs:
+                projected = self.gdf.to_crs(key)
+                projected.sindex  # build the STRtree once, with the copy
+                self._by_crs[key] = projected
+            return self._by_crs[key]
+
+    def state_names(self) -> List[str]:
+        return sorted(self.gdf[_NAME_COLUMN].dropna().unique())
+
+    def state_rows(self, state_name: str, crs=None) -> gpd.GeoDataFrame:
+        frame = self.frame(crs)
+        return frame[frame[_NAME_COLUMN] == normalize_state_name(state_name)]
+
+    def state_geometry(self, state_name: str, crs=None):
+        """Dissolved geometry of a state in ``crs``, or ``None`` when it is not in the layer."""
+        key = (normalize_state_name(state_name), self._crs_key(crs))
+        with self._lock:
+            if key in self._geometries:
+                return self._geometries[key]
+        rows = self.state_rows(state_name, crs)
+        geometry = shapely.union_all(rows.geometry.values) if not rows.empty else None
+        with self._lock:
+            self._geometries[key] = geometry
+        return geometry
+
+    def intersecting(self, bounds: Sequence[float], crs=None) -> gpd.GeoDataFrame:
+        """Rows whose geometry intersects the ``(minx, miny, maxx, maxy)`` box, via the STRtree."""
+        frame = self.frame(crs)
+        index = frame.sindex.query(shapely.box(*bounds), predicate="intersects")
+        return frame.iloc[sorted(index)]
+
+
+_cache_lock = threading.Lock()
+_cache: Dict[str, BoundaryLayer] = {}
+
+
+def get_boundaries(path: str) -> BoundaryLayer:
+    """Return the process-wide layer for ``path``, reloading it when the file changes."""
+    path = os.path.abspath(str(path))
+    version = _source_version(path)
+    with _cache_lock:
+        layer = _cache.get(path)
+        if layer is not None and layer.version == version:
+            return layer
+    layer = BoundaryLayer(path, version)
+    layer.gdf.sindex  # build the STRtree outside the cache lock
+    with _cache_lock:
+        _cache[path] = layer
+    return layer
+
+
+def boundaries_geojson(
+        path: str,
+        states: Optional[Sequence[str]] = None,
+        bbox: Optional[Sequence[float]] = None,
+        simplify: float = 0.0,
+) -> str:
+    """GeoJSON FeatureCollection (EPSG:4326) of the requested states or of those in ``bbox``."""
+    layer = get_boundaries(path)
+    if bbox:
+        frame = layer.intersecting(bbox, crs="EPSG:4326")
+    else:
+        frame = layer.frame("EPSG:4326")
+    if states:
+        wanted = {normalize_state_name(s) for s in states}
+        frame = frame[frame[_NAME_COLUMN].isin(wanted)]
+    frame = frame[[NAME_FIELD, "geometry"]]
+    if simplify > 0:
+        frame = frame.copy()
+        frame["geometry"] = frame.geometry.simplify(simplify, preserve_topology=True)
+    return frame.to_json()
@@ -1,12 +1,36 @@
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List
+from typing import Dict, List
 
 from django.conf import settings
 
 from core.utils.app_settings import get_input_root, get_output_root
 
 
+OUTPUT_MASKS = "masks"
+OUTPUT_CLASS_INDEX = "class_index"
+OUTPUT_FORMATS = (OUTPUT_MASKS, OUTPUT_CLASS_INDEX)
+
+# Class-index tiles live beside the per-crop mask folders of a state.
+CLASS_INDEX_DIR = "classes"
+CLASS_TABLE_METADATA_KEY = "CROP_CLASSES"
+
+
+def format_class_table(classes: Dict[int, str]) -> str:
+    """Encode ``{class_id: crop}`` as the ``1=Corn,2=Soybean`` raster metadata value."""
+    return ",".join(f"{class_id}={name}" for class_id, name in sorted(classes.items()))
+
+
+def parse_class_table(value: str) -> Dict[str, int]:
+    """Decode a class table metadata value into ``{crop: class_id}``."""
+    table = {}
+    for item in (value or "").split(","):
+        class_id, sep, name = item.partition("=")
+        if sep and class_id.strip().isdigit():
+            table[name.strip()] = int(class_id)
+    return table
+
+
 @dataclass
 class PipelineInput:
     year_suffix: str
@@ -1,19 +1,21 @@
-import math
 import os
 os.environ['KMP_DUPLICATE_LIB_OK'] = 'TRUE'
 import time
 from datetime import datetime
 from dataclasses import dataclass, replace
 from multiprocessing import current_process
-from typing import Iterable, List, Tuple
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
 import numpy as np
 import torch
 import torch.multiprocessing as mp
+from django.conf import settings
 from osgeo import gdal
 from tqdm import tqdm
 
 from core.utils.redis_client import (
+    ProgressReporter,
     add_step_total,
     increment_progress,
     increment_step_progress,
@@ -27,6 +29,45 @@ from core.utils.log_files import (
     csv_path,
     format_elapsed_hms,
     format_error_with_trace,
+    record_outputs,
+)
+from pipeline.services.accumulator import (
+    ACCUMULATE_MODES,
+    ACCUMULATE_STREAM,
+    ACCUMULATOR_PRECISIONS,
+    BLEND_MODES,
+    RowBandAccumulator,
+    RowSink,
+)
+from pipeline.services.common import (
+    CLASS_INDEX_DIR,
+    CLASS_TABLE_METADATA_KEY,
+    OUTPUT_CLASS_INDEX,
+    OUTPUT_FORMATS,
+    format_class_table,
+)
+from pipeline.services.prefetch import BatchPrefetcher, to_device_overlapped
+from pipeline.services.runtime import (
+    AUTOCAST_MODES,
+    AUTOCAST_OFF,
+    PARITY_TOLERANCE,
+    PARITY_TOLERANCE_AUTOCAST,
+    RUNTIME_EAGER,
+    RUNTIME_ONNX,
+    RUNTIMES,
+    ParityReport,
+    build_model_runner,
+    check_parity,
+    effective_autocast,
+)
+from pipeline.services.tile_reader import (
+    NORMALIZE_MODES,
+    NORMALIZE_STATE,
+    NORMALIZE_TILE,
+    BandStats,
+    TileWindowReader,
+    compute_tile_band_stats,
+    load_or_compute_state_stats,
 )
 
 torch.multiprocessing.set_start_method('spawn')
@@ -98,6 +139,17 @@ class InferenceConfig:
     step: int = 112
     batch_size: int = 64
     band_indices: Tuple[int, ...] = (0, 1, 2, 3, 4)
+    read_strip_rows: int = 1024
+    normalize_mode: str = "window"
+    stats_approx: bool = False
+    accumulate_mode: str = "stream"
+    accum_precision: str = "float32"
+    blend_mode: str = "uniform"
+    prefetch_batches: int = 2
+    runtime: str = "eager"
+    autocast: str = "off"
+    parity_check: bool = True
+    output_format: str = "masks"
     device: torch.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
 
@@ -147,34 +199,6 @@ def read_image_lazy(path: str) -> gdal.Dataset:
     return ds
 
 
-def clip_normalize_to_uint16(data: np.ndarray) -> np.ndarray:
-    lower, upper = np.percentile(data, 2.0), np.percentile(data, 98.0)
-    denom = upper - lower or 1e-6
-    data = np.clip((data - lower) / denom, 0, 1)
-    return (data * 65535).astype(np.uint16)
-
-
-def get_patch(
-        ds: gdal.Dataset, band_indices: Tuple[int, ...], x: int, y: int, h: int, w: int
-) -> np.ndarray:
-    img_h, img_w = ds.RasterYSize, ds.RasterXSize
-    num_bands = len(band_indices)
-    x_valid, y_valid = max(0, x), max(0, y)
-    x_end, y_end = min(x + h, img_h), min(y + w, img_w)
-    read_h, read_w = x_end - x_valid, y_end - y_valid
-    patch = np.zeros((num_bands, h, w), dtype=np.uint16)
-    if read_h <= 0 or read_w <= 0:
-        return patch
-    for i, b in enumerate(band_indices):
-        band = ds.GetRasterBand(b + 1)
-        arr = band.ReadAsArray(y_valid, x_valid, read_w, read_h)
-        if arr is not None:
-            arr = clip_normalize_to_uint16(arr)
-            p_x, p_y = x_valid - x, y_valid - y
-            patch[i, p_x: p_x + read_h, p_y: p_y + read_w] = arr
-    return patch
-
-
 def sliding_window_coords(height: int, width: int, step: int, window_size: Tuple[int, int]):
     win_h, win_w = window_size
     if height <= win_h:
@@ -194,7 +218,17 @@ def sliding_window_coords(height: int, width: int, step: int, window_size: Tuple
             yield x, y, win_h, win_w
 
 
-def write_geotiff(path: str, data: np.ndarray, ref_ds: gdal.Dataset):
+MASK_CREATION_OPTIONS = ["COMPRESS=DEFLATE"]
+CLASS_INDEX_CREATION_OPTIONS = [
+    "TILED=YES",
+    "BLOCKXSIZE=512",
+    "BLOCKYSIZE=512",
+    "COMPRESS=DEFLATE",
+    "PREDICTOR=2",
+]
+
+
+def _create_byte_raster(path: str, ref_ds: gdal.Dataset, options: List[str]) -> gdal.Dataset:
     os.makedirs(os.path.dirname(path), exist_ok=True)
     driver = gdal.GetDriverByName("GTiff")
     out = driver.Create(
@@ -203,10 +237,33 @@ def write_geotiff(path: str, data: np.ndarray, ref_ds: gdal.Dataset):
         ref_ds.RasterYSize,
         1,
         gdal.GDT_Byte,
-        options=["COMPRESS=DEFLATE"],
+        options=options,
     )
     out.SetGeoTransform(ref_ds.GetGeoTransform())
     out.SetProjection(ref_ds.GetProjection())
+    return out
+
+
+def _tag_class_table(out: gdal.Dataset, class_names: Dict[int, str]) -> None:
+    """Record which label value belongs to which crop on a class-index raster."""
+    out.SetMetadataItem(CLASS_TABLE_METADATA_KEY, format_class_table(class_names))
+    names = [""] * (max(class_names, default=0) + 1)
+    names[0] = "Background"
+    for class_id, name in class_names.items():
+        names[class_id] = name
+    out.GetRasterBand(1).SetCategoryNames(names)
+
+
+def write_geotiff(
+        path: str,
+        data: np.ndarray,
+        ref_ds: gdal.Dataset,
+        options: List[str] | None = None,
+        class_names: Dict[int, str] | None = None,
+):
+    out = _create_byte_raster(path, ref_ds, options or MASK_CREATION_OPTIONS)
+    if class_names:
+        _tag_class_table(out, class_names)
     band = out.GetRasterBand(1)
     band.WriteArray(data)
     band.SetNoDataValue(99)
@@ -214,6 +271,62 @@ def write_geotiff(path: str, data: np.ndarray, ref_ds: gdal.Dataset):
     del out
 
 
+class MaskRowWriter:
+    """Write finalized label rows straight into one DEFLATE mask GeoTIFF per crop.
+
+    Each mask is created under a ``.partial`` name and renamed on ``close`` so an
+    interrupted tile never leaves a file that ``skip_exists`` would accept.
+    """
+
+    def __init__(self, paths_by_class: Dict[int, str], ref_ds: gdal.Dataset):
+        self._outputs = []
+        for class_id, path in paths_by_class.items():
+            tmp_path = f"{path}.partial"
+            out = _create_byte_raster(tmp_path, ref_ds, MASK_CREATION_OPTIONS)
+            self._outputs.append((class_id, path, tmp_path, out))
+
+    def __call__(self, row_start: int, labels: np.ndarray) -> None:
+        for class_id, _, _, out in self._outputs:
+            out.GetRasterBand(1).WriteArray((labels == class_id).astype(np.uint8), 0, row_start)
+
+    def close(self) -> None:
+        """Flush every mask and move it to its final path."""
+        while self._outputs:
+            _, path, tmp_path, out = self._outputs.pop()
+            band = out.GetRasterBand(1)
+            band.SetNoDataValue(99)
+            band.FlushCache()
+            band = None
+            out = None
+            os.replace(tmp_path, path)
+
+    def abort(self) -> None:
+        """Discard partially written masks."""
+        while self._outputs:
+            _, _, tmp_path, out = self._outputs.pop()
+            out = None
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+class ClassIndexRowWriter(MaskRowWriter):
+    """Write finalized label rows into a single tiled class-index GeoTIFF.
+
+    One raster holds every crop (0 = background, ``class_id`` per crop), so the
+    tile is compressed once instead of once per crop; per-crop masks are
+    derived from it at merge time using the class table stored in its metadata.
+    """
+
+    def __init__(self, path: str, ref_ds: gdal.Dataset, class_names: Dict[int, str]):
+        tmp_path = f"{path}.partial"
+        out = _create_byte_raster(tmp_path, ref_ds, CLASS_INDEX_CREATION_OPTIONS)
+        _tag_class_table(out, class_names)
+        self._outputs = [(None, path, tmp_path, out)]
+
+    def __call__(self, row_start: int, labels: np.ndarray) -> None:
+        self._outputs[0][3].GetRasterBand(1).WriteArray(labels, 0, row_start)
+
+
 class TileInferenceEngine:
     def __init__(self, cfg: InferenceConfig, weight_path: str):
         self.cfg = cfg
@@ -228,259 +341,443 @@ class TileInferenceEngine:
         ).to(self.device)
         self.net.load_state_dict(torch.load(weight_path, map_location=self.device, weights_only=True))
         self.net.eval()
+        self.runtime = cfg.runtime
+        self.autocast = effective_autocast(cfg.autocast, self.device)
+        self.parity: ParityReport | None = None
+        self.runner = self._build_runner(weight_path)
+
+    def _build_runner(self, weight_path: str):
+        """Build the configured runtime, falling back to eager fp32 when parity fails."""
+        cfg = self.cfg
+        input_shape = (cfg.in_channels, *cfg.window_size)
+        autocast = self.autocast
+        runner = build_model_runner(
+            self.net, self.device, cfg.runtime, autocast, weight_path, input_shape, cfg.num_class
+        )
+        if (cfg.runtime, autocast) == (RUNTIME_EAGER, AUTOCAST_OFF) or not cfg.parity_check:
+            return runner
+        reduced = autocast != AUTOCAST_OFF and cfg.runtime != RUNTIME_ONNX
+        self.parity = check_parity(
+            self.net,
+            runner,
+            input_shape,
+            self.device,
+            PARITY_TOLERANCE_AUTOCAST if reduced else PARITY_TOLERANCE,
+        )
+        if self.parity.passed:
+            return runner
+        self.runtime = RUNTIME_EAGER
+        return build_model_runner(
+            self.net, self.device, RUNTIME_EAGER, AUTOCAST_OFF, weight_path, input_shape, cfg.num_class
+        )
+
+    def describe_runtime(self) -> str:
+        cfg = self.cfg
+        text = f"Runtime {cfg.runtime} (autocast {self.autocast}) on {self.device}"
+        if self.autocast != cfg.autocast:
+            text += f"; autocast {cfg.autocast} not usable for this model on {self.device.type}, running fp32"
+        if self.parity is not None:
+            verdict = "ok" if self.parity.passed else f"failed, using {self.runtime}"
+            text += f"; parity {verdict}: {self.parity.describe()}"
+        return text
+
+    def band_stats_for(self, ds: gdal.Dataset, state_stats: BandStats | None) -> BandStats | None:
+        """Return the stretch bounds for ``ds`` under the configured normalize mode."""
+        if self.cfg.normalize_mode == NORMALIZE_TILE:
+            return compute_tile_band_stats(ds, self.cfg.band_indices, approx=self.cfg.stats_approx)
+        if self.cfg.normalize_mode == NORMALIZE_STATE:
+            return state_stats
+        return None
 
     @torch.no_grad()
-    def predict(self, ds: gdal.Dataset, desc: str, job_id: int | None = None) -> np.ndarray:
+    def predict(
+            self,
+            ds: gdal.Dataset,
+            desc: str,
+            job_id: int | None = None,
+            band_stats: BandStats | None = None,
+            sink: RowSink | None = None,
+    ) -> np.ndarray | None:
+        """Predict class labels for a tile.
+
+        Returns the ``(H, W)`` label array, or ``None`` when ``sink`` is given,
+        in which case finalized rows are passed to ``sink(row_start, labels)``.
+        """
         h, w = ds.RasterYSize, ds.RasterXSize
-        pred_accum = np.zeros((h, w, self.cfg.num_class), dtype=np.float32)
+        streaming = self.cfg.accumulate_mode == ACCUMULATE_STREAM
+        accumulator = RowBandAccumulator(
+            h,
+            w,
+            self.cfg.num_class,
+            band_rows=self.cfg.window_size[0] if streaming else None,
+            precision=self.cfg.accum_precision,
+            sink=sink,
+            blend_mode=self.cfg.blend_mode,
+        )
         coords = list(sliding_window_coords(h, w, self.cfg.step, self.cfg.window_size))
         if job_id:
             add_step_total(job_id, "inference_windows", len(coords))
         batch_size = self.cfg.batch_size
         chunks = [coords[i: i + batch_size] for i in range(0, len(coords), batch_size)]
-        for batch in tqdm(chunks, desc=desc, leave=False):
-            if job_id and is_cancelled(job_id):
-                raise RuntimeError("Cancelled")
-            patches = [get_patch(ds, self.cfg.band_indices, x, y, hh, ww) for x, y, hh, ww in batch]
-            x_tensor = torch.from_numpy(np.array(patches)).float().to(self.device)
-            logits, _ = self.net(x_tensor)
-            probs = torch.nn.functional.softmax(logits, dim=1).cpu().numpy()
-            for prob, (x, y, hh, ww) in zip(probs, batch):
-                x_end, y_end = min(x + hh, h), min(y + ww, w)
-                valid_h, valid_w = x_end - max(0, x), y_end - max(0, y)
-                p_x, p_y = max(0, x) - x, max(0, y) - y
-                i_x, i_y = max(0, x), max(0, y)
-                if valid_h > 0 and valid_w > 0:
-                    data = prob[:, p_x: p_x + valid_h, p_y: p_y + valid_w].transpose(1, 2, 0)
-                    pred_accum[i_x: i_x + valid_h, i_y: i_y + valid_w] += data
-            if job_id:
-                increment_step_progress(
-                    job_id,
-                    "inference_windows",
-                    increment=len(batch),
-                    message=f"Windows {desc}",
-                )
-        return np.argmax(pred_accum, axis=-1).astype(np.uint8)
-
-
-def _count_tiff_files(state_paths: Iterable[str]) -> int:
-    total = 0
+        reader = TileWindowReader(
+            ds,
+            self.cfg.band_indices,
+            strip_rows=self.cfg.read_strip_rows,
+            stats=self.band_stats_for(ds, band_stats),
+        )
+        prefetcher = BatchPrefetcher(
+            reader,
+            chunks,
+            depth=self.cfg.prefetch_batches,
+            pin_memory=self.device.type == "cuda",
+        )
+        reporter = ProgressReporter(job_id) if job_id else None
+        try:
+            batches = to_device_overlapped(iter(prefetcher), self.device)
+            for batch, x_tensor in tqdm(batches, total=len(chunks), desc=desc, leave=False):
+                if reporter and reporter.is_cancelled():
+                    raise RuntimeError("Cancelled")
+                logits = self.runner(x_tensor)
+                probs = torch.nn.functional.softmax(logits, dim=1).cpu().numpy()
+                accumulator.add_batch(probs, batch)
+                if reporter:
+                    reporter.increment("inference_windows", len(batch), message=f"Windows {desc}")
+        finally:
+            if reporter:
+                reporter.close()
+            prefetcher.close()
+            reader.close()
+        return accumulator.finish()
+
+
+def _tile_output_paths(
+        output_root: str, args, state_name: str, schema: CropSchema, fname: str
+) -> Dict[int, str]:
+    """Map each crop class id to the mask path of tile ``fname``."""
+    paths = {}
+    for crop in schema.crops:
+        save_dir = os.path.join(
+            output_root,
+            "inference_tiles",
+            args["year_suffix"],
+            args["country"],
+            state_name,
+            schema.crop_display_name(crop),
+        )
+        paths[schema.crop_to_class[crop]] = os.path.join(save_dir, fname)
+    return paths
+
+
+def _tile_class_index_path(output_root: str, args, state_name: str, fname: str) -> str:
+    return os.path.join(
+        output_root,
+        "inference_tiles",
+        args["year_suffix"],
+        args["country"],
+        state_name,
+        CLASS_INDEX_DIR,
+        fname,
+    )
+
+
+def _class_names(schema: CropSchema) -> Dict[int, str]:
+    return {schema.crop_to_class[crop]: schema.crop_display_name(crop) for crop in schema.crops}
+
+
+def _predict_tile_to_class_index(
+        engine: TileInferenceEngine,
+        ds: gdal.Dataset,
+        path: str,
+        schema: CropSchema,
+        desc: str,
+        job_id: int,
+        band_stats: BandStats | None,
+) -> List[str]:
+    """Run inference on one tile and write a single class-index raster."""
+    class_names = _class_names(schema)
+    if engine.cfg.accumulate_mode == ACCUMULATE_STREAM:
+        writer = ClassIndexRowWriter(path, ds, class_names)
+        try:
+            engine.predict(ds, desc=desc, job_id=job_id, band_stats=band_stats, sink=writer)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
+    else:
+        pred = engine.predict(ds, desc=desc, job_id=job_id, band_stats=band_stats)
+        write_geotiff(path, pred, ds, options=CLASS_INDEX_CREATION_OPTIONS, class_names=class_names)
+    return [path]
+
+
+def _predict_tile_to_masks(
+        engine: TileInferenceEngine,
+        ds: gdal.Dataset,
+        paths_by_class: Dict[int, str],
+        desc: str,
+        job_id: int,
+        band_stats: BandStats | None,
+) -> List[str]:
+    """Run inference on one tile and write a binary mask per crop."""
+    if engine.cfg.accumulate_mode == ACCUMULATE_STREAM:
+        writer = MaskRowWriter(paths_by_class, ds)
+        try:
+            engine.predict(ds, desc=desc, job_id=job_id, band_stats=band_stats, sink=writer)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
+    else:
+        pred = engine.predict(ds, desc=desc, job_id=job_id, band_stats=band_stats)
+        for class_id, save_path in paths_by_class.items():
+            write_geotiff(save_path, (pred == class_id).astype(np.uint8), ds)
+    return list(paths_by_class.values())
+
+
+@dataclass(frozen=True)
+class TileTask:
+    state_name: str
+    path: str
+    size: int
+
+
+def _list_state_tiles(state_path: str) -> List[str]:
+    return sorted(
+        [
+            os.path.join(state_path, f)
+            for f in os.listdir(state_path)
+            if f.lower().endswith((".tif", ".tiff"))
+        ]
+    )
+
+
+def build_tile_queue(state_paths: Iterable[str], by_state: bool = False) -> List[TileTask]:
+    """Collect the tiles of every state into one queue, largest file first.
+
+    Handing out the biggest tiles first keeps a late large tile from leaving
+    one device busy while the others sit idle at the end of the job. With
+    ``by_state`` the states keep their order and only the tiles within a state
+    are sorted, so each state finishes as early as possible.
+    """
+    state_paths = list(state_paths)
+    order = {os.path.basename(state_path): index for index, state_path in enumerate(state_paths)}
+    tasks = [
+        TileTask(os.path.basename(state_path), path, os.path.getsize(path))
+        for state_path in state_paths
+        for path in _list_state_tiles(state_path)
+    ]
+    if by_state:
+        tasks.sort(key=lambda task: (order[task.state_name], -task.size, task.path))
+    else:
+        tasks.sort(key=lambda task: (-task.size, task.state_name, task.path))
+    return tasks
+
+
+def _state_band_stats(
+        state_paths: Iterable[str], output_root: str, args, cfg: InferenceConfig, job_id: int
+) -> Dict[str, BandStats | None]:
+    """Return the per-state stretch bounds when normalizing per state."""
+    stats: Dict[str, BandStats | None] = {}
+    if cfg.normalize_mode != NORMALIZE_STATE:
+        return stats
     for state_path in state_paths:
-        total += len(
-            [
-                f
-                for f in os.listdir(state_path)
-                if f.lower().endswith((".tif", ".tiff"))
-            ]
+        state_name = os.path.basename(state_path)
+        input_files = _list_state_tiles(state_path)
+        if not input_files:
+            continue
+        cache_path = os.path.join(
+            output_root, "band_stats", args["year_suffix"], args["country"], f"{state_name}.json"
+        )
+        stats[state_name] = load_or_compute_state_stats(
+            input_files, cfg.band_indices, cache_path, approx=cfg.stats_approx
         )
-    return total
+        append_log(job_id, f"Band stats {state_name}: {stats[state_name].to_dict()}")
+    return stats
+
+
+def _run_tile_task(
+        engine: TileInferenceEngine,
+        task: TileTask,
+        output_root: str,
+        args,
+        schema: CropSchema,
+        job_id: int,
+        state_stats: Dict[str, BandStats | None],
+        desc_prefix: str = "",
+) -> bool:
+    """Run one tile; returns whether its outputs exist (written or skipped)."""
+    state_name = task.state_name
+    fname = os.path.basename(task.path)
+    class_index = engine.cfg.output_format == OUTPUT_CLASS_INDEX
+    if class_index:
+        expected = [_tile_class_index_path(output_root, args, state_name, fname)]
+    else:
+        paths_by_class = _tile_output_paths(output_root, args, state_name, schema, fname)
+        expected = list(paths_by_class.values())
+    if args["skip_exists"] and all(os.path.exists(p) for p in expected):
+        increment_progress(job_id, increment=1, message=f"Skipping {state_name}")
+        increment_step_progress(
+            job_id, "inference", increment=1, message=f"Skipping {state_name}"
+        )
+        _log_inference_tile(job_id, state_name, fname, task.path, [], 0.0, "skipped")
+        record_outputs(job_id, "inference_tiles", expected)
+        return True
+    try:
+        started = time.perf_counter()
+        ds = read_image_lazy(task.path)
+        if class_index:
+            output_paths = _predict_tile_to_class_index(
+                engine,
+                ds,
+                expected[0],
+                schema,
+                desc=f"{desc_prefix}{fname}",
+                job_id=job_id,
+                band_stats=state_stats.get(state_name),
+            )
+        else:
+            output_paths = _predict_tile_to_masks(
+                engine,
+                ds,
+                paths_by_class,
+                desc=f"{desc_prefix}{fname}",
+                job_id=job_id,
+                band_stats=state_stats.get(state_name),
+            )
+        del ds
+        elapsed = time.perf_counter() - started
+        _log_inference_tile(job_id, state_name, fname, task.path, output_paths, elapsed, "ok")
+        record_outputs(job_id, "inference_tiles", output_paths)
+        return True
+    except Exception as exc:
+        if is_cancelled(job_id):
+            return False
+        append_log(job_id, format_error_with_trace(f"inference {state_name}/{fname}", exc))
+        raise
+    increment_progress(job_id, increment=1, message=f"Processing {state_name}")
+    increment_step_progress(
+        job_id, "inference", increment=1, message=f"Processing {state_name}"
+    )
+
+
+def _claim_next(tasks: List[TileTask], cursor) -> TileTask | None:
+    """Take the next unclaimed task from the shared ``cursor``."""
+    with cursor.get_lock():
+        index = cursor.value
+        if index >= len(tasks):
+            return None
+        cursor.value = index + 1
+    return tasks[index]
 
 
 def run_worker_process(
     rank: int,
-    num_gpus: int,
-    all_files: List[str],
+    tasks: List[TileTask],
+    cursor,
     args,
-    base_cfg: InferenceConfig,
-    schema: CropSchema,
+    base_cfg,
+    schema,
     output_root: str,
-    state_name: str,
     job_id: int,
+    state_stats: Dict[str, BandStats | None],
+    device_ids: List[int],
+    done_queue=None,
 ):
-    total_files = len(all_files)
-    chunk_size = math.ceil(total_files / num_gpus)
-    start_idx = rank * chunk_size
-    end_idx = min(start_idx + chunk_size, total_files)
-    my_files = all_files[start_idx:end_idx]
-    if not my_files:
-        return
-    gpu_id = rank
+    """Load the model once on GPU ``device_ids[rank]`` and pull tiles until the queue is empty.
+
+    Finished tiles are reported to the parent through ``done_queue`` by state name.
+    """
+    gpu_id = device_ids[rank]
     device = torch.device(f"cuda:{gpu_id}")
     local_cfg = replace(base_cfg, device=device)
     try:
         engine = TileInferenceEngine(local_cfg, args["weights"])
     except Exception:
         return
-    for in_fp in tqdm(
-        my_files,
-        desc=f"Inference {state_name} GPU {gpu_id}",
-        unit="tile",
-        leave=False,
-    ):
-        if is_cancelled(job_id):
-            return
-        fname = os.path.basename(in_fp)
-        if args["skip_exists"]:
-            all_outputs_exist = True
-            for crop in schema.crops:
-                save_dir = os.path.join(
-                    output_root,
-                    "inference_tiles",
-                    args["year_suffix"],
-                    args["country"],
-                    state_name,
-                    schema.crop_display_name(crop),
-                )
-                if not os.path.exists(os.path.join(save_dir, fname)):
-                    all_outputs_exist = False
-                    break
-            if all_outputs_exist:
-                increment_progress(job_id, increment=1, message=f"Skipping {state_name}")
-                increment_step_progress(
-                    job_id, "inference", increment=1, message=f"Skipping {state_name}"
-                )
-                _log_inference_tile(
-                    job_id,
-                    state_name,
-                    fname,
-                    in_fp,
-                    [],
-                    0.0,
-                    "skipped",
-                )
-                continue
-        try:
-            started = time.perf_counter()
-            ds = read_image_lazy(in_fp)
-            pred = engine.predict(ds, desc=f"[GPU {gpu_id}] {fname}", job_id=job_id)
-            output_paths = []
-            for crop in schema.crops:
-                class_id = schema.crop_to_class[crop]
-                mask = (pred == class_id).astype(np.uint8)
-                save_dir = os.path.join(
-                    output_root,
-                    "inference_tiles",
-                    args["year_suffix"],
-                    args["country"],
-                    state_name,
-                    schema.crop_display_name(crop),
-                )
-                save_path = os.path.join(save_dir, fname)
-                write_geotiff(save_path, mask, ds)
-                output_paths.append(save_path)
-            del ds
-            elapsed = time.perf_counter() - started
-            _log_inference_tile(
-                job_id,
-                state_name,
-                fname,
-                in_fp,
-                output_paths,
-                elapsed,
-                "ok",
-            )
-        except Exception as exc:
-            if is_cancelled(job_id):
-                return
-            append_log(job_id, format_error_with_trace(f"inference {state_name}/{fname}", exc))
-            raise
-        increment_progress(job_id, increment=1, message=f"Processing {state_name}")
-        increment_step_progress(
-            job_id, "inference", increment=1, message=f"Processing {state_name}"
+    append_log(job_id, f"[GPU {gpu_id}] {engine.describe_runtime()}")
+    progress = tqdm(desc=f"Inference GPU {gpu_id}", unit="tile", leave=False)
+    while not is_cancelled(job_id):
+        task = _claim_next(tasks, cursor)
+        if task is None:
+            break
+        finished = _run_tile_task(
+            engine, task, output_root, args, schema, job_id, state_stats, f"[GPU {gpu_id}] "
         )
+        if finished and done_queue is not None:
+            done_queue.put(task.state_name)
+        progress.update(1)
+    progress.close()
 
 
-def run_state_inference(
-    state_path: str,
+def run_tile_queue(
+    tasks: List[TileTask],
     output_root: str,
     args,
     cfg,
     schema,
     job_id: int,
+    state_stats: Dict[str, BandStats | None],
     desired_gpus: int = 0,
+    device_ids: Optional[List[int]] = None,
+    on_state_done: Optional[Callable[[str], None]] = None,
 ):
-    state_name = os.path.basename(state_path)
-    input_files = sorted(
-        [
-            os.path.join(state_path, f)
-            for f in os.listdir(state_path)
-            if f.lower().endswith((".tif", ".tiff"))
-        ]
-    )
-    if not input_files:
+    """Run every tile of the job through a pool of per-device workers.
+
+    With several GPUs, one process per device loads the model once and claims
+    tiles from a shared cursor over ``tasks``, so a device that finishes early
+    keeps taking work instead of waiting on a fixed slice. ``on_state_done``
+    is called in this process once the last tile of a state has finished.
+    """
+    if not tasks:
         return
-    num_gpus = desired_gpus
-    if num_gpus > 1 and not current_process().daemon:
-        mp.spawn(
+    remaining = Counter(task.state_name for task in tasks)
+
+    def _tile_done(state_name: str) -> None:
+        remaining[state_name] -= 1
+        if remaining[state_name] == 0 and on_state_done is not None:
+            on_state_done(state_name)
+
+    if desired_gpus > 1 and not current_process().daemon:
+        ctx = mp.get_context("spawn")
+        cursor = ctx.Value("i", 0)
+        done_queue = ctx.SimpleQueue() if on_state_done is not None else None
+        workers = mp.spawn(
             run_worker_process,
-            nprocs=num_gpus,
-            args=(num_gpus, input_files, args, cfg, schema, output_root, state_name, job_id),
-            join=True,
+            nprocs=desired_gpus,
+            args=(
+                tasks,
+                cursor,
+                args,
+                cfg,
+                schema,
+                output_root,
+                job_id,
+                state_stats,
+                device_ids or list(range(desired_gpus)),
+                done_queue,
+            ),
+            join=False,
         )
-    else:
-        engine = TileInferenceEngine(cfg, args["weights"])
-        for in_fp in tqdm(input_files, desc=f"Inference {state_name}", unit="tile"):
-            if is_cancelled(job_id):
+        while True:
+            joined = workers.join(timeout=1)
+            while done_queue is not None and not done_queue.empty():
+                _tile_done(done_queue.get())
+            if joined:
                 return
-            fname = os.path.basename(in_fp)
-            if args["skip_exists"]:
-                all_outputs_exist = True
-                for crop in schema.crops:
-                    save_dir = os.path.join(
-                        output_root,
-                        "inference_tiles",
-                        args["year_suffix"],
-                        args["country"],
-                        state_name,
-                        schema.crop_display_name(crop),
-                    )
-                    if not os.path.exists(os.path.join(save_dir, fname)):
-                        all_outputs_exist = False
-                        break
-                if all_outputs_exist:
-                    increment_progress(job_id, increment=1, message=f"Skipping {state_name}")
-                    increment_step_progress(
-                        job_id, "inference", increment=1, message=f"Skipping {state_name}"
-                    )
-                    _log_inference_tile(
-                        job_id,
-                        state_name,
-                        fname,
-                        in_fp,
-                        [],
-                        0.0,
-                        "skipped",
-                    )
-                    continue
-            try:
-                started = time.perf_counter()
-                ds = read_image_lazy(in_fp)
-                pred = engine.predict(ds, desc=f"{fname}", job_id=job_id)
-                output_paths = []
-                for crop in schema.crops:
-                    class_id = schema.crop_to_class[crop]
-                    mask = (pred == class_id).astype(np.uint8)
-                    save_dir = os.path.join(
-                        output_root,
-                        "inference_tiles",
-                        args["year_suffix"],
-                        args["country"],
-                        state_name,
-                        schema.crop_display_name(crop),
-                    )
-                    save_path = os.path.join(save_dir, fname)
-                    write_geotiff(save_path, mask, ds)
-                    output_paths.append(save_path)
-                del ds
-                elapsed = time.perf_counter() - started
-                _log_inference_tile(
-                    job_id,
-                    state_name,
-                    fname,
-                    in_fp,
-                    output_paths,
-                    elapsed,
-                    "ok",
-                )
-            except Exception as exc:
-                if is_cancelled(job_id):
-                    return
-                append_log(job_id, format_error_with_trace(f"inference {state_name}/{fname}", exc))
-                raise
-            increment_progress(job_id, increment=1, message=f"Processing {state_name}")
-            increment_step_progress(
-                job_id, "inference", increment=1, message=f"Processing {state_name}"
-            )
+    engine = TileInferenceEngine(cfg, args["weights"])
+    append_log(job_id, engine.describe_runtime())
+    for task in tqdm(tasks, desc="Inference", unit="tile"):
+        if is_cancelled(job_id):
+            return
+        if _run_tile_task(engine, task, output_root, args, schema, job_id, state_stats):
+            _tile_done(task.state_name)
+
+
+def _choice_setting(name: str, default: str, choices: Tuple[str, ...]) -> str:
+    """Read a string setting and reject values outside ``choices``."""
+    value = getattr(settings, name, default)
+    if value not in choices:
+        raise ValueError(f"{name} must be one of {', '.join(choices)}; got {value!r}.")
+    return value
 
 
 def run_inference(
@@ -495,13 +792,35 @@ def run_inference(
     job_id: int,
     gpu_count: int = 0,
     skip_exists: bool = False,
+    gpu_ids: Optional[List[int]] = None,
+    on_state_done: Optional[Callable[[str], None]] = None,
 ) -> None:
+    """Run the job's tiles of ``states`` through the model.
+
+    All states share one tile queue and one model load per device. With
+    ``on_state_done`` the queue is ordered state by state and the callback
+    runs as each state's last tile finishes, so later steps can start early.
+    """
     try:
         mp.set_start_method("spawn", force=True)
     except RuntimeError:
         pass
     schema = CropSchema.parse(crops)
-    cfg = InferenceConfig(num_class=schema.num_class, batch_size=batch_size)
+    cfg = InferenceConfig(
+        num_class=schema.num_class,
+        batch_size=batch_size,
+        read_strip_rows=getattr(settings, "INFERENCE_READ_STRIP_ROWS", 1024),
+        normalize_mode=_choice_setting("INFERENCE_NORMALIZE_MODE", "window", NORMALIZE_MODES),
+        stats_approx=getattr(settings, "INFERENCE_STATS_APPROX", False),
+        accumulate_mode=_choice_setting("INFERENCE_ACCUMULATE_MODE", "stream", ACCUMULATE_MODES),
+        accum_precision=_choice_setting("INFERENCE_ACCUM_PRECISION", "float32", ACCUMULATOR_PRECISIONS),
+        blend_mode=_choice_setting("INFERENCE_BLEND_MODE", "uniform", BLEND_MODES),
+        prefetch_batches=getattr(settings, "INFERENCE_PREFETCH_BATCHES", 2),
+        runtime=_choice_setting("INFERENCE_RUNTIME", "eager", RUNTIMES),
+        autocast=_choice_setting("INFERENCE_AUTOCAST", "off", AUTOCAST_MODES),
+        parity_check=getattr(settings, "INFERENCE_PARITY_CHECK", True),
+        output_format=_choice_setting("INFERENCE_OUTPUT_FORMAT", "masks", OUTPUT_FORMATS),
+    )
     base_input_dir = os.path.join(input_root, country, year_suffix)
     all_states_paths = sorted(
         [
@@ -518,7 +837,8 @@ def run_inference(
                 break
     if not target_states:
         return
-    total_tiles = _count_tiff_files(target_states)
+    tasks = build_tile_queue(target_states, by_state=on_state_done is not None)
+    total_tiles = len(tasks)
     set_progress(job_id, 0, total_tiles, "Starting inference")
     set_step_progress(job_id, "inference", 0, total_tiles, "Starting inference")
     set_step_progress(job_id, "inference_windows", 0, 0, "Starting windows")
@@ -541,10 +861,17 @@ def run_inference(
             desired_gpus = min(gpu_count, available_gpus)
         else:
             desired_gpus = 0
+    if gpu_ids is not None:
+        # Devices leased by the scheduler take precedence over the requested count.
+        desired_gpus = len(gpu_ids)
     
     if desired_gpus == 0:
         cfg = replace(cfg, device=torch.device("cpu"))
+    elif gpu_ids:
+        cfg = replace(cfg, device=torch.device(f"cuda:{gpu_ids[0]}"))
 
-    for state_path in tqdm(target_states, desc="Inference States", unit="state"):
-        run_state_inference(state_path, output_root, args, cfg, schema, job_id, desired_gpus)
+    state_stats = _state_band_stats(target_states, output_root, args, cfg, job_id)
+    run_tile_queue(
+        tasks, output_root, args, cfg, schema, job_id, state_stats, desired_gpus, gpu_ids, on_state_done
+    )
     append_log(job_id, "Inference finished")
@@ -1,5 +1,6 @@
 import gc
 import glob
+import math
 import os
 import time
 from datetime import datetime
@@ -11,9 +12,13 @@ from typing import List, Tuple, Iterable
 import rioxarray
 import xarray as xr
 from dask.callbacks import Callback
+from django.conf import settings
+from osgeo import gdal
 from tqdm import tqdm
 
 from core.utils.redis_client import (
+    ProgressReporter,
+    add_progress_total,
     add_step_total,
     increment_progress,
     increment_step_progress,
@@ -21,12 +26,14 @@ from core.utils.redis_client import (
     set_progress,
     set_step_progress,
 )
+from pipeline.services.common import CLASS_INDEX_DIR, CLASS_TABLE_METADATA_KEY, parse_class_table
 from core.utils.log_files import (
     append_csv_row,
     append_log,
     csv_path,
     format_elapsed_hms,
     format_error_message,
+    record_outputs,
 )
 
 try:
@@ -34,6 +41,15 @@ try:
 except ImportError:
     rio_merge_arrays = None
 
+gdal.UseExceptions()
+
+MERGE_ENGINE_RIOXARRAY = "rioxarray"
+MERGE_ENGINE_VRT = "vrt"
+MERGE_ENGINES = (MERGE_ENGINE_RIOXARRAY, MERGE_ENGINE_VRT)
+
+# Internal overview levels are added down to roughly one block.
+OVERVIEW_MIN_SIZE = 256
+
 MERGE_CSV_HEADERS = (
     "timestamp",
     "state",
@@ -54,6 +70,14 @@ class MergeConfig:
     bigtiff: str = "YES"
     nodata_value: float = 99
     skip_if_exists: bool = True
+    # Set when the inputs are class-index tiles: the crop to extract and its
+    # class id to use if a tile carries no class table.
+    derive_crop: str = ""
+    fallback_class_id: int = 0
+    engine: str = MERGE_ENGINE_RIOXARRAY
+    num_threads: str = "ALL_CPUS"
+    block_size: int = 512
+    build_overviews: bool = True
 
 
 def ensure_dir(path: str) -> None:
@@ -61,6 +85,148 @@ def ensure_dir(path: str) -> None:
         os.makedirs(path, exist_ok=True)
 
 
+def derive_crop_mask(da: xr.DataArray, crop: str, fallback_class_id: int) -> xr.DataArray:
+    """Lazily turn a class-index tile into the 0/1 mask of ``crop``, keeping nodata masked."""
+    table = parse_class_table(da.attrs.get(CLASS_TABLE_METADATA_KEY, ""))
+    class_id = table.get(crop, fallback_class_id)
+    mask = xr.where(da.isnull(), da, (da == class_id).astype(da.dtype), keep_attrs=True)
+    mask.attrs.pop(CLASS_TABLE_METADATA_KEY, None)
+    return mask
+
+
+def _class_lut(class_id: int) -> str:
+    """VRT ``<LUT>`` that maps ``class_id`` to 1 and every other label to 0."""
+    points = {0: 0, class_id: 1, class_id + 1: 0}
+    if class_id > 1:
+        points[class_id - 1] = 0
+    return ",".join(f"{value}:{out}" for value, out in sorted(points.items()))
+
+
+def _tile_class_id(tile_path: str, crop: str, fallback_class_id: int) -> int:
+    ds = gdal.Open(tile_path, gdal.GA_ReadOnly)
+    table = parse_class_table(ds.GetMetadataItem(CLASS_TABLE_METADATA_KEY) or "")
+    ds = None
+    return table.get(crop, fallback_class_id)
+
+
+def merge_with_vrt(
+        tiles: List[str],
+        output_path: str,
+        cfg: MergeConfig,
+        reporter: ProgressReporter,
+        job_id: int,
+        state: str,
+        crop: str,
+) -> None:
+    """Mosaic ``tiles`` through a GDAL VRT and translate it into a tiled COG.
+
+    No pixels are held beyond GDAL's block cache: the VRT only references the
+    tiles, and the COG driver compresses output blocks with ``cfg.num_threads``
+    workers, passed per call as a creation option. For class-index tiles the crop mask is
+    derived in the VRT with a ``<LUT>`` on every source. Progress is reported
+    per output block on the ``merge_compute`` step.
+    """
+    vrt_path = f"{output_path}.vrt"
+    tmp_path = f"{output_path}.partial"
+    # rio merge keeps the first of ``tiles`` where they overlap; a VRT keeps the last source,
+    # so the sources are listed in reverse to resolve overlaps as the legacy engine does.
+    vrt = gdal.BuildVRT(
+        vrt_path,
+        list(reversed(tiles)),
+        srcNodata=cfg.nodata_value,
+        VRTNodata=cfg.nodata_value,
+    )
+    width, height = vrt.RasterXSize, vrt.RasterYSize
+    vrt = None
+    reporter.increment("merge_tiles", len(tiles), message=f"Reading {state} {crop}")
+    if cfg.derive_crop:
+        lut = _class_lut(_tile_class_id(sorted(tiles)[0], cfg.derive_crop, cfg.fallback_class_id))
+        with open(vrt_path, "r", encoding="utf-8") as handle:
+            xml = handle.read()
+        xml = xml.replace("</ComplexSource>", f"<LUT>{lut}</LUT></ComplexSource>")
+        with open(vrt_path, "w", encoding="utf-8") as handle:
+            handle.write(xml)
+
+    blocks = math.ceil(width / cfg.block_size) * math.ceil(height / cfg.block_size)
+    add_step_total(job_id, "merge_compute", blocks)
+    reported = 0
+
+    def _progress(complete, _message, _data):
+        nonlocal reported
+        done = min(blocks, int(complete * blocks))
+        if done > reported:
+            reporter.increment("merge_compute", done - reported, message=f"Computing {state} {crop}")
+            reported = done
+        return 0 if reporter.is_cancelled() else 1
+
+    try:
+        gdal.Translate(
+            tmp_path,
+            vrt_path,
+            format="COG",
+            creationOptions=[
+                f"BLOCKSIZE={cfg.block_size}",
+                f"COMPRESS={cfg.compress}",
+                f"BIGTIFF={cfg.bigtiff}",
+                f"NUM_THREADS={cfg.num_threads}",
+                # Masks are categorical: the COG default (cubic) would blend labels and nodata.
+                "RESAMPLING=NEAREST",
+                f"OVERVIEWS={'AUTO' if cfg.build_overviews else 'NONE'}",
+            ],
+            callback=_progress,
+        )
+        os.replace(tmp_path, output_path)
+        if blocks > reported:
+            reporter.increment("merge_compute", blocks - reported)
+    finally:
+        for path in (vrt_path, tmp_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def threads_per_task(num_threads: str, workers: int) -> str:
+    """GDAL ``NUM_THREADS`` for one of ``workers`` concurrent merges, capped at its share of the CPUs."""
+    share = max(1, (os.cpu_count() or 1) // max(1, workers))
+    if str(num_threads).upper() == "ALL_CPUS":
+        return str(share)
+    try:
+        return str(max(1, min(int(num_threads), share)))
+    except ValueError:
+        return str(share)
+
+
+def overview_factors(width: int, height: int, min_size: int = OVERVIEW_MIN_SIZE) -> List[int]:
+    factors = []
+    factor = 2
+    while max(width, height) / factor >= min_size:
+        factors.append(factor)
+        factor *= 2
+    return factors
+
+
+def build_overviews(path: str, compress: str = "DEFLATE") -> int:
+    """Add internal nearest-neighbour overviews to a merged mask that has none; returns the level count.
+
+    Thumbnails and map previews then read a small overview instead of
+    decimating the full-resolution raster.
+    """
+    ds = gdal.Open(path, gdal.GA_Update)
+    try:
+        count = ds.GetRasterBand(1).GetOverviewCount()
+        factors = overview_factors(ds.RasterXSize, ds.RasterYSize)
+        if count or not factors:
+            return count
+        # Per-call option (GDAL >= 3.6): merges build overviews concurrently from one thread pool.
+        ds.BuildOverviews("NEAREST", factors, options=[f"COMPRESS_OVERVIEW={compress}"])
+        return len(factors)
+    finally:
+        ds = None
+
+
+def _has_tiles(input_dir: str, pattern: str) -> bool:
+    return bool(glob.glob(os.path.join(input_dir, pattern)))
+
+
 def merge_task_worker(args):
     state, crop, input_dir, output_path, cfg_dict = args
     job_id = cfg_dict.pop("job_id", 0)
@@ -71,26 +237,30 @@ def merge_task_worker(args):
     if not tiles:
         return (state, crop, False, "No tiles found", 0.0, 0, output_path)
     if cfg.skip_if_exists and os.path.exists(output_path):
+        # Existing outputs are left untouched; thumbnails fall back to a decimated read.
         return (state, crop, True, "Skipped (Exists)", 0.0, os.path.getsize(output_path), output_path)
     started = time.perf_counter()
+    reporter = ProgressReporter(job_id)
     try:
-        datasets = []
         add_step_total(job_id, "merge_tiles", len(tiles))
+        if cfg.engine == MERGE_ENGINE_VRT:
+            ensure_dir(os.path.dirname(output_path))
+            merge_with_vrt(tiles, output_path, cfg, reporter, job_id, state, crop)
+            elapsed = time.perf_counter() - started
+            return (state, crop, True, "Success", elapsed, os.path.getsize(output_path), output_path)
+        datasets = []
         for fp in tiles:
-            if is_cancelled(job_id):
+            if reporter.is_cancelled():
                 return (state, crop, False, "Cancelled")
             ds = rioxarray.open_rasterio(
                 fp,
                 chunks={"x": cfg.dask_chunks[0], "y": cfg.dask_chunks[1]},
                 masked=True,
             )
+            if cfg.derive_crop:
+                ds = derive_crop_mask(ds, cfg.derive_crop, cfg.fallback_class_id)
             datasets.append(ds)
-            increment_step_progress(
-                job_id,
-                "merge_tiles",
-                increment=1,
-                message=f"Reading {state} {crop}",
-            )
+            reporter.increment("merge_tiles", message=f"Reading {state} {crop}")
         if rio_merge_arrays:
             merged = rio_merge_arrays(datasets)
         else:
@@ -115,16 +285,11 @@ def merge_task_worker(args):
 
             class _Callback(Callback):
                 def _pretask(self, key, dsk, state):
-                    if is_cancelled(job_id):
+                    if reporter.is_cancelled():
                         raise RuntimeError("Cancelled")
 
                 def _posttask(self, key, result, dsk, state, id):
-                    increment_step_progress(
-                        job_id,
-                        "merge_compute",
-                        increment=1,
-                        message=f"Computing {state} {crop}",
-                    )
+                    reporter.increment("merge_compute", message=f"Computing {state} {crop}")
 
             return _Callback()
 
@@ -152,6 +317,8 @@ def merge_task_worker(args):
         for ds in datasets:
             ds.close()
         gc.collect()
+        if cfg.build_overviews:
+            build_overviews(output_path, cfg.compress)
         elapsed = time.perf_counter() - started
         output_bytes = os.path.getsize(output_path) if os.path.exists(output_path) else 0
         return (state, crop, True, "Success", elapsed, output_bytes, output_path)
@@ -159,6 +326,8 @@ def merge_task_worker(args):
         elapsed = time.perf_counter() - started
         output_bytes = os.path.getsize(output_path) if os.path.exists(output_path) else 0
         return (state, crop, False, str(exc), elapsed, output_bytes, output_path)
+    finally:
+        reporter.close()
 
 
 def get_crop_list(crops_str: str) -> List[str]:
@@ -195,7 +364,22 @@ def run_merge(
         job_id: int,
         skip_exists: bool = True,
         workers: int = 4,
+        engine: str | None = None,
+        num_threads: str | None = None,
+        reset_progress: bool = True,
 ) -> None:
+    """Merge the inference tiles of ``states`` into one GeoTIFF per state and crop.
+
+    ``reset_progress`` false adds this call's tasks to the job's progress
+    totals instead of restarting them, for runs that merge one state at a time.
+    """
+    engine = engine or getattr(settings, "MERGE_ENGINE", MERGE_ENGINE_RIOXARRAY)
+    num_threads = threads_per_task(
+        num_threads or getattr(settings, "MERGE_NUM_THREADS", "ALL_CPUS"), workers
+    )
+    with_overviews = getattr(settings, "MERGE_BUILD_OVERVIEWS", True)
+    if engine not in MERGE_ENGINES:
+        raise ValueError(f"Merge engine must be one of {', '.join(MERGE_ENGINES)}; got {engine!r}.")
     input_base = os.path.join(output_root, "inference_tiles", year_suffix, country)
     output_base = os.path.join(output_root, "merged_cropmasks", year_suffix, country)
     if not os.path.exists(input_base):
@@ -203,18 +387,35 @@ def run_merge(
     crop_names = get_crop_list(crops)
     tasks = []
     for state in states:
-        for crop in crop_names:
+        class_dir = os.path.join(input_base, state, CLASS_INDEX_DIR)
+        for class_id, crop in enumerate(crop_names, start=1):
             state_crop_in_dir = os.path.join(input_base, state, crop)
             filename = f"{year_suffix}_{country}_{state}_{crop}.tif"
             state_crop_out_dir = os.path.join(output_base, state, crop)
             output_file_path = os.path.join(state_crop_out_dir, filename)
-            cfg = vars(MergeConfig(skip_if_exists=skip_exists))
+            cfg = vars(MergeConfig(
+                skip_if_exists=skip_exists,
+                engine=engine,
+                num_threads=num_threads,
+                build_overviews=with_overviews,
+            ))
             cfg["job_id"] = job_id
+            if not _has_tiles(state_crop_in_dir, cfg["tile_glob_pattern"]) and _has_tiles(
+                class_dir, cfg["tile_glob_pattern"]
+            ):
+                # Inference wrote class-index tiles; split this crop out while merging.
+                state_crop_in_dir = class_dir
+                cfg["derive_crop"] = crop
+                cfg["fallback_class_id"] = class_id
             tasks.append((state, crop, state_crop_in_dir, output_file_path, cfg))
-    set_progress(job_id, 0, len(tasks), "Starting merge")
-    set_step_progress(job_id, "merge", 0, len(tasks), "Starting merge")
-    set_step_progress(job_id, "merge_tiles", 0, 0, "Starting merge tiles")
-    set_step_progress(job_id, "merge_compute", 0, 0, "Starting merge compute")
+    if reset_progress:
+        set_progress(job_id, 0, len(tasks), "Starting merge")
+        set_step_progress(job_id, "merge", 0, len(tasks), "Starting merge")
+        set_step_progress(job_id, "merge_tiles", 0, 0, "Starting merge tiles")
+        set_step_progress(job_id, "merge_compute", 0, 0, "Starting merge compute")
+    else:
+        add_progress_total(job_id, len(tasks))
+        add_step_total(job_id, "merge", len(tasks))
 
     def _iter_results() -> Iterable[Tuple[str, str, bool, str, float, int, str]]:
         if current_process().daemon:
@@ -253,7 +454,9 @@ def run_merge(
                 job_id,
                 f"Merge {state}/{crop} status={msg} elapsed={elapsed:.2f}s output_bytes={output_bytes}",
             )
-            if not success:
+            if success:
+                record_outputs(job_id, "merged_cropmasks", [output_path])
+            else:
                 append_log(job_id, format_error_message(f"merge {state}/{crop}", msg))
                 failures.append(f"{state}/{crop}: {msg}")
             pbar.update(1)
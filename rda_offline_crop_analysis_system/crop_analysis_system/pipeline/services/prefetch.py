@@ -0,0 +1,121 @@
+import queue
+import threading
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+
+from pipeline.services.tile_reader import TileWindowReader
+
+Coords = List[Tuple[int, int, int, int]]
+
+_DONE = object()
+
+
+class BatchPrefetcher:
+    """Assemble input batches on a background thread ahead of the forward pass.
+
+    A single reader thread slices windows from the tile's strip cache (GDAL
+    releases the GIL while decoding), converts them to float32 and, for CUDA
+    devices, pins the host buffer so the host-to-device copy can run
+    asynchronously. At most ``depth`` batches wait in the queue. With
+    ``depth == 0`` batches are built inline on the caller's thread.
+    """
+
+    def __init__(
+            self,
+            reader: TileWindowReader,
+            chunks: Sequence[Coords],
+            depth: int = 2,
+            pin_memory: bool = False,
+    ):
+        self.reader = reader
+        self.chunks = chunks
+        self.depth = max(0, int(depth))
+        self.pin_memory = pin_memory
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, self.depth))
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _build(self, batch: Coords) -> torch.Tensor:
+        patches = np.stack([self.reader.get_patch(x, y, h, w) for x, y, h, w in batch])
+        tensor = torch.from_numpy(patches.astype(np.float32))
+        return tensor.pin_memory() if self.pin_memory else tensor
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self) -> None:
+        try:
+            for batch in self.chunks:
+                if self._stop.is_set() or not self._put((batch, self._build(batch))):
+                    return
+        except BaseException as exc:
+            self._put(exc)
+            return
+        self._put(_DONE)
+
+    def __iter__(self) -> Iterator[Tuple[Coords, torch.Tensor]]:
+        if self.depth == 0:
+            for batch in self.chunks:
+                yield batch, self._build(batch)
+            return
+        self._thread = threading.Thread(target=self._run, name="inference-prefetch", daemon=True)
+        self._thread.start()
+        while True:
+            item = self._queue.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    def close(self) -> None:
+        """Stop the reader thread and drop queued batches."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        while not self._queue.empty():
+            self._queue.get_nowait()
+
+
+def to_device_overlapped(
+        batches: Iterator[Tuple[Coords, torch.Tensor]], device: torch.device
+) -> Iterator[Tuple[Coords, torch.Tensor]]:
+    """Yield device batches, copying batch ``i + 1`` while batch ``i`` is computed.
+
+    On CUDA the copy of the next pinned batch is issued on a side stream before
+    the current batch is handed to the caller, and the compute stream waits on
+    an event only when it consumes that batch. Other devices copy inline.
+    """
+    if device.type != "cuda":
+        for batch, host in batches:
+            yield batch, host.to(device)
+        return
+    copy_stream = torch.cuda.Stream(device=device)
+    pending = None
+    for batch, host in batches:
+        with torch.cuda.stream(copy_stream):
+            dev = host.to(device, non_blocking=True)
+            ready = torch.cuda.Event()
+            ready.record(copy_stream)
+        if pending is not None:
+            yield _consume(pending, device)
+        pending = (batch, host, dev, ready)
+    if pending is not None:
+        yield _consume(pending, device)
+
+
+def _consume(pending, device: torch.device) -> Tuple[Coords, torch.Tensor]:
+    batch, _host, dev, ready = pending
+    compute_stream = torch.cuda.current_stream(device)
+    compute_stream.wait_event(ready)
+    dev.record_stream(compute_stream)
+    return batch, dev
@@ -0,0 +1,261 @@
+import contextlib
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import Callable, Tuple
+
+import torch
+from torch import nn
+
+RUNTIME_EAGER = "eager"
+RUNTIME_COMPILE = "compile"
+RUNTIME_TORCHSCRIPT = "torchscript"
+RUNTIME_ONNX = "onnx"
+RUNTIMES = (RUNTIME_EAGER, RUNTIME_COMPILE, RUNTIME_TORCHSCRIPT, RUNTIME_ONNX)
+
+AUTOCAST_OFF = "off"
+AUTOCAST_BF16 = "bf16"
+AUTOCAST_FP16 = "fp16"
+AUTOCAST_MODES = (AUTOCAST_OFF, AUTOCAST_BF16, AUTOCAST_FP16)
+
+ONNX_OPSET = 17
+PARITY_BATCH = 2
+# Max absolute softmax difference accepted against the eager fp32 model.
+PARITY_TOLERANCE = 1e-3
+PARITY_TOLERANCE_AUTOCAST = 5e-2
+
+ModelRunner = Callable[[torch.Tensor], torch.Tensor]
+
+
+class SegmentationLogits(nn.Module):
+    """Inference view of ``VisionTransformer`` returning only the segmentation logits.
+
+    ``forward`` of the full model also evaluates the contrastive projection head
+    and a log-softmax that inference discards; ``encode_decode`` skips both.
+    """
+
+    def __init__(self, net: nn.Module):
+        super().__init__()
+        self.net = net
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.net.encode_decode(x, None)
+
+
+@dataclass
+class ParityReport:
+    max_abs_diff: float
+    label_agreement: float
+    tolerance: float
+
+    @property
+    def passed(self) -> bool:
+        return self.max_abs_diff <= self.tolerance
+
+    def describe(self) -> str:
+        return (
+            f"max |dp|={self.max_abs_diff:.2e} (tol {self.tolerance:.0e}), "
+            f"label agreement {self.label_agreement:.4%}"
+        )
+
+
+def effective_autocast(mode: str, device: torch.device) -> str:
+    """The autocast mode actually used for ``mode`` on ``device``.
+
+    The model is fed raw 0..65535 reflectances, beyond the fp16 maximum
+    (65504), so fp16 would overflow to inf: it runs in fp32 instead. bfloat16
+    keeps the fp32 range and is used where the device supports it.
+    """
+    if mode != AUTOCAST_BF16:
+        return AUTOCAST_OFF
+    if device.type == "cuda" and not torch.cuda.is_bf16_supported():
+        return AUTOCAST_OFF
+    return AUTOCAST_BF16
+
+
+def resolve_autocast_dtype(mode: str, device: torch.device) -> torch.dtype | None:
+    """Map an autocast mode to a dtype the device supports, or ``None`` for fp32."""
+    if effective_autocast(mode, device) == AUTOCAST_OFF:
+        return None
+    return torch.bfloat16
+
+
+def autocast_context(mode: str, device: torch.device):
+    dtype = resolve_autocast_dtype(mode, device)
+    if dtype is None:
+        return contextlib.nullcontext()
+    return torch.autocast(device_type=device.type, dtype=dtype)
+
+
+def artifact_path(
+        weight_path: str,
+        runtime: str,
+        input_shape: Tuple[int, int, int],
+        num_class: int,
+        device: torch.device,
+        autocast: str = AUTOCAST_OFF,
+) -> str:
+    """Return the cache path of a compiled artifact, stored next to the weight file.
+
+    The name carries a digest of the weight file size and mtime, the model input
+    shape, the device type and the torch version, so a changed checkpoint or
+    upgrade produces a fresh artifact instead of reusing a stale one.
+    """
+    stat = os.stat(weight_path)
+    key = "|".join(
+        str(part)
+        for part in (
+            stat.st_size,
+            int(stat.st_mtime),
+            "x".join(map(str, input_shape)),
+            num_class,
+            device.type,
+            autocast,
+            torch.__version__,
+        )
+    )
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+    ext = ".onnx" if runtime == RUNTIME_ONNX else ".ts"
+    return f"{os.path.splitext(weight_path)[0]}.{runtime}-{digest}{ext}"
+
+
+def _example_input(input_shape: Tuple[int, int, int], device: torch.device) -> torch.Tensor:
+    """Deterministic batch on the uint16 scale the reader feeds the model."""
+    generator = torch.Generator().manual_seed(0)
+    x = torch.rand((PARITY_BATCH, *input_shape), generator=generator) * 65535
+    return x.to(device)
+
+
+def _atomic_save(path: str, save: Callable[[str], None]) -> None:
+    # GPU workers may export the same artifact concurrently; each writes its own temp file.
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    save(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _eager_runner(module: nn.Module, device: torch.device, autocast: str) -> ModelRunner:
+    def run(x: torch.Tensor) -> torch.Tensor:
+        with autocast_context(autocast, device):
+            return module(x).float()
+
+    return run
+
+
+def _compile_runner(
+        module: nn.Module, device: torch.device, autocast: str, weight_path: str
+) -> ModelRunner:
+    # Keep the Inductor cache beside the weights so every worker reuses it.
+    os.environ.setdefault(
+        "TORCHINDUCTOR_CACHE_DIR",
+        os.path.join(os.path.dirname(os.path.abspath(weight_path)), ".inductor_cache"),
+    )
+    return _eager_runner(torch.compile(module), device, autocast)
+
+
+def _torchscript_runner(
+        module: nn.Module,
+        device: torch.device,
+        autocast: str,
+        weight_path: str,
+        input_shape: Tuple[int, int, int],
+        num_class: int,
+) -> ModelRunner:
+    path = artifact_path(weight_path, RUNTIME_TORCHSCRIPT, input_shape, num_class, device, autocast)
+    if not os.path.exists(path):
+        # Tracing under autocast records the casts in the graph.
+        with autocast_context(autocast, device):
+            traced = torch.jit.trace(module, _example_input(input_shape, device))
+        _atomic_save(path, lambda tmp: torch.jit.save(traced, tmp))
+    scripted = torch.jit.load(path, map_location=device)
+    scripted.eval()
+    return lambda x: scripted(x).float()
+
+
+def _onnx_providers(device: torch.device, available) -> list:
+    if device.type == "cuda":
+        preferred = ["CUDAExecutionProvider", "CPUExecutionProvider"]
+    else:
+        preferred = ["OpenVINOExecutionProvider", "CPUExecutionProvider"]
+    return [p for p in preferred if p in available] or ["CPUExecutionProvider"]
+
+
+def _onnx_runner(
+        module: nn.Module,
+        device: torch.device,
+        weight_path: str,
+        input_shape: Tuple[int, int, int],
+        num_class: int,
+) -> ModelRunner:
+    try:
+        import onnxruntime as ort
+    except ImportError as exc:
+        raise RuntimeError("INFERENCE_RUNTIME=onnx requires the onnxruntime package.") from exc
+    path = artifact_path(weight_path, RUNTIME_ONNX, input_shape, num_class, device)
+    if not os.path.exists(path):
+        _atomic_save(
+            path,
+            lambda tmp: torch.onnx.export(
+                module,
+                _example_input(input_shape, device),
+                tmp,
+                input_names=["input"],
+                output_names=["logits"],
+                dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+                opset_version=ONNX_OPSET,
+            ),
+        )
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    session = ort.InferenceSession(
+        path, options, providers=_onnx_providers(device, ort.get_available_providers())
+    )
+
+    def run(x: torch.Tensor) -> torch.Tensor:
+        (logits,) = session.run(["logits"], {"input": x.detach().cpu().numpy()})
+        return torch.from_numpy(logits).to(device)
+
+    return run
+
+
+def build_model_runner(
+        net: nn.Module,
+        device: torch.device,
+        runtime: str,
+        autocast: str,
+        weight_path: str,
+        input_shape: Tuple[int, int, int],
+        num_class: int,
+) -> ModelRunner:
+    """Wrap ``net`` for the requested runtime; the runner maps a batch to fp32 logits.
+
+    Autocast applies to the eager, compiled and TorchScript runtimes. The ONNX
+    graph is exported in fp32 and executed by ONNX Runtime (CUDA, OpenVINO or
+    CPU provider, whichever is installed), so it also runs on CPU-only nodes.
+    """
+    module = SegmentationLogits(net).eval()
+    if runtime == RUNTIME_COMPILE:
+        return _compile_runner(module, device, autocast, weight_path)
+    if runtime == RUNTIME_TORCHSCRIPT:
+        return _torchscript_runner(module, device, autocast, weight_path, input_shape, num_class)
+    if runtime == RUNTIME_ONNX:
+        return _onnx_runner(module, device, weight_path, input_shape, num_class)
+    return _eager_runner(module, device, autocast)
+
+
+@torch.no_grad()
+def check_parity(
+        reference: nn.Module,
+        runner: ModelRunner,
+        input_shape: Tuple[int, int, int],
+        device: torch.device,
+        tolerance: float,
+) -> ParityReport:
+    """Compare ``runner`` with the eager fp32 ``reference`` on a fixed input batch."""
+    x = _example_input(input_shape, device)
+    expected = torch.softmax(reference(x)[0].float(), dim=1)
+    actual = torch.softmax(runner(x), dim=1)
+    return ParityReport(
+        max_abs_diff=float((expected - actual).abs().max()),
+        label_agreement=float((expected.argmax(1) == actual.argmax(1)).float().mean()),
+        tolerance=tolerance,
+    )
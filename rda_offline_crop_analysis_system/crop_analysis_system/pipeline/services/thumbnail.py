@@ -1,5 +1,5 @@
 import os
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import rasterio
@@ -7,6 +7,9 @@ from PIL import Image
 from rasterio.enums import Resampling
 from rasterio.warp import transform_bounds
 
+# DodgerBlue with alpha; background stays transparent.
+THUMBNAIL_COLOR = (30, 144, 255, 150)
+
 
 def get_wgs84_bounds(src: rasterio.DatasetReader) -> List[List[float]]:
     """
@@ -25,40 +28,38 @@ def get_wgs84_bounds(src: rasterio.DatasetReader) -> List[List[float]]:
     return [[wgs84_bounds[3], wgs84_bounds[0]], [wgs84_bounds[1], wgs84_bounds[2]]]
 
 
-def create_thumbnail(
-    tiff_path: str,
-    output_path: str,
-    thumbnail_size: Tuple[int, int] = (1024, 1024),
-    class_value: int = 1,
-) -> List[List[float]]:
-    """
-    Create a low-resolution PNG thumbnail from a GeoTIFF.
+def _overview_level(src: rasterio.DatasetReader, out_w: int, out_h: int) -> Optional[int]:
+    """Index of the coarsest overview still at least ``out_w`` x ``out_h``, or ``None`` for full resolution."""
+    level = None
+    for index, factor in enumerate(src.overviews(1)):
+        if -(-src.width // factor) >= out_w and -(-src.height // factor) >= out_h:
+            level = index
+    return level
 
-    Notes:
-        - Preserves aspect ratio (fits within thumbnail_size).
-        - Uses nodata/mask for transparency (does NOT assume value 0 is nodata).
-        - Uses nearest resampling by default (safer for masks/classes).
 
-    Args:
-        tiff_path: Path to the input GeoTIFF file.
-        output_path: Path to save the output PNG thumbnail.
-        thumbnail_size: The maximum dimensions (width, height) of the thumbnail.
+def read_thumbnail_array(
+    tiff_path: str, thumbnail_size: Tuple[int, int] = (1024, 1024)
+) -> Tuple[np.ndarray, List[List[float]]]:
+    """
+    Read band 1 of a GeoTIFF downsampled to fit within ``thumbnail_size``.
+
+    The read is served from the nearest internal overview that is at least the
+    thumbnail size, so only a fraction of the full-resolution blocks is
+    decoded; rasters without overviews fall back to a decimated full read.
 
     Returns:
-        The geographic bounds of the raster in WGS84 format.
+        The downsampled array and the WGS84 bounds of the raster.
     """
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
     with rasterio.open(tiff_path) as src:
-        # Get bounds in WGS84
         bounds = get_wgs84_bounds(src)
-
         # Preserve aspect ratio while fitting within thumbnail_size
         max_w, max_h = thumbnail_size
         scale = min(max_w / src.width, max_h / src.height)
         out_w = max(1, int(round(src.width * scale)))
         out_h = max(1, int(round(src.height * scale)))
+        level = _overview_level(src, out_w, out_h)
 
+    with rasterio.open(tiff_path, overview_level=level) as src:
         # Read as plain array to avoid dataset masks shrinking the visible area
         # Nearest is safer for masks/classes (avoid mixing labels like bilinear does)
         data = src.read(
@@ -67,33 +68,80 @@ def create_thumbnail(
             resampling=Resampling.nearest,
             masked=False,
         )
+    return data, bounds
+
+
+def render_class_rgba(
+    data: np.ndarray, class_value: int, color: Tuple[int, int, int, int] = THUMBNAIL_COLOR
+) -> np.ndarray:
+    """Paint pixels equal to ``class_value`` in ``color``; everything else is transparent."""
+    rgba = np.zeros((*data.shape, 4), dtype=np.uint8)
+    rgba[data == class_value] = color
+    return rgba
+
+
+def class_thumbnail_paths(tiff_path: str, png_path: str) -> Dict[int, str]:
+    """PNG path per class to render for ``tiff_path``.
+
+    A class-index raster gets one ``<name>_<crop>.png`` per entry of its class
+    table; a crop mask without a table renders class 1 to ``png_path``.
+    """
+    # Imported here: script_thumbnail.py uses this module without Django settings.
+    from pipeline.services.common import CLASS_TABLE_METADATA_KEY, parse_class_table
+
+    with rasterio.open(tiff_path) as src:
+        table = parse_class_table(src.tags().get(CLASS_TABLE_METADATA_KEY, ""))
+    if not table:
+        return {1: png_path}
+    base, ext = os.path.splitext(png_path)
+    return {class_id: f"{base}_{crop}{ext}" for crop, class_id in sorted(table.items(), key=lambda item: item[1])}
+
+
+def create_class_thumbnails(
+    tiff_path: str,
+    outputs: Dict[int, str],
+    thumbnail_size: Tuple[int, int] = (1024, 1024),
+) -> List[List[float]]:
+    """
+    Create one PNG thumbnail per class value from a single downsampled read.
 
-        # Show only the requested class value; everything else is transparent
-        valid = data == class_value
-
-        # Optional: normalize valid data to 0-255 (kept similar to original intent)
-        arr = np.array(data, dtype=np.float32)
-        if np.any(valid):
-            v = arr[valid]
-            vmin = float(np.min(v))
-            vmax = float(np.max(v))
-            if vmax > vmin:
-                arr = (arr - vmin) / (vmax - vmin) * 255.0
-            else:
-                arr = np.zeros(arr.shape, dtype=np.float32)
-        else:
-            arr = np.zeros(arr.shape, dtype=np.float32)
-
-        arr8 = np.clip(arr, 0, 255).astype(np.uint8)
-
-        # Build RGBA output:
-        # - background -> transparent
-        # - valid pixels -> Blue with some transparency
-        rgba = np.zeros((out_h, out_w, 4), dtype=np.uint8)
-        rgba[valid] = (30, 144, 255, 150)  # DodgerBlue with alpha
+    Args:
+        tiff_path: Path to the input GeoTIFF file.
+        outputs: Output PNG path for each class value to render.
+        thumbnail_size: The maximum dimensions (width, height) of the thumbnails.
 
+    Returns:
+        The geographic bounds of the raster in WGS84 format.
+    """
+    data, bounds = read_thumbnail_array(tiff_path, thumbnail_size)
+    for class_value, output_path in outputs.items():
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
         # Use Pillow to create a PNG image
-        img = Image.fromarray(rgba, "RGBA")
+        img = Image.fromarray(render_class_rgba(data, class_value), "RGBA")
         img.save(output_path, "PNG")
-
     return bounds
+
+
+def create_thumbnail(
+    tiff_path: str,
+    output_path: str,
+    thumbnail_size: Tuple[int, int] = (1024, 1024),
+    class_value: int = 1,
+) -> List[List[float]]:
+    """
+    Create a low-resolution PNG thumbnail from a GeoTIFF.
+
+    Notes:
+        - Preserves aspect ratio (fits within thumbnail_size).
+        - Uses nodata/mask for transparency (does NOT assume value 0 is nodata).
+        - Uses nearest resampling by default (safer for masks/classes).
+
+    Args:
+        tiff_path: Path to the input GeoTIFF file.
+        output_path: Path to save the output PNG thumbnail.
+        thumbnail_size: The maximum dimensions (width, height) of the thumbnail.
+
+    Returns:
+        The geographic bounds of the raster in WGS84 format.
+    """
+    return create_class_thumbnails(tiff_path, {class_value: output_path}, thumbnail_size)
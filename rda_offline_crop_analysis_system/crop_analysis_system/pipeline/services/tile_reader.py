@@ -0,0 +1,252 @@
+import json
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from osgeo import gdal, gdal_array
+
+gdal.UseExceptions()
+
+NORMALIZE_WINDOW = "window"
+NORMALIZE_TILE = "tile"
+NORMALIZE_STATE = "state"
+NORMALIZE_MODES = (NORMALIZE_WINDOW, NORMALIZE_TILE, NORMALIZE_STATE)
+
+LOWER_PERCENTILE = 2.0
+UPPER_PERCENTILE = 98.0
+FLOAT_HISTOGRAM_BINS = 4096
+MAX_INTEGER_HISTOGRAM_BINS = 65536
+
+
+def clip_normalize_to_uint16(data: np.ndarray) -> np.ndarray:
+    """Stretch one band between its 2nd and 98th percentile into uint16."""
+    lower, upper = np.percentile(data, LOWER_PERCENTILE), np.percentile(data, UPPER_PERCENTILE)
+    denom = upper - lower or 1e-6
+    data = np.clip((data - lower) / denom, 0, 1)
+    return (data * 65535).astype(np.uint16)
+
+
+@dataclass
+class BandStats:
+    """Per-band stretch bounds shared by every window of a tile or state."""
+
+    lower: np.ndarray
+    upper: np.ndarray
+
+    def to_dict(self) -> Dict[str, List[float]]:
+        return {"lower": self.lower.tolist(), "upper": self.upper.tolist()}
+
+    @staticmethod
+    def from_dict(data: Dict[str, List[float]]) -> "BandStats":
+        return BandStats(
+            lower=np.asarray(data["lower"], dtype=np.float64),
+            upper=np.asarray(data["upper"], dtype=np.float64),
+        )
+
+
+def apply_band_stretch(data: np.ndarray, stats: BandStats) -> np.ndarray:
+    """Stretch ``(..., bands, rows, cols)`` data to uint16 with precomputed bounds."""
+    lower = stats.lower.astype(np.float32).reshape(-1, 1, 1)
+    denom = stats.upper.astype(np.float32).reshape(-1, 1, 1) - lower
+    denom = np.where(denom == 0, 1e-6, denom)
+    out = (data - lower) / denom
+    np.clip(out, 0, 1, out=out)
+    out *= 65535
+    return out.astype(np.uint16)
+
+
+def _histogram_layout(data_type: int, value_min: float, value_max: float) -> Tuple[float, float, int]:
+    """Pick histogram bounds and bucket count; integer bands get one bucket per value."""
+    span = value_max - value_min + 1
+    if data_type in (gdal.GDT_Float32, gdal.GDT_Float64) or span > MAX_INTEGER_HISTOGRAM_BINS:
+        upper = value_max if value_max > value_min else value_min + 1e-6
+        return value_min, upper, FLOAT_HISTOGRAM_BINS
+    buckets = int(max(1, span))
+    return value_min - 0.5, value_min + buckets - 0.5, buckets
+
+
+def _band_range(ds: gdal.Dataset, band_index: int, approx: bool) -> Tuple[float, float]:
+    return tuple(ds.GetRasterBand(band_index + 1).ComputeRasterMinMax(approx))
+
+
+def _band_histogram(
+        ds: gdal.Dataset, band_index: int, value_min: float, value_max: float, approx: bool
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Histogram one band with GDAL; returns ``(bin_centers, counts)``."""
+    band = ds.GetRasterBand(band_index + 1)
+    lo, hi, buckets = _histogram_layout(band.DataType, value_min, value_max)
+    counts = band.GetHistogram(lo, hi, buckets, False, approx)
+    width = (hi - lo) / buckets
+    centers = lo + width * (np.arange(buckets) + 0.5)
+    return centers, np.asarray(counts, dtype=np.float64)
+
+
+def _percentiles_from_histogram(
+        centers: np.ndarray, counts: np.ndarray
+) -> Tuple[float, float]:
+    total = counts.sum()
+    if total <= 0:
+        return 0.0, 0.0
+    cdf = np.cumsum(counts) / total
+    lower = centers[min(np.searchsorted(cdf, LOWER_PERCENTILE / 100.0), len(centers) - 1)]
+    upper = centers[min(np.searchsorted(cdf, UPPER_PERCENTILE / 100.0), len(centers) - 1)]
+    return float(lower), float(upper)
+
+
+def compute_tile_band_stats(
+        ds: gdal.Dataset, band_indices: Tuple[int, ...], approx: bool = False
+) -> BandStats:
+    """Compute 2/98 percentile bounds for each band of one tile from GDAL histograms."""
+    return compute_band_stats([ds], band_indices, approx=approx)
+
+
+def compute_band_stats(
+        datasets: Sequence[gdal.Dataset], band_indices: Tuple[int, ...], approx: bool = False
+) -> BandStats:
+    """Compute 2/98 percentile bounds per band over the pooled pixels of ``datasets``."""
+    lowers, uppers = [], []
+    for band_index in band_indices:
+        ranges = [_band_range(ds, band_index, approx) for ds in datasets]
+        value_min = min(r[0] for r in ranges)
+        value_max = max(r[1] for r in ranges)
+        centers, counts = _band_histogram(datasets[0], band_index, value_min, value_max, approx)
+        for ds in datasets[1:]:
+            counts = counts + _band_histogram(ds, band_index, value_min, value_max, approx)[1]
+        lower, upper = _percentiles_from_histogram(centers, counts)
+        lowers.append(lower)
+        uppers.append(upper)
+    return BandStats(lower=np.asarray(lowers), upper=np.asarray(uppers))
+
+
+def _stats_fingerprint(paths: Sequence[str], band_indices: Tuple[int, ...]) -> Dict[str, object]:
+    files = []
+    for path in sorted(paths):
+        stat = os.stat(path)
+        files.append([os.path.basename(path), stat.st_size, int(stat.st_mtime)])
+    return {"bands": list(band_indices), "files": files}
+
+
+def load_or_compute_state_stats(
+        paths: Sequence[str],
+        band_indices: Tuple[int, ...],
+        cache_path: str,
+        approx: bool = False,
+) -> BandStats:
+    """Return pooled band stats for a state's tiles, cached as JSON at ``cache_path``.
+
+    The cache is reused while the tile names, sizes and mtimes are unchanged.
+    """
+    fingerprint = _stats_fingerprint(paths, band_indices)
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, "r", encoding="utf-8") as handle:
+                cached = json.load(handle)
+            if cached.get("fingerprint") == fingerprint:
+                return BandStats.from_dict(cached["stats"])
+        except (OSError, ValueError, KeyError):
+            pass
+    datasets = [gdal.Open(path, gdal.GA_ReadOnly) for path in paths]
+    try:
+        stats = compute_band_stats(datasets, band_indices, approx=approx)
+    finally:
+        del datasets
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        json.dump({"fingerprint": fingerprint, "stats": stats.to_dict()}, handle)
+    os.replace(tmp_path, cache_path)
+    return stats
+
+
+class TileWindowReader:
+    """Serve sliding windows of a tile from an in-memory row strip.
+
+    Rows are fetched with one multi-band ``ReadRaster`` call per strip and the
+    strip end is aligned to the raster block height, so each compressed block
+    is decoded once per tile instead of once per overlapping window. Rows that
+    are still needed by the next window row are kept when the strip advances.
+    Windows are returned as views into the strip; callers must copy before
+    mutating them.
+
+    When ``stats`` is given the strip is stretched to uint16 as it is read, so
+    normalization also runs once per pixel and is identical for every window.
+    Without it, ``get_patch`` keeps the legacy per-window percentile stretch.
+    """
+
+    def __init__(
+            self,
+            ds: gdal.Dataset,
+            band_indices: Tuple[int, ...],
+            strip_rows: int = 0,
+            stats: Optional[BandStats] = None,
+    ):
+        self.ds = ds
+        self.band_list = [b + 1 for b in band_indices]
+        self.height, self.width = ds.RasterYSize, ds.RasterXSize
+        first_band = ds.GetRasterBand(self.band_list[0])
+        self.src_dtype = np.dtype(gdal_array.GDALTypeCodeToNumericTypeCode(first_band.DataType))
+        self.dtype = self.src_dtype if stats is None else np.dtype(np.uint16)
+        self.block_rows = max(1, first_band.GetBlockSize()[1])
+        self.strip_rows = max(0, int(strip_rows))
+        self.stats = stats
+        self._data: Optional[np.ndarray] = None
+        self._row_start = 0
+        self._row_end = 0
+
+    def _read_rows(self, start: int, end: int) -> np.ndarray:
+        """Read rows ``[start, end)`` of every selected band in one call."""
+        rows = end - start
+        buf = self.ds.ReadRaster(0, start, self.width, rows, band_list=self.band_list)
+        data = np.frombuffer(buf, dtype=self.src_dtype).reshape(len(self.band_list), rows, self.width)
+        if self.stats is not None:
+            return apply_band_stretch(data.astype(np.float32), self.stats)
+        return data
+
+    def _ensure_rows(self, start: int, end: int) -> None:
+        """Make rows ``[start, end)`` resident, reusing the overlap with the current strip."""
+        if self._data is not None and self._row_start <= start and end <= self._row_end:
+            return
+        if not self.strip_rows:
+            self._data = self._read_rows(0, self.height)
+            self._row_start, self._row_end = 0, self.height
+            return
+        new_end = max(end, start + self.strip_rows)
+        new_end = min(self.height, -(-new_end // self.block_rows) * self.block_rows)
+        if self._data is not None and self._row_start <= start < self._row_end:
+            kept = self._data[:, start - self._row_start:]
+            fresh = self._read_rows(self._row_end, new_end)
+            self._data = np.concatenate([kept, fresh], axis=1)
+        else:
+            self._data = self._read_rows(start, new_end)
+        self._row_start, self._row_end = start, new_end
+
+    def window(self, x: int, y: int, h: int, w: int) -> np.ndarray:
+        """Return the in-bounds part of a window as a ``(bands, rows, cols)`` view."""
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(x + h, self.height), min(y + w, self.width)
+        if x1 <= x0 or y1 <= y0:
+            return np.empty((len(self.band_list), 0, 0), dtype=self.dtype)
+        self._ensure_rows(x0, x1)
+        offset = x0 - self._row_start
+        return self._data[:, offset: offset + (x1 - x0), y0:y1]
+
+    def get_patch(self, x: int, y: int, h: int, w: int) -> np.ndarray:
+        """Build the normalized, zero-padded uint16 patch the model expects."""
+        patch = np.zeros((len(self.band_list), h, w), dtype=np.uint16)
+        view = self.window(x, y, h, w)
+        read_h, read_w = view.shape[1], view.shape[2]
+        if read_h == 0 or read_w == 0:
+            return patch
+        p_x, p_y = max(0, x) - x, max(0, y) - y
+        if self.stats is not None:
+            patch[:, p_x: p_x + read_h, p_y: p_y + read_w] = view
+            return patch
+        for i in range(view.shape[0]):
+            patch[i, p_x: p_x + read_h, p_y: p_y + read_w] = clip_normalize_to_uint16(view[i])
+        return patch
+
+    def close(self) -> None:
+        """Drop the cached strip."""
+        self._data = None
+        self._row_start = self._row_end = 0
@@ -0,0 +1,169 @@
+import math
+from contextlib import ExitStack
+from typing import Dict, Iterable, List, Sequence
+
+import geopandas as gpd
+import numpy as np
+import rasterio
+import shapely
+from pyproj import CRS
+from rasterio.errors import WindowError
+from rasterio.features import geometry_window, rasterize
+from rasterio.windows import Window
+
+AREA_ENGINE_REPROJECT = "reproject"
+AREA_ENGINE_ZONAL = "zonal"
+AREA_ENGINES = (AREA_ENGINE_REPROJECT, AREA_ENGINE_ZONAL)
+
+# Blocks read per strip are grouped up to roughly this many pixels.
+STRIP_PIXELS = 16 * 1024 * 1024
+
+
+def geodesic_row_areas(
+        transform, row_start: int, rows: int, semi_major: float, inverse_flattening: float
+) -> np.ndarray:
+    """Return the ellipsoidal area in m2 of one pixel for each row of a lat/lon grid.
+
+    Uses the closed form for the area of a latitude band on an ellipsoid
+    (Snyder 1987): ``b^2 * dlon / 2 * [q(lat2) - q(lat1)]`` with
+    ``q(p) = sin p / (1 - e^2 sin^2 p) + atanh(e sin p) / e``.
+    """
+    flattening = 1.0 / inverse_flattening if inverse_flattening else 0.0
+    semi_minor = semi_major * (1.0 - flattening)
+    ecc = math.sqrt(max(0.0, 2 * flattening - flattening ** 2))
+    edges = transform.f + transform.e * np.arange(row_start, row_start + rows + 1, dtype=np.float64)
+    sin_lat = np.sin(np.radians(np.clip(edges, -90.0, 90.0)))
+    if ecc:
+        q = sin_lat / (1.0 - ecc ** 2 * sin_lat ** 2) + np.arctanh(ecc * sin_lat) / ecc
+    else:
+        q = 2.0 * sin_lat
+    dlon = math.radians(abs(transform.a))
+    return np.abs(np.diff(q)) * semi_minor ** 2 * dlon / 2.0
+
+
+def _block_windows(window: Window, block_h: int, block_w: int) -> Iterable[Window]:
+    """Split ``window`` into block-aligned sub-windows."""
+    row0, col0 = int(window.row_off), int(window.col_off)
+    row1, col1 = row0 + int(window.height), col0 + int(window.width)
+    for r in range(row0 - row0 % block_h, row1, block_h):
+        for c in range(col0 - col0 % block_w, col1, block_w):
+            top, left = max(r, row0), max(c, col0)
+            yield Window(left, top, min(c + block_w, col1) - left, min(r + block_h, row1) - top)
+
+
+class GridMismatchError(ValueError):
+    """Rasters passed to ``zonal_histograms`` are not on one grid."""
+
+
+def _same_grid(datasets) -> bool:
+    first = datasets[0]
+    return all(
+        ds.crs == first.crs and ds.transform == first.transform and ds.shape == first.shape
+        for ds in datasets[1:]
+    )
+
+
+def zonal_histograms(
+        raster_paths: Sequence[str], geometry_wkb: bytes, geometry_crs_wkt: str
+) -> List[Dict[int, int]]:
+    """Sum the area in m2 of each class value inside a polygon, for rasters on one grid.
+
+    The rasters (e.g. the crop masks of one state) are streamed together
+    block by block inside the polygon's bounding window. Each block is
+    classified once against the polygon: blocks outside are never read,
+    blocks fully inside need no mask and only edge blocks are rasterized
+    (pixel centers, as ``rasterio.mask``); the block mask and pixel areas are
+    shared by every raster. Classes are counted with ``np.bincount`` weighted
+    by the pixel area: exact geodesic area per row for geographic CRSs, the
+    constant cell area for projected ones. Returns one histogram per raster.
+    """
+    geometry = shapely.from_wkb(geometry_wkb)
+    with ExitStack() as stack:
+        datasets = [stack.enter_context(rasterio.open(path)) for path in raster_paths]
+        if not _same_grid(datasets):
+            raise GridMismatchError("Rasters passed to zonal_histograms must share one grid.")
+        src = datasets[0]
+        if CRS.from_wkt(geometry_crs_wkt) != CRS.from_wkt(src.crs.to_wkt()):
+            geometry = (
+                gpd.GeoSeries([geometry], crs=geometry_crs_wkt).to_crs(src.crs.to_wkt()).iloc[0]
+            )
+        totals = [np.zeros(0, dtype=np.float64) for _ in datasets]
+        try:
+            window = geometry_window(src, [geometry])
+        except WindowError:
+            return [{} for _ in datasets]
+        geographic = src.crs.is_geographic
+        if geographic:
+            ellipsoid = CRS.from_wkt(src.crs.to_wkt()).ellipsoid
+            semi_major, inv_flat = ellipsoid.semi_major_metre, ellipsoid.inverse_flattening
+        else:
+            cell_area = abs(src.transform.a * src.transform.e - src.transform.b * src.transform.d)
+            cell_area *= src.crs.linear_units_factor[1] ** 2
+        block_h, block_w = src.block_shapes[0]
+        if block_w >= src.width:
+            # Striped rasters: group rows so one read covers many scanlines.
+            block_h = max(block_h, STRIP_PIXELS // max(1, int(window.width)))
+        windows = list(_block_windows(window, block_h, block_w))
+        boxes = shapely.box(
+            *np.array([src.window_bounds(w) for w in windows], dtype=np.float64).T
+        ) if windows else []
+        shapely.prepare(geometry)
+        inside = shapely.contains_properly(geometry, boxes)
+        touching = shapely.intersects(geometry, boxes)
+        for block, is_inside, is_touching in zip(windows, inside, touching):
+            if not is_touching:
+                continue
+            shape = (int(block.height), int(block.width))
+            in_polygon = None
+            if not is_inside:
+                in_polygon = rasterize(
+                    [geometry],
+                    out_shape=shape,
+                    transform=src.window_transform(block),
+                    fill=0,
+                    default_value=1,
+                    dtype=np.uint8,
+                ).astype(bool)
+                if not in_polygon.any():
+                    continue
+            row_area = None
+            if geographic:
+                row_area = geodesic_row_areas(
+                    src.transform, int(block.row_off), int(block.height), semi_major, inv_flat
+                )
+            for index, ds in enumerate(datasets):
+                counts = _block_histogram(ds.read(1, window=block), ds.nodata, in_polygon, row_area)
+                if counts is None:
+                    continue
+                if not geographic:
+                    counts = counts * cell_area
+                if counts.size > totals[index].size:
+                    totals[index] = np.pad(totals[index], (0, counts.size - totals[index].size))
+                totals[index][: counts.size] += counts
+    return [
+        {int(cls): int(round(area)) for cls, area in enumerate(total) if area > 0}
+        for total in totals
+    ]
+
+
+def _block_histogram(data: np.ndarray, nodata, in_polygon, row_area) -> np.ndarray | None:
+    """Weighted class counts of one block; ``None`` when no pixel is counted."""
+    valid = np.ones(data.shape, dtype=bool) if in_polygon is None else in_polygon.copy()
+    if nodata is not None:
+        valid &= data != nodata
+    if np.issubdtype(data.dtype, np.floating):
+        valid &= np.isfinite(data)
+    if not np.issubdtype(data.dtype, np.unsignedinteger):
+        valid &= data >= 0
+    values = data[valid].astype(np.int64)
+    if values.size == 0:
+        return None
+    weights = None
+    if row_area is not None:
+        weights = np.broadcast_to(row_area[:, np.newaxis], data.shape)[valid]
+    return np.bincount(values, weights=weights)
+
+
+def zonal_class_areas(raster_path: str, geometry_wkb: bytes, geometry_crs_wkt: str) -> Dict[int, int]:
+    """Sum the area in m2 of each class value of ``raster_path`` inside a polygon."""
+    return zonal_histograms([raster_path], geometry_wkb, geometry_crs_wkt)[0]
@@ -1,3 +1,6 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 from celery import chain, shared_task
 from pathlib import Path
 from django.conf import settings
@@ -5,20 +8,35 @@ from django.utils import timezone
 
 from core.models import Job, JobOutput
 from core.utils.app_settings import get_input_root, get_output_root, resolve_root_path
-from core.utils.log_files import append_log, format_error_with_trace
+from core.utils.log_files import append_log, format_error_with_trace, remove_manifest
 from core.utils.redis_client import (
     is_cancelled,
+    mark_state_done,
+    reset_states_done,
     set_cancel,
     set_progress,
     set_step_progress,
 )
 from core.utils.output_tracker import sync_job_outputs
-from core.utils.job_queue import start_next_pending_job
+from core.utils.job_queue import (
+    STEP_AREA,
+    STEP_INFERENCE,
+    STEP_MERGE,
+    STEP_THUMBNAIL,
+    Lease,
+    acquire_step,
+    release_step,
+    start_next_pending_job,
+)
 from pipeline.services.area_calc import run_area_calc
 from pipeline.services.common import ensure_output_structure, validate_input_paths
 from pipeline.services.inference import run_inference
 from pipeline.services.merge import run_merge
-from pipeline.services.thumbnail import create_thumbnail
+from pipeline.services.thumbnail import class_thumbnail_paths, create_class_thumbnails
+
+WORKFLOW_CHAIN = "chain"
+WORKFLOW_PER_STATE = "per_state"
+WORKFLOW_MODES = (WORKFLOW_CHAIN, WORKFLOW_PER_STATE)
 
 
 def _get_job(job_id: int) -> Job:
@@ -49,6 +67,149 @@ def _get_output_root(job: Job) -> Path:
     return output_root
 
 
+def _acquire_step_or_retry(task, job: Job, step: str, scope: str = "") -> Lease:
+    """Lease the step's resources, or re-queue the task until they are free."""
+    lease = acquire_step(job, step, scope)
+    if lease is None:
+        if not task.request.retries:
+            target = f"{step} ({scope})" if scope else step
+            append_log(job.id, f"Waiting for resources to start {target}")
+        raise task.retry(countdown=getattr(settings, "SCHEDULER_RETRY_SEC", 15), max_retries=None)
+    return lease
+
+
+def _fail_step(job: Job, step: str, label: str, exc: Exception, report_step: bool = True) -> None:
+    _update_celery_state(job, "FAILURE", str(exc))
+    _update_job_status(job, Job.STATUS_FAILED, job.progress_percent)
+    message = format_error_with_trace(label, exc)
+    if report_step:
+        set_step_progress(job.id, step, 0, 0, message)
+    append_log(job.id, message)
+    start_next_pending_job()
+
+
+def _run_inference_step(job: Job, lease: Lease, states, on_state_done=None) -> None:
+    if not job.pipeline_config:
+        raise ValueError("PipelineConfig is required for inference.")
+    input_meta = job.input_path
+    input_root = get_input_root()
+    output_root = _get_output_root(job)
+    run_inference(
+        input_root=str(input_root),
+        output_root=str(output_root),
+        year_suffix=input_meta.get("year_suffix"),
+        country=input_meta.get("country"),
+        crops=job.target_crops,
+        states=states,
+        weights=str(
+            resolve_root_path(job.pipeline_config.model_weights_path, "weights")
+        ),
+        batch_size=job.pipeline_config.batch_size,
+        job_id=job.id,
+        gpu_count=job.gpu_count,
+        skip_exists=job.skip_inference,
+        gpu_ids=lease.gpu_ids,
+        on_state_done=on_state_done,
+    )
+    sync_job_outputs(job, JobOutput.STEP_INFERENCE, output_root / "inference_tiles")
+
+
+def _run_merge_step(job: Job, lease: Lease, states, per_state: bool = False) -> None:
+    input_meta = job.input_path
+    output_root = _get_output_root(job)
+    run_merge(
+        output_root=str(output_root),
+        year_suffix=input_meta.get("year_suffix"),
+        country=input_meta.get("country"),
+        crops=job.target_crops,
+        states=states,
+        job_id=job.id,
+        skip_exists=job.skip_merge,
+        workers=max(1, lease.cpu_workers),
+        reset_progress=not per_state,
+    )
+    # Other states of the job may be recording into the manifest concurrently.
+    sync_job_outputs(
+        job,
+        JobOutput.STEP_MERGE,
+        output_root / "merged_cropmasks",
+        clear_manifest=not per_state,
+    )
+
+
+def _run_area_step(job: Job, lease: Lease, states, per_state: bool = False) -> None:
+    if not job.pipeline_config:
+        raise ValueError("PipelineConfig is required for area calculation.")
+    input_meta = job.input_path
+    output_root = _get_output_root(job)
+    run_area_calc(
+        output_root=str(output_root),
+        year_suffix=input_meta.get("year_suffix"),
+        country=input_meta.get("country"),
+        crops=job.target_crops,
+        states=states,
+        shapefile_path=str(
+            resolve_root_path(job.pipeline_config.shapefile_path, "shp")
+        ),
+        job_id=job.id,
+        skip_exists=job.skip_area,
+        workers=max(1, lease.cpu_workers),
+        reset_progress=not per_state,
+    )
+    sync_job_outputs(
+        job,
+        JobOutput.STEP_AREA,
+        output_root / "calculate_area",
+        clear_manifest=not per_state,
+    )
+
+
+def _render_thumbnails(job: Job, merged_outputs) -> None:
+    output_root = _get_output_root(job)
+    thumbnail_dir = output_root / JobOutput.STEP_THUMBNAIL
+    workers = max(1, getattr(settings, "THUMBNAIL_WORKERS", 4))
+
+    def _render(merged_output: JobOutput):
+        # Runs on a pool thread: file work only, database writes stay on the task thread.
+        if is_cancelled(job.id):
+            return None
+        tiff_path = Path(merged_output.absolute_path)
+        if not tiff_path.exists():
+            return None
+        png_relative_path = Path(merged_output.relative_path).with_suffix(".png")
+        outputs = class_thumbnail_paths(str(tiff_path), str(thumbnail_dir / png_relative_path))
+        # Every class thumbnail comes from the same downsampled read.
+        bounds = create_class_thumbnails(str(tiff_path), outputs)
+        pngs = [(png_relative_path.with_name(Path(path).name), Path(path)) for path in outputs.values()]
+        return tiff_path, pngs, bounds
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_render, merged_output) for merged_output in merged_outputs]
+        for future in as_completed(futures):
+            rendered = future.result()
+            if rendered is None:
+                continue
+            tiff_path, pngs, bounds = rendered
+            for png_relative_path, png_path in pngs:
+                JobOutput.objects.update_or_create(
+                    job=job,
+                    step=JobOutput.STEP_THUMBNAIL,
+                    relative_path=str(png_relative_path),
+                    defaults={
+                        "absolute_path": str(png_path),
+                        "bounds": bounds,
+                        "size_bytes": png_path.stat().st_size if png_path.exists() else 0,
+                        "file_modified_at": timezone.now(),
+                    },
+                )
+            append_log(job.id, f"Generated thumbnail for {tiff_path.name}")
+
+
+@shared_task
+def admit_pending_task():
+    return start_next_pending_job()
+
+
 @shared_task(bind=True)
 def workflow_task(self, job_id: int):
     job = _get_job(job_id)
@@ -69,12 +230,23 @@ def workflow_task(self, job_id: int):
         _update_celery_state(job, "RUNNING")
         set_progress(job.id, 0, 0, "Queued")
         append_log(job.id, "Workflow queued")
-        flow = chain(
-            inference_task.s(job_id),
-            merge_task.s(),
-            area_task.s(),
-            thumbnail_task.s(),
-        )
+        mode = getattr(settings, "WORKFLOW_MODE", WORKFLOW_CHAIN)
+        if mode not in WORKFLOW_MODES:
+            raise ValueError(f"WORKFLOW_MODE must be one of {', '.join(WORKFLOW_MODES)}; got {mode!r}.")
+        if mode == WORKFLOW_PER_STATE and states:
+            # One inference run works through the states in order; each finished state
+            # fans out to its own merge -> area -> thumbnail chain while the GPU moves on.
+            reset_states_done(job.id)
+            for step in ("merge", "merge_tiles", "merge_compute", "area"):
+                set_step_progress(job.id, step, 0, 0)
+            flow = inference_states_task.si(job_id)
+        else:
+            flow = chain(
+                inference_task.s(job_id),
+                merge_task.s(),
+                area_task.s(),
+                thumbnail_task.s(),
+            )
         result = flow.apply_async()
         job.celery_chain_id = result.id or ""
         job.save(update_fields=["celery_chain_id", "updated_at"])
@@ -99,48 +271,19 @@ def inference_task(self, job_id: int):
         append_log(job.id, "Inference cancelled")
         start_next_pending_job()
         return job_id
+    lease = _acquire_step_or_retry(self, job, STEP_INFERENCE)
     _update_celery_state(job, "RUNNING")
     job.current_step = "inference"
     job.save(update_fields=["celery_task_id", "current_step", "updated_at"])
     append_log(job.id, "Inference task started")
-    if not job.pipeline_config:
-        _update_celery_state(job, "FAILURE", "PipelineConfig is required for inference.")
-        _update_job_status(job, Job.STATUS_FAILED, job.progress_percent)
-        raise ValueError("PipelineConfig is required for inference.")
-    input_meta = job.input_path
     try:
-        input_root = get_input_root()
-        output_root = _get_output_root(job)
-        run_inference(
-            input_root=str(input_root),
-            output_root=str(output_root),
-            year_suffix=input_meta.get("year_suffix"),
-            country=input_meta.get("country"),
-            crops=job.target_crops,
-            states=job.selected_states,
-            weights=str(
-                resolve_root_path(job.pipeline_config.model_weights_path, "weights")
-            ),
-            batch_size=job.pipeline_config.batch_size,
-            job_id=job.id,
-            gpu_count=job.gpu_count,
-            skip_exists=job.skip_inference,
-        )
-        sync_job_outputs(
-            job,
-            JobOutput.STEP_INFERENCE,
-            output_root / "inference_tiles",
-        )
+        _run_inference_step(job, lease, job.selected_states)
     except Exception as exc:
-        _update_celery_state(job, "FAILURE", str(exc))
-        _update_job_status(job, Job.STATUS_FAILED, job.progress_percent)
-        message = format_error_with_trace("inference task", exc)
-        set_step_progress(job.id, "inference", 0, 0, message)
-        append_log(job.id, message)
-        start_next_pending_job()
+        _fail_step(job, "inference", "inference task", exc)
         raise
     _update_job_status(job, Job.STATUS_RUNNING, 25, current_step="inference")
     append_log(job.id, "Inference task completed")
+    release_step(job, STEP_INFERENCE, next_step=STEP_MERGE)
     return job_id
 
 
@@ -154,37 +297,18 @@ def merge_task(self, job_id: int):
         append_log(job.id, "Merge cancelled")
         start_next_pending_job()
         return job_id
+    lease = _acquire_step_or_retry(self, job, STEP_MERGE)
     job.current_step = "merge"
     job.save(update_fields=["celery_task_id", "current_step", "updated_at"])
     append_log(job.id, "Merge task started")
-    input_meta = job.input_path
     try:
-        output_root = _get_output_root(job)
-        run_merge(
-            output_root=str(output_root),
-            year_suffix=input_meta.get("year_suffix"),
-            country=input_meta.get("country"),
-            crops=job.target_crops,
-            states=job.selected_states,
-            job_id=job.id,
-            skip_exists=job.skip_merge,
-            workers=4,
-        )
-        sync_job_outputs(
-            job,
-            JobOutput.STEP_MERGE,
-            output_root / "merged_cropmasks",
-        )
+        _run_merge_step(job, lease, job.selected_states)
     except Exception as exc:
-        _update_celery_state(job, "FAILURE", str(exc))
-        _update_job_status(job, Job.STATUS_FAILED, job.progress_percent)
-        message = format_error_with_trace("merge task", exc)
-        set_step_progress(job.id, "merge", 0, 0, message)
-        append_log(job.id, message)
-        start_next_pending_job()
+        _fail_step(job, "merge", "merge task", exc)
         raise
     _update_job_status(job, Job.STATUS_RUNNING, 50, current_step="merge")
     append_log(job.id, "Merge task completed")
+    release_step(job, STEP_MERGE, next_step=STEP_AREA)
     return job_id
 
 
@@ -198,44 +322,18 @@ def area_task(self, job_id: int):
         append_log(job.id, "Area calculation cancelled")
         start_next_pending_job()
         return job_id
+    lease = _acquire_step_or_retry(self, job, STEP_AREA)
     job.current_step = "area"
     job.save(update_fields=["celery_task_id", "current_step", "updated_at"])
     append_log(job.id, "Area calculation task started")
-    if not job.pipeline_config:
-        _update_celery_state(job, "FAILURE", "PipelineConfig is required for area calculation.")
-        _update_job_status(job, Job.STATUS_FAILED, job.progress_percent)
-        raise ValueError("PipelineConfig is required for area calculation.")
-    input_meta = job.input_path
     try:
-        output_root = _get_output_root(job)
-        run_area_calc(
-            output_root=str(output_root),
-            year_suffix=input_meta.get("year_suffix"),
-            country=input_meta.get("country"),
-            crops=job.target_crops,
-            states=job.selected_states,
-            shapefile_path=str(
-                resolve_root_path(job.pipeline_config.shapefile_path, "shp")
-            ),
-            job_id=job.id,
-            skip_exists=job.skip_area,
-            workers=4,
-        )
-        sync_job_outputs(
-            job,
-            JobOutput.STEP_AREA,
-            output_root / "calculate_area",
-        )
+        _run_area_step(job, lease, job.selected_states)
     except Exception as exc:
-        _update_celery_state(job, "FAILURE", str(exc))
-        _update_job_status(job, Job.STATUS_FAILED, job.progress_percent)
-        message = format_error_with_trace("area task", exc)
-        set_step_progress(job.id, "area", 0, 0, message)
-        append_log(job.id, message)
-        start_next_pending_job()
+        _fail_step(job, "area", "area task", exc)
         raise
     _update_job_status(job, Job.STATUS_RUNNING, 75, current_step="area")
     append_log(job.id, "Area calculation completed")
+    release_step(job, STEP_AREA, next_step=STEP_THUMBNAIL)
     return job_id
 
 
@@ -250,51 +348,150 @@ def thumbnail_task(self, job_id: int):
         start_next_pending_job()
         return job_id
 
+    _acquire_step_or_retry(self, job, STEP_THUMBNAIL)
     job.current_step = "thumbnail"
     job.save(update_fields=["celery_task_id", "current_step", "updated_at"])
     append_log(job.id, "Thumbnail generation task started")
-
-    merged_outputs = JobOutput.objects.filter(job=job, step=JobOutput.STEP_MERGE)
-    output_root = _get_output_root(job)
-    thumbnail_dir = output_root / JobOutput.STEP_THUMBNAIL
-
     try:
-        for merged_output in merged_outputs:
-            if is_cancelled(job_id):
-                break
-            
-            tiff_path = Path(merged_output.absolute_path)
-            if not tiff_path.exists():
-                continue
-
-            png_relative_path = Path(merged_output.relative_path).with_suffix(".png")
-            png_path = thumbnail_dir / png_relative_path
-            
-            bounds = create_thumbnail(str(tiff_path), str(png_path))
-
-            JobOutput.objects.update_or_create(
-                job=job,
-                step=JobOutput.STEP_THUMBNAIL,
-                relative_path=str(png_relative_path),
-                defaults={
-                    "absolute_path": str(png_path),
-                    "bounds": bounds,
-                    "size_bytes": png_path.stat().st_size if png_path.exists() else 0,
-                    "file_modified_at": timezone.now(),
-                },
-            )
-            append_log(job.id, f"Generated thumbnail for {tiff_path.name}")
-
+        _render_thumbnails(job, JobOutput.objects.filter(job=job, step=JobOutput.STEP_MERGE))
     except Exception as exc:
-        _update_celery_state(job, "FAILURE", str(exc))
-        _update_job_status(job, Job.STATUS_FAILED, job.progress_percent)
-        message = format_error_with_trace("thumbnail task", exc)
-        append_log(job.id, message)
-        start_next_pending_job()
+        _fail_step(job, "thumbnail", "thumbnail task", exc, report_step=False)
         raise
 
     _update_job_status(job, Job.STATUS_SUCCESS, 100, current_step="")
     _update_celery_state(job, "SUCCESS")
     append_log(job.id, "Thumbnail generation completed")
+    release_step(job, STEP_THUMBNAIL)
+    return job_id
+
+
+def _state_stopped(job: Job, label: str, state: str) -> bool:
+    """Whether a per-state task should not run: the job was cancelled or another state failed."""
+    if job.status in (Job.STATUS_FAILED, Job.STATUS_CANCELLED):
+        return True
+    if is_cancelled(job.id):
+        _update_job_status(job, Job.STATUS_CANCELLED, job.progress_percent)
+        append_log(job.id, f"{label} cancelled ({state})")
+        start_next_pending_job()
+        return True
+    return False
+
+
+def _finish_state(job: Job, state: str) -> None:
+    """Count a state whose thumbnails are done; the last one completes the job."""
+    done = mark_state_done(job.id)
+    total = len(job.selected_states)
+    job.refresh_from_db(fields=["status"])
+    if job.status != Job.STATUS_RUNNING:
+        return
+    append_log(job.id, f"State {state} completed ({done}/{total})")
+    if done < total:
+        _update_job_status(job, Job.STATUS_RUNNING, int(done * 100 / total))
+        return
+    for step in (JobOutput.STEP_INFERENCE, JobOutput.STEP_MERGE, JobOutput.STEP_AREA):
+        remove_manifest(job.id, step)
+    _update_job_status(job, Job.STATUS_SUCCESS, 100, current_step="")
+    _update_celery_state(job, "SUCCESS")
+    append_log(job.id, "Workflow completed")
     start_next_pending_job()
+
+
+def _start_state_chain(job_id: int, state: str) -> None:
+    chain(
+        merge_state_task.si(job_id, state),
+        area_state_task.si(job_id, state),
+        thumbnail_state_task.si(job_id, state),
+    ).apply_async()
+
+
+@shared_task(bind=True)
+def inference_states_task(self, job_id: int):
+    """Per-state inference: one model load and tile queue, a chain started per finished state."""
+    job = _get_job(job_id)
+    job.celery_task_id = self.request.id or job.celery_task_id
+    job.save(update_fields=["celery_task_id", "updated_at"])
+    if _state_stopped(job, "Inference", "all states"):
+        return job_id
+    lease = _acquire_step_or_retry(self, job, STEP_INFERENCE)
+    _update_celery_state(job, "RUNNING")
+    job.current_step = "inference"
+    job.save(update_fields=["current_step", "updated_at"])
+    append_log(job.id, "Inference task started")
+    started = []
+
+    def _state_done(state: str) -> None:
+        started.append(state)
+        append_log(job.id, f"Inference completed ({state})")
+        _start_state_chain(job_id, state)
+
+    try:
+        _run_inference_step(job, lease, job.selected_states, on_state_done=_state_done)
+    except Exception as exc:
+        _fail_step(job, "inference", "inference task", exc)
+        raise
+    release_step(job, STEP_INFERENCE)
+    if _state_stopped(job, "Inference", "remaining states"):
+        return job_id
+    # States with no tiles, or tiles no device finished, still go on like the chain workflow does.
+    for state in job.selected_states:
+        if state not in started:
+            _state_done(state)
+    append_log(job.id, "Inference task completed")
+    return job_id
+
+
+@shared_task(bind=True)
+def merge_state_task(self, job_id: int, state: str):
+    job = _get_job(job_id)
+    if _state_stopped(job, "Merge", state):
+        return job_id
+    lease = _acquire_step_or_retry(self, job, STEP_MERGE, state)
+    append_log(job.id, f"Merge started ({state})")
+    try:
+        _run_merge_step(job, lease, [state], per_state=True)
+    except Exception as exc:
+        _fail_step(job, "merge", f"merge task ({state})", exc)
+        raise
+    append_log(job.id, f"Merge completed ({state})")
+    release_step(job, STEP_MERGE, state, next_step=STEP_AREA)
+    return job_id
+
+
+@shared_task(bind=True)
+def area_state_task(self, job_id: int, state: str):
+    job = _get_job(job_id)
+    if _state_stopped(job, "Area calculation", state):
+        return job_id
+    lease = _acquire_step_or_retry(self, job, STEP_AREA, state)
+    append_log(job.id, f"Area calculation started ({state})")
+    try:
+        _run_area_step(job, lease, [state], per_state=True)
+    except Exception as exc:
+        _fail_step(job, "area", f"area task ({state})", exc)
+        raise
+    append_log(job.id, f"Area calculation completed ({state})")
+    release_step(job, STEP_AREA, state, next_step=STEP_THUMBNAIL)
+    return job_id
+
+
+@shared_task(bind=True)
+def thumbnail_state_task(self, job_id: int, state: str):
+    job = _get_job(job_id)
+    if _state_stopped(job, "Thumbnail generation", state):
+        return job_id
+    _acquire_step_or_retry(self, job, STEP_THUMBNAIL, state)
+    year_suffix = job.input_path.get("year_suffix")
+    country = job.input_path.get("country")
+    merged_outputs = JobOutput.objects.filter(
+        job=job,
+        step=JobOutput.STEP_MERGE,
+        relative_path__startswith=f"{Path(year_suffix, country, state)}{os.sep}",
+    )
+    try:
+        _render_thumbnails(job, merged_outputs)
+    except Exception as exc:
+        _fail_step(job, "thumbnail", f"thumbnail task ({state})", exc, report_step=False)
+        raise
+    release_step(job, STEP_THUMBNAIL, state)
+    _finish_state(job, state)
     return job_id